@@ -0,0 +1,52 @@
+# core/gunicorn_conf.py
+"""
+Production server profile สำหรับ gunicorn (ใช้ผ่าน Procfile: gunicorn core.wsgi -c core/gunicorn_conf.py)
+
+- preload_app: โหลด Django + โมเดล AI ครั้งเดียวใน master ก่อน fork
+  worker ทุกตัวใช้ weights ชุดเดียวกันแบบ copy-on-write แทนที่จะโหลดกันคนละชุด
+- torch ใน master ถูกจำกัดไว้ที่ 1 thread (thread pool ของ OpenMP ไม่ปลอดภัยต่อการ fork)
+  แล้วค่อยตั้งจำนวน thread จริงใหม่ในแต่ละ worker
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+# จำนวน thread ของ torch ต่อ worker (ค่าเริ่มต้น: แบ่ง CPU เท่าๆ กัน)
+torch_threads = int(os.environ.get('TORCH_NUM_THREADS', max(1, multiprocessing.cpu_count() // workers)))
+
+
+def _set_torch_threads(count):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(count)
+
+
+def when_ready(server):
+    # ทำงานใน master หลังโหลดแอป (preload_app) และก่อน fork worker ตัวแรก
+    from django.db import connections
+    from transfer.preload import preload
+
+    _set_torch_threads(1)
+    server.log.info("Preloading AI model and curriculum caches in master...")
+    preload()
+
+    # ห้ามให้ worker ใช้ connection ฐานข้อมูลร่วมกับ master
+    connections.close_all()
+
+    # ย้าย object ที่โหลดแล้วออกจากการติดตามของ GC เพื่อไม่ให้ GC ไปแตะ page ที่แชร์กันอยู่
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+
+    connections.close_all()
+    _set_torch_threads(torch_threads)
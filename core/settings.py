@@ -184,6 +184,30 @@ REST_FRAMEWORK = {
     )
 }
 
+# ขนาดหน้าเริ่มต้นของ list endpoint เมื่อส่ง ?cursor= หรือ ?page_size= มา (ดู transfer/pagination.py)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+
+# ตั้งค่า AI สำหรับจับคู่รายวิชา (ดูค่าตั้งต้นทั้งหมดได้ที่ transfer/ai_comparator.py -> DEFAULTS)
+AI_COMPARATOR = {
+    # backend ของ encoder: 'torch' (fp32), 'torch-int8' หรือ 'onnx' (ตรวจก่อนด้วย manage.py verify_ai_backend)
+    'BACKEND': os.environ.get('AI_BACKEND', 'torch'),
+    # ขนาดสูงสุดของ cache เมทริกซ์เวกเตอร์ของแต่ละหลักสูตร (byte)
+    'CURRICULUM_CACHE_BYTES': int(os.environ.get('AI_CURRICULUM_CACHE_BYTES', 64 * 1024 * 1024)),
+    # True = จับคู่ผ่านคิว (ต้องรัน manage.py run_matching_worker), False = จับคู่ทันทีตอนยื่นคำร้อง
+    'MATCHING_ASYNC': os.environ.get('AI_MATCHING_ASYNC', 'True') == 'True',
+    'MATCHING_WORKER_CONCURRENCY': int(os.environ.get('AI_MATCHING_WORKER_CONCURRENCY', 2)),
+    'MATCHING_MAX_ATTEMPTS': 3,
+    # 'independent' หรือ 'optimal' (จับคู่หนึ่งต่อหนึ่งทั้งคำร้อง ไม่ให้หลายรายการชนวิชาเป้าหมายเดียวกัน)
+    'ASSIGNMENT_MODE': os.environ.get('AI_ASSIGNMENT_MODE', 'independent'),
+    # 'dense' หรือ 'hybrid' (BM25 + เวกเตอร์ เปรียบเทียบก่อนด้วย manage.py benchmark_retrieval)
+    'RETRIEVAL_MODE': os.environ.get('AI_RETRIEVAL_MODE', 'dense'),
+    'HYBRID_LEXICAL_WEIGHT': float(os.environ.get('AI_HYBRID_LEXICAL_WEIGHT', 0.3)),
+    'HYBRID_SEMANTIC_WEIGHT': float(os.environ.get('AI_HYBRID_SEMANTIC_WEIGHT', 0.7)),
+    # โฟลเดอร์โมเดล cross-encoder ในเครื่องสำหรับ rerank ผู้สมัคร top-k (ไม่ตั้ง = ปิด)
+    'RERANK_MODEL_PATH': os.environ.get('AI_RERANK_MODEL_PATH') or None,
+    'RERANK_TIME_BUDGET_MS': int(os.environ.get('AI_RERANK_TIME_BUDGET_MS', 1000)),
+}
+
 # ตั้งค่า CORS ให้ Frontend เข้าถึงได้
 CORS_ALLOWED_ORIGINS = [
     "http://162.141.142.3",
@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.urls import path, include
 # ลบ import ของเก่าทิ้ง แล้ว import view ใหม่ของเราแทน
-from transfer.views import MyTokenObtainPairView
+from transfer.views import MyTokenObtainPairView, ReadinessView
 from rest_framework_simplejwt.views import TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
@@ -15,6 +15,8 @@ urlpatterns = [
     path('api/auth/login/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
 
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    path('health/ready', ReadinessView.as_view(), name='health-ready'),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useContext } from 'react';
 import { 
   getPendingRequests, 
-  updateRequestItemStatus, 
+  reviewRequestItems, 
   recalculateScore, 
   downloadTransferReport 
 } from '../services/api';
@@ -92,8 +92,8 @@ function FacultyDashboard() {
     }
 
     try {
-      await Promise.all(
-        changedItems.map(item => updateRequestItemStatus(item.id, item.status))
+      await reviewRequestItems(
+        changedItems.map(item => ({ id: item.id, status: item.status }))
       );
       navigate(`/faculty/request/${request.id}/result`);
     } catch (error) {
@@ -258,6 +258,26 @@ function FacultyDashboard() {
                       ))}
                     </tbody>
                   </table>
+
+                  {/* กลุ่มวิชาที่ AI แนะนำให้รวมกันเทียบโอน */}
+                  {req.combination_suggestions?.length > 0 && (
+                    <div className="fd-combinations">
+                      <strong>AI แนะนำให้รวมรายวิชาเทียบโอน:</strong>
+                      <ul>
+                        {req.combination_suggestions.map(group => (
+                          <li key={group.id}>
+                            {req.items
+                              .filter(item => group.items.includes(item.id))
+                              .map(item => item.original_course.course_code)
+                              .join(' + ')}
+                            {' → '}
+                            <strong>{group.target_course.course_code}</strong> {group.target_course.course_name_th}
+                            {' '}({group.total_credits} หน่วยกิต, {(group.similarity_score * 100).toFixed(2)}%)
+                          </li>
+                        ))}
+                      </ul>
+                    </div>
+                  )}
                 </div>
 
                 {/* = Footer = */}
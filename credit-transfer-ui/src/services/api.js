@@ -80,6 +80,10 @@ export const updateProfile = (profileData) => {
 export const updateRequestItemStatus = (itemId, status) => {
   return apiClient.patch(`/admin/request-item/${itemId}/update/`, { status });
 };
+// บันทึกผลพิจารณาหลายรายการในคำขอเดียว: items = [{ id, status }, ...]
+export const reviewRequestItems = (items) => {
+  return apiClient.post('/admin/request-items/review/', { items });
+};
 export const getRequestHistory = () => {
   return apiClient.get('/admin/history/');
 };
@@ -116,3 +120,12 @@ export const getStudentRequests = () => {
   return apiClient.get('/student/requests/'); // URL ตาม Backend ของคุณ
 };
 
+
+// เมทริกซ์ความเหมือนทั้งหมดของคำร้อง (รายการ x รายวิชาในหลักสูตร) ในคำขอเดียว
+export const getSimilarityMatrix = (requestId) => {
+  return apiClient.get(`/admin/request/${requestId}/similarity-matrix/`);
+};
+// คำนวณคะแนนหลายคู่พร้อมกัน: pairs = [{ original_course_id, target_course_id }, ...]
+export const recalculateScores = (pairs) => {
+  return apiClient.post('/recalculate-score/batch/', { pairs });
+};
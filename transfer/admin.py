@@ -1,5 +1,6 @@
 # transfer/admin.py
 from django.contrib import admin
+from .ai_comparator import embed_courses
 from .models import (
     Curriculum, 
     TargetCourse, 
@@ -7,16 +8,26 @@ from .models import (
     SourceCourse,
     TransferRequest,
     RequestItem,
-    AIComparisonResult
+    AIComparisonResult,
+    ApprovedEquivalence,
+    CombinationSuggestion,
+    MatchingJob
 )
 
+class CourseEmbeddingAdminMixin:
+    """คำนวณเวกเตอร์ของรายวิชาที่เพิ่ม/แก้ไขผ่าน inline ในหน้า Admin"""
+
+    def save_formset(self, request, form, formset, change):
+        courses = formset.save()
+        embed_courses(courses)
+
 # --- ตั้งค่าส่วนจัดการหลักสูตรเป้าหมาย ---
 class TargetCourseInline(admin.TabularInline):
     model = TargetCourse
     extra = 1
 
 @admin.register(Curriculum)
-class CurriculumAdmin(admin.ModelAdmin):
+class CurriculumAdmin(CourseEmbeddingAdminMixin, admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
     inlines = [TargetCourseInline]
@@ -27,7 +38,7 @@ class SourceCourseInline(admin.TabularInline):
     extra = 1
 
 @admin.register(Institution)
-class InstitutionAdmin(admin.ModelAdmin):
+class InstitutionAdmin(CourseEmbeddingAdminMixin, admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
     inlines = [SourceCourseInline]
@@ -35,4 +46,19 @@ class InstitutionAdmin(admin.ModelAdmin):
 # --- ลงทะเบียน Model ที่เหลือ ---
 admin.site.register(TransferRequest)
 admin.site.register(RequestItem)
-admin.site.register(AIComparisonResult)
\ No newline at end of file
+admin.site.register(AIComparisonResult)
+
+@admin.register(MatchingJob)
+class MatchingJobAdmin(admin.ModelAdmin):
+    list_display = ('transfer_request', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+@admin.register(ApprovedEquivalence)
+class ApprovedEquivalenceAdmin(admin.ModelAdmin):
+    list_display = ('source_course', 'target_course', 'approved_count', 'rejected_count', 'updated_at')
+    list_filter = ('curriculum',)
+    search_fields = ('source_course__course_code', 'target_course__course_code')
+
+@admin.register(CombinationSuggestion)
+class CombinationSuggestionAdmin(admin.ModelAdmin):
+    list_display = ('transfer_request', 'target_course', 'total_credits', 'similarity_score')
+    filter_horizontal = ('items',)
@@ -1,107 +1,1085 @@
 # transfer/ai_comparator.py
 
-from sentence_transformers import SentenceTransformer, util
-from .models import SourceCourse, TargetCourse
-import re # เพิ่ม library สำหรับจัดการข้อความ
+import hashlib
+import os
+import queue
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Value
+from .ann_index import IVFIndex, top_k
+from .lexical_index import BM25Index
+from .tokenizer import keywords, tokenize
+from .models import Curriculum, Institution, SourceCourse, TargetCourse, CourseEmbedding, RerankScore
 
 # โมเดลที่ 1: 'paraphrase-multilingual-MiniLM-L12-v2'
 # โมเดลที่ 2: 'intfloat/multilingual-e5-large'
 # โมเดลที่ 3: 'BAAI/bge-m3'
-# โหลดโมเดล AI
-print("Loading AI Model (paraphrase-multilingual-MiniLM-L12-v2)... Please wait.")
-model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
 
-print("AI Model Loaded Successfully!")
+# ค่าตั้งต้น (override ได้ผ่าน settings.AI_COMPARATOR)
+DEFAULTS = {
+    # โมเดลและ backend สำหรับ encode (ดู transfer/ai_backends.py)
+    'MODEL_NAME': MODEL_NAME,
+    'BACKEND': 'torch',
+    'ONNX_FILE_NAME': None,
+    'CURRICULUM_CACHE_BYTES': 64 * 1024 * 1024,
+    # คำอธิบายที่ยาวเกิน CHUNK_MAX_CHARS (โมเดลตัดที่ 128 token) ถูกแบ่งเป็นช่วงแล้วรวมเวกเตอร์ (0 = ไม่แบ่ง)
+    # CHUNK_STRATEGY: 'sentence' (ตามวลี/ประโยค) หรือ 'window' (หน้าต่างคงที่ซ้อนกัน CHUNK_OVERLAP_CHARS)
+    # CHUNK_POOLING: 'mean' หรือ 'max'
+    'CHUNK_MAX_CHARS': 400,
+    'CHUNK_STRATEGY': 'sentence',
+    'CHUNK_OVERLAP_CHARS': 80,
+    'CHUNK_POOLING': 'mean',
+    # จำนวนรายวิชาแนะนำต่อรายการ และพารามิเตอร์ของดัชนี ANN (transfer/ann_index.py)
+    'TOP_K': 5,
+    'ANN_NPROBE': 8,
+    # หลักสูตรที่มีรายวิชาไม่เกิน ANN_EXACT_THRESHOLD ค้นแบบตรงๆ (เร็วกว่า IVF ที่ขนาดนี้ ดู ann_index.py)
+    'ANN_EXACT_THRESHOLD': 2048,
+    # micro-batching: รวมคำขอ encode ที่เข้ามาพร้อมกันเป็น forward pass เดียว
+    'BATCHING_ENABLED': True,
+    'BATCH_MAX_SIZE': 64,
+    'BATCH_MAX_WAIT_MS': 5,
+    'BATCH_MAX_QUEUE_DEPTH': 256,
+    # 'dense' = ค้นด้วยเวกเตอร์อย่างเดียว, 'hybrid' = คัดผู้สมัครด้วย BM25 แล้วรวมคะแนนกับ cosine
+    'RETRIEVAL_MODE': 'dense',
+    'HYBRID_CANDIDATES': 50,
+    'HYBRID_LEXICAL_WEIGHT': 0.3,
+    'HYBRID_SEMANTIC_WEIGHT': 0.7,
+    'BM25_K1': 1.5,
+    'BM25_B': 0.75,
+    # rerank ขั้นที่สองด้วย cross-encoder (None = ปิด) โหลดจาก path ในเครื่องเท่านั้น
+    'RERANK_MODEL_PATH': None,
+    'RERANK_CANDIDATES': 10,
+    'RERANK_BATCH_SIZE': 32,
+    'RERANK_TIME_BUDGET_MS': 1000,
+    # ไฟล์เมทริกซ์ TF-IDF ของคำสำคัญทั้ง catalog (None = <BASE_DIR>/ai_cache/tfidf_catalog.npz)
+    'TFIDF_FILE': None,
+    # 'independent' = แต่ละรายการเลือกวิชาที่คะแนนสูงสุดของตัวเอง
+    # 'optimal' = จับคู่แบบหนึ่งต่อหนึ่งทั้งคำร้อง (ไม่ให้สองรายการชนวิชาเป้าหมายเดียวกัน)
+    'ASSIGNMENT_MODE': 'independent',
+    # จับคู่แบบหลายวิชาต่อหนึ่ง: กลุ่มละไม่เกินกี่วิชา, จำนวนวิชาผู้สมัครต่อวิชาเป้าหมาย, คะแนนขั้นต่ำ
+    'COMBINATION_ENABLED': True,
+    'COMBINATION_MAX_SIZE': 3,
+    'COMBINATION_CANDIDATES': 8,
+    'COMBINATION_MIN_SCORE': 0.5,
+    # ใช้คู่ที่อาจารย์อนุมัติแล้วแทนการรันโมเดล เมื่ออนุมัติอย่างน้อยกี่ครั้ง
+    'EQUIVALENCE_MIN_APPROVALS': 2,
+    # คิวงานจับคู่เบื้องหลัง (transfer/matching.py)
+    'MATCHING_ASYNC': True,
+    'MATCHING_WORKER_CONCURRENCY': 2,
+    'MATCHING_MAX_ATTEMPTS': 3,
+    'MATCHING_RETRY_DELAY': 30,
+    'MATCHING_LEASE_SECONDS': 300,
+}
 
-def generate_reasoning(text1, text2):
+def get_config(name):
+    return getattr(settings, 'AI_COMPARATOR', {}).get(name, DEFAULTS[name])
+
+# โมเดล AI จะถูกโหลดตอนใช้งานครั้งแรกเท่านั้น (torch + โมเดลใช้เวลาโหลดหลายวินาที)
+# เพื่อไม่ให้ manage.py migrate / shell / seed / test ต้องจ่ายต้นทุนนี้ทุกครั้ง
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """คืน encoder backend ที่ตั้งค่าไว้ (โหลดครั้งเดียวต่อ process แบบ thread-safe)"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from .ai_backends import load_backend
+
+                model_name, backend = get_config('MODEL_NAME'), get_config('BACKEND')
+                print(f"Loading AI Model ({model_name}, backend={backend})... Please wait.")
+                _model = load_backend(backend, model_name, onnx_file_name=get_config('ONNX_FILE_NAME'))
+                print("AI Model Loaded Successfully!")
+    return _model
+
+def is_model_loaded():
+    return _model is not None
+
+def get_model_version():
     """
-    วิเคราะห์หาคำสำคัญ (Keywords) ที่ปรากฏในคำอธิบายรายวิชาของทั้ง 2 ฝั่ง
-    เพื่อใช้เป็นเหตุผลประกอบความสอดคล้อง
+    ชื่อโมเดล + backend ที่ใช้อยู่ (ใช้เป็นคีย์ของ CourseEmbedding เพราะ int8/ONNX ให้เวกเตอร์ต่างจาก fp32 เล็กน้อย)
+    backend 'onnx' รวมชื่อไฟล์ .onnx ด้วย (ไฟล์ที่ quantize แล้วให้เวกเตอร์ต่างจากไฟล์ fp32)
     """
-    if not text1 or not text2:
-        return "ไม่สามารถระบุเหตุผลได้ เนื่องจากข้อมูลคำอธิบายรายวิชาไม่เพียงพอ"
-
-    # 1. ทำความสะอาดข้อความ: ลบตัวอักษรพิเศษ และเปลี่ยนเป็นตัวเล็ก (case-insensitive)
-    def clean_text(text):
-        # ลบเครื่องหมายวรรคตอน แต่เก็บ ก-ฮ, a-z, 0-9 และช่องว่างไว้
-        text = re.sub(r'[^\w\s]', ' ', text) 
-        return text.lower()
-
-    clean_t1 = clean_text(text1)
-    clean_t2 = clean_text(text2)
-
-    # 2. แยกคำ (Tokenization) - ใช้การเว้นวรรคเป็นหลัก
-    # หมายเหตุ: ภาษาไทยถ้าไม่มีการเว้นวรรค การตัดคำแบบนี้อาจได้ผลไม่ดีนัก 
-    # แต่เพียงพอสำหรับจับคำทับศัพท์ภาษาอังกฤษหรือคำที่เว้นวรรคไว้
-    words1 = set(clean_t1.split())
-    words2 = set(clean_t2.split())
-    
-    # 3. หาคำที่ปรากฏทั้งสองฝั่ง (Intersection)
-    common_words = words1.intersection(words2)
-    
-    # 4. กำหนดคำฟุ่มเฟือย (Stop words) ที่ไม่ควรนำมาเป็นเหตุผล
-    stop_words = {
-        # คำเชื่อมทั่วไป
-        'การ', 'ความ', 'และ', 'ใน', 'ของ', 'ที่', 'ได้', 'ศึกษา', 'เกี่ยวกับ', 
-        'เพื่อ', 'โดย', 'เป็น', 'มี', 'จาก', 'หลักการ', 'ทฤษฎี', 'เบื้องต้น',
-        'ปฏิบัติ', 'ระบบ', 'งาน', 'ทาง', 'ด้าน', 'กระบวนการ', 'พื้นฐาน',
-        'structure', 'introduction', 'basic', 'principle', 'system', 'analysis',
-        'and', 'of', 'the', 'in', 'to', 'for', 'with', 'study', 'a', 'an'
+    model_name, backend = get_config('MODEL_NAME'), get_config('BACKEND')
+    if backend == 'torch':
+        return model_name
+    onnx_file_name = get_config('ONNX_FILE_NAME')
+    if backend == 'onnx' and onnx_file_name:
+        return f'{model_name}@{backend}:{onnx_file_name}'
+    return f'{model_name}@{backend}'
+
+def get_matching_version():
+    """เวอร์ชันของผลจับคู่ (MatchResultCache): โมเดล + วิธีค้น + reranker เพราะแต่ละแบบอาจเลือกวิชาต่างกัน"""
+    version = get_model_version()
+    if get_config('CHUNK_MAX_CHARS'):
+        version += f"+chunk:{get_config('CHUNK_STRATEGY')}{get_config('CHUNK_MAX_CHARS')}/{get_config('CHUNK_POOLING')}"
+    mode = get_config('RETRIEVAL_MODE')
+    if mode != 'dense':
+        version += f"+{mode}:{get_config('HYBRID_SEMANTIC_WEIGHT')}/{get_config('HYBRID_LEXICAL_WEIGHT')}"
+    if get_config('RERANK_MODEL_PATH'):
+        version += f"+rerank:{get_rerank_model_name()}"
+    return version
+
+#================================#
+#  Embedding Store              #
+#================================#
+
+def normalize_description(text):
+    """ทำให้ข้อความอยู่ในรูปมาตรฐานก่อนคำนวณแฮช (Unicode NFC + ยุบช่องว่าง)"""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+def description_hash(text):
+    return hashlib.sha256(normalize_description(text).encode('utf-8')).hexdigest()
+
+# วลีที่ CRC32 หารด้วยค่านี้ลงตัวเป็นจุดตัดช่วง (content-defined) เมื่อแก้ไขคำอธิบาย
+# ช่วงที่อยู่ห่างจากจุดที่แก้จึงยังได้ข้อความ (และแฮช) เดิม ไม่ต้อง encode ใหม่
+_CHUNK_BOUNDARY_MODULUS = 8
+
+def _sentence_chunks(text, limit):
+    segments = []
+    for segment in text.split(' '):
+        segments.extend(segment[start:start + limit] for start in range(0, len(segment), limit))
+
+    chunks, current, size = [], [], 0
+    for segment in segments:
+        if current and size + 1 + len(segment) > limit:
+            chunks.append(' '.join(current))
+            current, size = [], 0
+        current.append(segment)
+        size += len(segment) + (size > 0)
+        if size >= limit // 4 and zlib.crc32(segment.encode('utf-8')) % _CHUNK_BOUNDARY_MODULUS == 0:
+            chunks.append(' '.join(current))
+            current, size = [], 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def _window_chunks(text, limit, overlap):
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + limit, len(text))
+        if end < len(text):
+            # ตัดที่ช่องว่างถ้าทำได้ (ไม่ตัดกลางคำ)
+            space = text.rfind(' ', start + limit // 2, end)
+            end = space if space > start else end
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+def chunk_description(text):
+    """แบ่งคำอธิบายรายวิชา (ที่ normalize แล้ว) เป็นช่วงละไม่เกิน CHUNK_MAX_CHARS ตัวอักษร"""
+    text = normalize_description(text)
+    limit = get_config('CHUNK_MAX_CHARS')
+    if not limit or len(text) <= limit:
+        return [text]
+    if get_config('CHUNK_STRATEGY') == 'window':
+        return _window_chunks(text, limit, get_config('CHUNK_OVERLAP_CHARS'))
+    return _sentence_chunks(text, limit)
+
+def _pool(vectors):
+    pooled = vectors.max(axis=0) if get_config('CHUNK_POOLING') == 'max' else vectors.mean(axis=0)
+    norm = np.linalg.norm(pooled)
+    return pooled / norm if norm else pooled
+
+def _run_model(texts):
+    """รันโมเดลจริง คืนค่าเป็นเมทริกซ์ float32 ที่ normalize แล้ว (cosine = dot product)"""
+    return get_model().encode(texts, batch_size=get_config('BATCH_MAX_SIZE'))
+
+#================================#
+#  Micro-batching Executor      #
+#================================#
+
+class BatchingEncoder:
+    """
+    รวมคำขอ encode จากหลาย thread ที่เข้ามาในช่วง max_wait_ms เป็น batch เดียว
+    เรียงข้อความตามความยาว (ลด padding ในแต่ละ sub-batch) แล้วรันโมเดลครั้งเดียว
+    ผู้เรียกแต่ละคนจะได้ผลลัพธ์ของตัวเองกลับไป (blocking เหมือนเรียกโมเดลตรงๆ)
+    """
+
+    def __init__(self, run_batch, max_batch_size, max_wait_ms, max_queue_depth):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue(maxsize=max_queue_depth)
+        self.thread = threading.Thread(target=self._loop, name='ai-batching-encoder', daemon=True)
+        self.thread.start()
+
+    def encode(self, texts):
+        future = Future()
+        self.requests.put((list(texts), future))  # block เมื่อคิวเต็ม (backpressure)
+        return future.result()
+
+    def _collect(self):
+        """รอคำขอแรก แล้วเก็บคำขอเพิ่มจนครบขนาด batch หรือหมดเวลารอ"""
+        batch = [self.requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                # ข้อความซ้ำกันใน batch เดียวกัน encode ครั้งเดียว
+                unique_texts = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+                # จัดกลุ่มตามความยาว: ข้อความยาวใกล้กันอยู่ sub-batch เดียวกัน
+                unique_texts.sort(key=len)
+                vectors = self.run_batch(unique_texts) if unique_texts else None
+                positions = {text: index for index, text in enumerate(unique_texts)}
+                for texts, future in batch:
+                    if texts:
+                        future.set_result(vectors[[positions[text] for text in texts]])
+                    else:
+                        future.set_result(np.zeros((0, 0), dtype=np.float32))
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+_batcher = None
+_batcher_pid = None
+_batcher_lock = threading.Lock()
+
+def _get_batcher():
+    """สร้าง executor ต่อ process (หลัง fork thread ของ master จะไม่ตามมาด้วย จึงต้องสร้างใหม่)"""
+    global _batcher, _batcher_pid
+    if _batcher is None or _batcher_pid != os.getpid():
+        with _batcher_lock:
+            if _batcher is None or _batcher_pid != os.getpid():
+                _batcher = BatchingEncoder(
+                    _run_model,
+                    max_batch_size=get_config('BATCH_MAX_SIZE'),
+                    max_wait_ms=get_config('BATCH_MAX_WAIT_MS'),
+                    max_queue_depth=get_config('BATCH_MAX_QUEUE_DEPTH'),
+                )
+                _batcher_pid = os.getpid()
+    return _batcher
+
+def _encode(texts):
+    """encode ข้อความ (ผ่าน micro-batching executor ถ้าเปิดใช้งาน)"""
+    if get_config('BATCHING_ENABLED'):
+        return _get_batcher().encode(texts)
+    return _run_model(texts)
+
+def get_embeddings(texts):
+    """
+    คืนเวกเตอร์ของคำอธิบายรายวิชาทั้งหมด (ลำดับเดียวกับ texts)
+    คำอธิบายยาวถูกแบ่งเป็นช่วง (chunk_description) แต่ละช่วงเก็บใน CourseEmbedding แยกกัน
+    แล้วรวมเป็นเวกเตอร์เดียวด้วย CHUNK_POOLING (แก้คำอธิบายแล้ว encode ใหม่เฉพาะช่วงที่เปลี่ยน)
+    """
+    chunked = [chunk_description(text) for text in texts]
+    vectors = _get_stored_embeddings([chunk for chunks in chunked for chunk in chunks])
+    if len(vectors) == len(chunked):
+        return vectors
+
+    pooled, position = [], 0
+    for chunks in chunked:
+        pooled.append(_pool(vectors[position:position + len(chunks)]))
+        position += len(chunks)
+    return np.vstack(pooled).astype(np.float32)
+
+def _get_stored_embeddings(texts):
+    """
+    คืนเวกเตอร์ของข้อความทั้งหมด (ลำดับเดียวกับ texts) โดยอ่านจาก CourseEmbedding ก่อน
+    ข้อความที่ยังไม่เคยคำนวณจะถูก encode รวดเดียวเป็น batch แล้วบันทึกลงตาราง
+    """
+    model_version = get_model_version()
+    hashes = [description_hash(text) for text in texts]
+    stored = {
+        content_hash: np.frombuffer(vector, dtype=np.float32)
+        for content_hash, vector in CourseEmbedding.objects.filter(
+            model_name=model_version, content_hash__in=set(hashes)
+        ).values_list('content_hash', 'vector')
     }
-    
-    # 5. กรองคำ
-    keywords = [w for w in common_words if w not in stop_words and len(w) > 2]
-    
-    # 6. สรุปผล
-    if keywords:
-        # เรียงลำดับคำตามความยาว (คำยาวมักมีความหมายเฉพาะเจาะจงกว่า)
-        keywords.sort(key=len, reverse=True)
-        # เลือกมาแสดงสูงสุด 10 คำ
-        top_keywords = keywords[:10]
+
+    missing = {}
+    for content_hash, text in zip(hashes, texts):
+        if content_hash not in stored:
+            missing.setdefault(content_hash, normalize_description(text))
+
+    if missing:
+        vectors = _encode(list(missing.values()))
+        CourseEmbedding.objects.bulk_create(
+            [
+                CourseEmbedding(
+                    content_hash=content_hash,
+                    model_name=model_version,
+                    dimension=vector.shape[0],
+                    vector=vector.tobytes(),
+                )
+                for content_hash, vector in zip(missing, vectors)
+            ],
+            ignore_conflicts=True,
+        )
+        stored.update(zip(missing, vectors))
+
+    if not hashes:
+        return np.zeros((0, get_model().dimension()), dtype=np.float32)
+    return np.vstack([stored[content_hash] for content_hash in hashes])
+
+def embed_courses(courses):
+    """เติม CourseEmbedding ให้รายวิชา (SourceCourse/TargetCourse) ที่สร้างหรือแก้ไขใหม่"""
+    descriptions = [course.course_description for course in courses if course.course_description]
+    if descriptions:
+        get_embeddings(descriptions)
+
+def course_keywords(course):
+    """คำสำคัญของรายวิชา (อ่านจากที่เก็บไว้ ถ้ายังไม่มีจึงตัดคำใหม่)"""
+    return course.keywords or keywords(course.course_description)
+
+#================================#
+#  Keyword Explanations         #
+#================================#
+
+_term_matrix = None
+_term_matrix_lock = threading.Lock()
+
+def _term_matrix_path():
+    return get_config('TFIDF_FILE') or os.path.join(settings.BASE_DIR, 'ai_cache', 'tfidf_catalog.npz')
+
+def _catalog_stamp():
+    # catalog_version ของทุกหลักสูตร (รายวิชาเป้าหมาย) และทุกสถาบัน (รายวิชาต้นทาง) ใน query เดียว
+    versions = Curriculum.objects.order_by().values_list(Value('target'), 'id', 'catalog_version').union(
+        Institution.objects.order_by().values_list(Value('source'), 'id', 'catalog_version'),
+    )
+    return str(sorted(versions))
+
+def build_term_matrix():
+    """สร้างเมทริกซ์ TF-IDF ใหม่จากคำสำคัญของทุกรายวิชา แล้วบันทึกลงไฟล์"""
+    from .term_matrix import TermMatrix  # scipy/sklearn โหลดเมื่อใช้งานจริงเท่านั้น
+
+    stamp = _catalog_stamp()
+    documents = [
+        (('target', pk), terms) for pk, terms in TargetCourse.objects.order_by('id').values_list('id', 'keywords')
+    ] + [
+        (('source', pk), terms) for pk, terms in SourceCourse.objects.order_by('id').values_list('id', 'keywords')
+    ]
+    matrix = TermMatrix.build(documents, stamp=stamp)
+    matrix.save(_term_matrix_path())
+    return matrix
+
+def get_term_matrix():
+    """
+    เมทริกซ์ TF-IDF ของ catalog: ใช้ของใน process ถ้ายังตรงกับ catalog_version (query เดียว),
+    ถ้าไม่ตรงอ่านจากไฟล์, ถ้าไฟล์ไม่มีหรือเก่าแล้วจึงสร้างใหม่
+    """
+    from .term_matrix import TermMatrix
+
+    global _term_matrix
+    stamp = _catalog_stamp()
+    with _term_matrix_lock:
+        if _term_matrix is not None and _term_matrix.stamp == stamp:
+            return _term_matrix
+        try:
+            matrix = TermMatrix.load(_term_matrix_path())
+        except (OSError, KeyError, ValueError):
+            matrix = None
+        if matrix is None or matrix.stamp != stamp:
+            matrix = build_term_matrix()
+        _term_matrix = matrix
+        return matrix
+
+def explain_matches(course_pairs):
+    """
+    สร้างเหตุผลประกอบของหลายคู่ (original_course, target_course) พร้อมกัน
+    คำสำคัญที่ตรงกันหาด้วย intersection ของแถว TF-IDF และเรียงตาม IDF (คำเฉพาะทางมาก่อนคำทั่วไป)
+    """
+    course_pairs = list(course_pairs)
+    reasons = ["ไม่สามารถระบุเหตุผลได้ เนื่องจากข้อมูลคำอธิบายรายวิชาไม่เพียงพอ"] * len(course_pairs)
+    valid = [
+        index for index, (course1, course2) in enumerate(course_pairs)
+        if course1.course_description and course2.course_description
+    ]
+    if not valid:
+        return reasons
+
+    matrix = get_term_matrix()
+    if not len(matrix.vocabulary):
+        return reasons
+    # วิชาต้นทางแก้ไขคำอธิบายได้โดยไม่เปลี่ยน stamp จึงแปลงจากคำสำคัญปัจจุบันเสมอ
+    originals = matrix.transform([course_keywords(course_pairs[index][0]) for index in valid])
+    targets = matrix.lookup(
+        [('target', course_pairs[index][1].pk) for index in valid],
+        [course_keywords(course_pairs[index][1]) for index in valid],
+    )
+    for index, words in zip(valid, matrix.shared_terms(originals, targets)):
+        reasons[index] = format_reasoning(words)
+    return reasons
+
+def format_reasoning(common_words):
+    if common_words:
         return (
             f"จากการวิเคราะห์คำอธิบายรายวิชา พบเนื้อหาและคำสำคัญที่ตรงกัน ได้แก่: "
-            f"\"{', '.join(top_keywords)}\" "
+            f"\"{', '.join(common_words)}\" "
             f"ซึ่งแสดงถึงความสอดคล้องในเนื้อหาหลักของรายวิชา"
         )
-    
+
     return (
         "AI ตรวจพบความคล้ายคลึงในเชิงบริบทของประโยคและโครงสร้างเนื้อหา "
         "แม้จะไม่มีคำศัพท์เฉพาะที่ตรงกันเป๊ะ (อาจมีการใช้คำพ้องความหมาย)"
     )
 
+def generate_reasoning(course1, course2):
+    """
+    หาคำสำคัญ (Keywords) ที่ปรากฏในคำอธิบายรายวิชาของทั้ง 2 ฝั่ง
+    เพื่อใช้เป็นเหตุผลประกอบความสอดคล้อง
+    """
+    return explain_matches([(course1, course2)])[0]
+
+#================================#
+#  Curriculum Matrix Cache      #
+#================================#
+
+# ข้อมูลหลักสูตรแบบกะทัดรัด: เมทริกซ์ float32 (normalize แล้ว) + array ของ id / รหัสวิชา / หน่วยกิต
+CurriculumMatrix = namedtuple('CurriculumMatrix', ['version', 'course_ids', 'course_codes', 'credits', 'matrix'])
+
+def _record_nbytes(record):
+    return record.matrix.nbytes + record.course_ids.nbytes + record.course_codes.nbytes + record.credits.nbytes
+
+_curriculum_cache = OrderedDict()
+_curriculum_cache_bytes = 0
+_curriculum_cache_lock = threading.Lock()
+
+def clear_curriculum_cache():
+    global _curriculum_cache_bytes
+    with _curriculum_cache_lock:
+        _curriculum_cache.clear()
+        _curriculum_cache_bytes = 0
+
+def _cache_store(curriculum_id, record):
+    """เก็บลง cache แบบ LRU โดยจำกัดขนาดรวมเป็นจำนวน byte"""
+    global _curriculum_cache_bytes
+    with _curriculum_cache_lock:
+        previous = _curriculum_cache.pop(curriculum_id, None)
+        if previous is not None:
+            _curriculum_cache_bytes -= _record_nbytes(previous)
+
+        _curriculum_cache[curriculum_id] = record
+        _curriculum_cache_bytes += _record_nbytes(record)
+
+        limit = get_config('CURRICULUM_CACHE_BYTES')
+        while _curriculum_cache_bytes > limit and len(_curriculum_cache) > 1:
+            _, evicted = _curriculum_cache.popitem(last=False)
+            _curriculum_cache_bytes -= _record_nbytes(evicted)
+
+def get_curriculum_matrix(curriculum_id):
+    """
+    คืน CurriculumMatrix ของหลักสูตร (สร้างใหม่แบบ lazy เมื่อ catalog_version เปลี่ยน)
+    คืน None ถ้าไม่พบหลักสูตร
+    """
+    catalog_version = Curriculum.objects.filter(pk=curriculum_id).values_list('catalog_version', flat=True).first()
+    if catalog_version is None:
+        return None
+    # เปลี่ยนโมเดล/ไฟล์ ONNX ก็ต้องสร้างเมทริกซ์ใหม่เช่นกัน
+    version = (catalog_version, get_model_version())
+
+    with _curriculum_cache_lock:
+        record = _curriculum_cache.get(curriculum_id)
+        if record is not None and record.version == version:
+            _curriculum_cache.move_to_end(curriculum_id)
+            return record
+
+    rows = list(
+        TargetCourse.objects.filter(curriculum_id=curriculum_id)
+        .values_list('id', 'course_code', 'credits', 'course_description')
+    )
+    record = CurriculumMatrix(
+        version=version,
+        course_ids=np.array([row[0] for row in rows], dtype=np.int64),
+        course_codes=np.array([row[1] for row in rows], dtype=object),
+        credits=np.array([row[2] for row in rows], dtype=np.int32),
+        matrix=np.ascontiguousarray(get_embeddings([row[3] for row in rows]), dtype=np.float32),
+    )
+    _cache_store(curriculum_id, record)
+    return record
+
+# True เมื่อ preload() ทำงานจบแล้วอย่างน้อยหนึ่งครั้งใน process นี้ (ใช้ตัดสิน readiness)
+_warmed_up = False
+
+def preload(warm_caches=True):
+    """
+    โหลดโมเดลล่วงหน้า (และสร้าง cache เมทริกซ์ของทุกหลักสูตรถ้า warm_caches=True)
+    ให้ server เรียกตอนเริ่มทำงาน เพื่อไม่ให้คำขอแรกต้องรอโหลดโมเดล
+    """
+    global _warmed_up
+    get_model()
+    if warm_caches:
+        for curriculum_id in Curriculum.objects.values_list('id', flat=True):
+            get_curriculum_matrix(curriculum_id)
+        get_ann_index()
+        get_term_matrix()
+        if get_config('RETRIEVAL_MODE') == 'hybrid':
+            get_lexical_index()
+    if get_config('RERANK_MODEL_PATH'):
+        get_reranker()
+    _warmed_up = True
+
+#================================#
+#  ANN Index                    #
+#================================#
+
+_ann_index = None
+_ann_index_stamp = None
+_ann_index_lock = threading.Lock()
+
+def get_ann_index():
+    """
+    ดัชนี IVF ของ TargetCourse ทุกหลักสูตร (สร้างใหม่แบบ lazy เมื่อ catalog_version ของหลักสูตรใดเปลี่ยน)
+    """
+    global _ann_index, _ann_index_stamp
+    stamp = (get_model_version(), tuple(Curriculum.objects.order_by('id').values_list('id', 'catalog_version')))
+    with _ann_index_lock:
+        if _ann_index is not None and _ann_index_stamp == stamp:
+            return _ann_index
+
+    rows = list(TargetCourse.objects.values_list('id', 'curriculum_id', 'course_description'))
+    vectors = get_embeddings([row[2] for row in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+    index = IVFIndex(
+        vectors,
+        course_ids=[row[0] for row in rows],
+        curriculum_ids=[row[1] for row in rows],
+        nprobe=get_config('ANN_NPROBE'),
+        exact_threshold=get_config('ANN_EXACT_THRESHOLD'),
+    )
+    with _ann_index_lock:
+        _ann_index, _ann_index_stamp = index, stamp
+    return index
+
+def find_top_matches(original_courses, target_curriculum_id, k=None):
+    """
+    หารายวิชาที่ใกล้เคียงที่สุด k อันดับ (ภายในหลักสูตรเป้าหมาย) ให้ทุกวิชาในรายการ
+    คืนค่าเป็น list (ตามลำดับ original_courses) ของ [(target_course_id, score), ...]
+    (ค้นแบบ dense หรือ hybrid ตาม RETRIEVAL_MODE)
+    """
+    original_courses = list(original_courses)
+    k = k or get_config('TOP_K')
+    rerank = bool(get_config('RERANK_MODEL_PATH'))
+    width = max(k, get_config('RERANK_CANDIDATES')) if rerank else k
+
+    if get_config('RETRIEVAL_MODE') == 'hybrid':
+        ranked = find_hybrid_matches(original_courses, target_curriculum_id, width)
+    else:
+        ranked = find_dense_matches(original_courses, target_curriculum_id, width)
+    if rerank:
+        ranked = rerank_matches(original_courses, ranked)
+    return [matches[:k] for matches in ranked]
+
+def find_dense_matches(original_courses, target_curriculum_id, k=None):
+    """ค้นจากดัชนี ANN ของเวกเตอร์อย่างเดียว"""
+    original_courses = list(original_courses)
+    if not original_courses:
+        return []
+    k = k or get_config('TOP_K')
+
+    index = get_ann_index()
+    original_embeddings = get_embeddings([course.course_description for course in original_courses])
+
+    results = []
+    for embedding in original_embeddings:
+        course_ids, scores = index.search(embedding, k, curriculum_id=target_curriculum_id)
+        results.append([(int(course_id), float(score)) for course_id, score in zip(course_ids, scores)])
+    return results
+
+#================================#
+#  Lexical Index (BM25)         #
+#================================#
+
+# ดัชนี BM25 ของคำอธิบายรายวิชา: TargetCourse แยกกลุ่มตามหลักสูตร, SourceCourse แยกกลุ่มตามสถาบัน
+# (SourceCourse ช่วยให้สถิติ IDF ครอบคลุมคำที่ใช้ในสถาบันต้นทางด้วย)
+# แต่ละกลุ่มผูกกับ catalog_version ในฐานข้อมูล ทุก process จึงเห็นการแก้ไขรายวิชาเหมือนกัน
+_lexical_index = None
+_lexical_versions = {}  # group -> catalog_version ที่อ่านมาล่าสุด
+_lexical_hashes = {}    # group -> {course_id: description_hash} ใช้ตัดคำใหม่เฉพาะวิชาที่เปลี่ยน
+_lexical_index_lock = threading.Lock()
+
+def _target_group(curriculum_id):
+    return ('target', curriculum_id)
+
+def _source_group(institution_id):
+    return ('source', institution_id)
+
+def _sync_lexical_group(group, rows):
+    """ปรับกลุ่มให้ตรงกับ rows [(course_id, description), ...] โดยตัดคำใหม่เฉพาะวิชาที่เพิ่ม/แก้ไข"""
+    previous = _lexical_hashes.pop(group, {})
+    current = {}
+    for course_id, description in rows:
+        digest = description_hash(description)
+        if previous.pop(course_id, None) != digest:
+            _lexical_index.add(group, course_id, tokenize(description))
+        current[course_id] = digest
+    for course_id in previous:
+        _lexical_index.remove(group, course_id)
+    if current:
+        _lexical_hashes[group] = current
+
+def get_lexical_index():
+    """
+    คืนดัชนี BM25 ที่เป็นปัจจุบัน
+    อ่านใหม่เฉพาะหลักสูตร/สถาบันที่ catalog_version เปลี่ยน และตัดคำใหม่เฉพาะรายวิชาที่คำอธิบายเปลี่ยน
+    """
+    global _lexical_index
+    versions = {
+        _target_group(pk): version for pk, version in Curriculum.objects.values_list('id', 'catalog_version')
+    }
+    versions.update(
+        (_source_group(pk), version) for pk, version in Institution.objects.values_list('id', 'catalog_version')
+    )
+
+    with _lexical_index_lock:
+        if _lexical_index is None:
+            _lexical_index = BM25Index(k1=get_config('BM25_K1'), b=get_config('BM25_B'))
+            _lexical_versions.clear()
+            _lexical_hashes.clear()
+
+        stale = {group for group, version in versions.items() if _lexical_versions.get(group) != version}
+        for group in [group for group in _lexical_versions if group not in versions]:
+            _lexical_index.remove_group(group)
+            _lexical_hashes.pop(group, None)
+            del _lexical_versions[group]
+        if not stale:
+            return _lexical_index
+
+        rows = {group: [] for group in stale}
+        curriculum_ids = [pk for kind, pk in stale if kind == 'target']
+        targets = TargetCourse.objects.filter(curriculum_id__in=curriculum_ids).values_list(
+            'id', 'curriculum_id', 'course_description',
+        )
+        for course_id, curriculum_id, description in targets.iterator():
+            rows[_target_group(curriculum_id)].append((course_id, description))
+        institution_ids = [pk for kind, pk in stale if kind == 'source']
+        sources = SourceCourse.objects.filter(institution_id__in=institution_ids).values_list(
+            'id', 'institution_id', 'course_description',
+        )
+        for course_id, institution_id, description in sources.iterator():
+            rows[_source_group(institution_id)].append((course_id, description))
+
+        for group, group_rows in rows.items():
+            _sync_lexical_group(group, group_rows)
+            _lexical_versions[group] = versions[group]
+        return _lexical_index
+
+def lexical_search(text, target_curriculum_id, k):
+    """คืน [(target_course_id, bm25_score), ...] ของรายวิชาในหลักสูตรที่มีคำตรงกับ text มากที่สุด"""
+    index = get_lexical_index()
+    with _lexical_index_lock:
+        return index.search(tokenize(text), _target_group(target_curriculum_id), k)
+
+def find_hybrid_matches(original_courses, target_curriculum_id, k=None):
+    """
+    ค้นสองขั้น: BM25 คัดผู้สมัคร HYBRID_CANDIDATES วิชา แล้วรวมคะแนนกับ cosine
+        fused = HYBRID_SEMANTIC_WEIGHT * cosine + HYBRID_LEXICAL_WEIGHT * (bm25 / bm25 สูงสุดของ query)
+    ถ้า BM25 ได้ผู้สมัครไม่ถึง k วิชา (ไม่มีคำตรงกัน) จะเติมจากดัชนี ANN
+    คืนรูปแบบเดียวกับ find_dense_matches (เรียงตาม fused แต่คะแนนที่คืนเป็น cosine)
+    """
+    original_courses = list(original_courses)
+    if not original_courses:
+        return []
+    k = k or get_config('TOP_K')
+
+    record = get_curriculum_matrix(target_curriculum_id)
+    if record is None or not len(record.course_ids):
+        return [[] for _ in original_courses]
+    rows_by_id = {int(course_id): row for row, course_id in enumerate(record.course_ids)}
+
+    semantic_weight = get_config('HYBRID_SEMANTIC_WEIGHT')
+    lexical_weight = get_config('HYBRID_LEXICAL_WEIGHT')
+    width = max(k, get_config('HYBRID_CANDIDATES'))
+    original_embeddings = get_embeddings([course.course_description for course in original_courses])
+
+    results = []
+    for course, embedding in zip(original_courses, original_embeddings):
+        hits = dict(lexical_search(course.course_description, target_curriculum_id, width))
+        if len(hits) < k:
+            dense_ids, _ = get_ann_index().search(embedding, k, curriculum_id=target_curriculum_id)
+            for course_id in dense_ids.tolist():
+                hits.setdefault(int(course_id), 0.0)
+
+        candidate_ids = [course_id for course_id in hits if course_id in rows_by_id]
+        if not candidate_ids:
+            results.append([])
+            continue
+        cosine = record.matrix[[rows_by_id[course_id] for course_id in candidate_ids]] @ embedding
+        lexical = np.array([hits[course_id] for course_id in candidate_ids], dtype=np.float32)
+        if lexical.max() > 0:
+            lexical /= lexical.max()
+        fused = semantic_weight * cosine + lexical_weight * lexical
+        best = top_k(fused, k)
+        results.append([(candidate_ids[index], float(cosine[index])) for index in best])
+    return results
+
+#================================#
+#  Cross-encoder Reranking      #
+#================================#
+
+_reranker = None
+_reranker_lock = threading.Lock()
+# เวลาเฉลี่ยต่อคู่ของ cross-encoder (ค่าเฉลี่ยถ่วงน้ำหนัก) ใช้ประมาณว่า batch ถัดไปจะเสร็จทันงบเวลาหรือไม่
+_rerank_pair_seconds = None
+
+def get_rerank_model_name():
+    """
+    คีย์ของ reranker ใน RerankScore/เวอร์ชันผลจับคู่: ชื่อโฟลเดอร์ + แฮชของ path เต็ม
+    (โมเดลคนละโฟลเดอร์ที่ชื่อท้ายเหมือนกัน เช่น .../v1/reranker กับ .../v2/reranker ต้องไม่ใช้คะแนนร่วมกัน)
+    """
+    path = os.path.realpath(get_config('RERANK_MODEL_PATH'))
+    return f"{os.path.basename(path)}@{hashlib.sha256(path.encode('utf-8')).hexdigest()[:12]}"
+
+def get_reranker():
+    """cross-encoder จาก RERANK_MODEL_PATH (โหลดครั้งเดียวต่อ process, ไม่ดาวน์โหลดจากอินเทอร์เน็ต)"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                path = get_config('RERANK_MODEL_PATH')
+                if not path or not os.path.isdir(path):
+                    raise ImproperlyConfigured(f"AI_COMPARATOR['RERANK_MODEL_PATH'] {path!r} is not a local directory")
+                from sentence_transformers import CrossEncoder
+
+                print(f"Loading reranker ({path})... Please wait.")
+                _reranker = CrossEncoder(path, device='cpu', local_files_only=True)
+                print("Reranker Loaded Successfully!")
+    return _reranker
+
+def rerank_matches(original_courses, ranked):
+    """
+    เรียงผู้สมัครของแต่ละวิชาใหม่ตามคะแนน cross-encoder (คะแนนที่คืนยังเป็น cosine ของ bi-encoder)
+    - คะแนนของคู่ที่เคยคำนวณแล้วอ่านจาก RerankScore (คีย์เป็นแฮชของคำอธิบายทั้งสองฝั่ง)
+    - คู่ที่ยังไม่มีคะแนนรันเป็น batch ทีละหลายวิชา ถ้าเวลาที่ประมาณไว้ของ batch ถัดไปเกิน RERANK_TIME_BUDGET_MS
+      จะหยุด และวิชาที่เหลือคืนลำดับเดิมของ bi-encoder
+    - เวลาโหลด reranker ไม่นับรวมในงบเวลา (ปกติโหลดไว้แล้วใน preload)
+    """
+    global _rerank_pair_seconds
+    reranker = get_reranker()
+    deadline = time.monotonic() + get_config('RERANK_TIME_BUDGET_MS') / 1000
+    model_name = get_rerank_model_name()
+
+    target_ids = {course_id for matches in ranked for course_id, _ in matches}
+    target_texts = dict(TargetCourse.objects.filter(pk__in=target_ids).values_list('id', 'course_description'))
+    target_hashes = {course_id: description_hash(text) for course_id, text in target_texts.items()}
+    source_hashes = [description_hash(course.course_description) for course in original_courses]
+
+    scores = {
+        (row.source_hash, row.target_hash): row.score
+        for row in RerankScore.objects.filter(
+            model_name=model_name,
+            source_hash__in=set(source_hashes),
+            target_hash__in=set(target_hashes.values()),
+        )
+    }
+
+    def pending_pairs(row):
+        return {
+            (source_hashes[row], target_hashes[course_id]): (original_courses[row].course_description, target_texts[course_id])
+            for course_id, _ in ranked[row]
+            if course_id in target_hashes and (source_hashes[row], target_hashes[course_id]) not in scores
+        }
+
+    # จัดวิชาเป็นกลุ่ม ให้แต่ละ batch มีคู่ประมาณ RERANK_BATCH_SIZE (วิชาหนึ่งไม่ถูกแบ่งข้าม batch)
+    batches, batch = [], {}
+    for row in range(len(original_courses)):
+        batch.update(pending_pairs(row))
+        if len(batch) >= get_config('RERANK_BATCH_SIZE'):
+            batches.append(batch)
+            batch = {}
+    if batch:
+        batches.append(batch)
+
+    for batch in batches:
+        started = time.monotonic()
+        if started + len(batch) * (_rerank_pair_seconds or 0) >= deadline:
+            break
+        keys = list(batch)
+        predicted = reranker.predict([batch[key] for key in keys], batch_size=get_config('RERANK_BATCH_SIZE'))
+        pair_seconds = (time.monotonic() - started) / len(keys)
+        _rerank_pair_seconds = pair_seconds if _rerank_pair_seconds is None else 0.8 * _rerank_pair_seconds + 0.2 * pair_seconds
+        new_scores = {key: float(score) for key, score in zip(keys, predicted)}
+        scores.update(new_scores)
+        RerankScore.objects.bulk_create(
+            [
+                RerankScore(model_name=model_name, source_hash=source_hash, target_hash=target_hash, score=score)
+                for (source_hash, target_hash), score in new_scores.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+    results = []
+    for row, matches in enumerate(ranked):
+        keys = [(source_hashes[row], target_hashes.get(course_id)) for course_id, _ in matches]
+        if not all(key in scores for key in keys):
+            # ยังไม่มีคะแนนครบ (หมดเวลา) ใช้ลำดับของ bi-encoder ตามเดิม
+            results.append(matches)
+            continue
+        order = sorted(range(len(matches)), key=lambda index: -scores[keys[index]])
+        results.append([matches[index] for index in order])
+    return results
+
+def readiness():
+    """
+    สถานะความพร้อมของ process นี้ (ใช้โดย /health/ready)
+    พร้อม = โหลดโมเดลแล้วและ preload() จบแล้วหนึ่งครั้ง ไม่ขึ้นกับว่า cache หลักสูตรยังตรงกับฐานข้อมูลหรือไม่
+    (แก้รายวิชาทำให้ cache เก่า และ cache แบบ LRU อาจเก็บได้ไม่ครบทุกหลักสูตร แต่ process ยังรับคำขอได้
+    เมทริกซ์ที่เก่าจะถูกสร้างใหม่แบบ lazy ตอนใช้งาน) curricula_cached มีไว้ดูประกอบเท่านั้น
+    """
+    model_version = get_model_version()
+    versions = {
+        curriculum_id: (catalog_version, model_version)
+        for curriculum_id, catalog_version in Curriculum.objects.values_list('id', 'catalog_version')
+    }
+    with _curriculum_cache_lock:
+        cached = sum(
+            1 for curriculum_id, version in versions.items()
+            if curriculum_id in _curriculum_cache and _curriculum_cache[curriculum_id].version == version
+        )
+    return {
+        'model_loaded': is_model_loaded(),
+        'curricula_cached': cached,
+        'curricula_total': len(versions),
+        'warmed_up': _warmed_up,
+        'ready': is_model_loaded() and _warmed_up,
+    }
+
+#================================#
+#  Matching                     #
+#================================#
+
 def find_best_match(original_course, target_curriculum_id):
     """
     หาคอร์สที่ใกล้เคียงที่สุดในหลักสูตรเป้าหมาย
     """
-    # ดึงรายวิชาทั้งหมดในหลักสูตรเป้าหมาย
-    target_courses = TargetCourse.objects.filter(curriculum_id=target_curriculum_id)
-    if not target_courses.exists():
-        return None, 0, "ไม่พบรายวิชาในหลักสูตรเป้าหมาย"
+    return find_best_matches([original_course], target_curriculum_id)[0]
+
+def find_best_matches(original_courses, target_curriculum_id, ranked=None):
+    """
+    หาคอร์สที่ใกล้เคียงที่สุดให้ทุกวิชาในคำร้องพร้อมกันในครั้งเดียว
+    (encode วิชาต้นทางเป็น batch เดียว แล้วคูณกับเมทริกซ์ของหลักสูตรจาก cache ครั้งเดียว)
+    ถ้าใช้ hybrid หรือ reranker ผลอันดับ 1 มาจาก find_top_matches (ส่ง ranked มาได้ถ้าคำนวณไว้แล้ว)
+    คืนค่าเป็น list ของ (best_matching_course, score, reason) เรียงตาม original_courses
+    """
+    original_courses = list(original_courses)
+    if not original_courses:
+        return []
+
+    record = get_curriculum_matrix(target_curriculum_id)
+    if record is None or not len(record.course_ids):
+        return [(None, 0, "ไม่พบรายวิชาในหลักสูตรเป้าหมาย") for _ in original_courses]
+
+    if get_config('RETRIEVAL_MODE') == 'hybrid' or get_config('RERANK_MODEL_PATH'):
+        if ranked is None:
+            ranked = find_top_matches(original_courses, target_curriculum_id, k=1)
+        best = [matches[0] if matches else (None, 0.0) for matches in ranked]
+    else:
+        original_embeddings = get_embeddings([course.course_description for course in original_courses])
+
+        # เมทริกซ์ความเหมือน (items x targets)
+        cosine_scores = original_embeddings @ record.matrix.T
+        best_indices = cosine_scores.argmax(axis=1)
+        best = [
+            (int(record.course_ids[index]), float(cosine_scores[row, index]))
+            for row, index in enumerate(best_indices)
+        ]
+
+    # ดึงจากฐานข้อมูลเฉพาะรายวิชาที่ชนะ (เพื่อใช้สร้างเหตุผล และเป็น FK ของผลลัพธ์)
+    best_courses = TargetCourse.objects.in_bulk({course_id for course_id, _ in best if course_id is not None})
+
+    # รายวิชาที่ถูกลบไประหว่างที่กำลังจับคู่จะไม่มีผล (cache จะถูกสร้างใหม่ในรอบถัดไป)
+    found = [
+        (row, best_courses[course_id]) for row, (course_id, _) in enumerate(best) if course_id in best_courses
+    ]
+    reasons = explain_matches([(original_courses[row], course) for row, course in found])
+
+    results = [(None, 0, "ไม่พบรายวิชาในหลักสูตรเป้าหมาย")] * len(original_courses)
+    for (row, course), reason in zip(found, reasons):
+        results[row] = (course, best[row][1], reason)
+    return results
+
+def assign_optimal_matches(original_courses, target_curriculum_id, exclude_course_ids=()):
+    """
+    จับคู่ทุกวิชาในคำร้องกับรายวิชาเป้าหมายแบบหนึ่งต่อหนึ่ง ให้ผลรวมคะแนนสูงสุด (Hungarian algorithm)
+    - คู่ที่หน่วยกิตวิชาต้นทางน้อยกว่าวิชาเป้าหมายจะถูกเลือกก็ต่อเมื่อไม่มีคู่อื่นเหลือแล้ว
+    - รายวิชาใน exclude_course_ids (เช่น ที่ถูกจับคู่ไปแล้ว) จะไม่ถูกเลือกซ้ำ
+    คืนค่าเป็น list ของ (course, score, reason) เรียงตาม original_courses
+    (course เป็น None ถ้ารายการเกินจำนวนรายวิชาเป้าหมายที่เหลือ)
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    original_courses = list(original_courses)
+    unassigned = (None, 0, "ไม่มีรายวิชาเป้าหมายเหลือให้จับคู่")
+    record, scores = similarity_matrix(original_courses, target_curriculum_id)
+    if record is None or not original_courses:
+        return [unassigned for _ in original_courses]
+
+    available = ~np.isin(record.course_ids, np.asarray(list(exclude_course_ids), dtype=np.int64))
+    course_ids = record.course_ids[available]
+    scores = scores[:, available]
+
+    # cost = -คะแนน, คู่ที่หน่วยกิตไม่พอถูกบวกโทษ 2 (มากกว่าช่วงของ cosine ทั้งหมด) จึงถูกเลือกเป็นลำดับสุดท้าย
+    source_credits = np.array([course.credits for course in original_courses], dtype=np.int32)
+    insufficient = source_credits[:, None] < record.credits[available][None, :]
+    rows, columns = linear_sum_assignment(insufficient * 2.0 - scores)
+
+    assigned = TargetCourse.objects.in_bulk(course_ids[columns].tolist())
+    found = [
+        (row, column, assigned[int(course_ids[column])])
+        for row, column in zip(rows.tolist(), columns.tolist())
+        if int(course_ids[column]) in assigned
+    ]
+    reasons = explain_matches([(original_courses[row], course) for row, _, course in found])
+
+    results = [unassigned] * len(original_courses)
+    for (row, column, course), reason in zip(found, reasons):
+        results[row] = (course, float(scores[row, column]), reason)
+    return results
+
+def find_combination_matches(original_courses, target_curriculum_id):
+    """
+    หากลุ่มวิชาต้นทาง 2..COMBINATION_MAX_SIZE วิชา ที่รวมกันแล้วครอบคลุมรายวิชาเป้าหมายหนึ่งวิชา
+    (แต่ละวิชาหน่วยกิตไม่พอ แต่หน่วยกิตรวมพอ) คะแนนของกลุ่มคือ cosine ของเวกเตอร์เฉลี่ยกับวิชาเป้าหมาย
+
+    ทำงานแบบ vectorized ทั้งหมด:
+    1. แต่ละวิชาเป้าหมายเลือกวิชาผู้สมัครได้ไม่เกิน COMBINATION_CANDIDATES วิชาที่คะแนนเดี่ยวสูงสุด
+    2. ตัดวิชาเป้าหมายที่ขอบบนของคะแนนกลุ่ม (ผลรวมคะแนนสูงสุด / ขนาดต่ำสุดของเวกเตอร์รวม)
+       ต่ำกว่า COMBINATION_MIN_SCORE ทิ้งก่อน
+    3. คำนวณทุกกลุ่มของวิชาเป้าหมายที่เหลือพร้อมกัน แล้วเลือกกลุ่มที่ดีที่สุดแบบไม่ใช้วิชาซ้ำ (greedy)
+
+    คืน list ของ (target_course_id, [index ใน original_courses], score, total_credits) เรียงตามคะแนน
+    """
+    from itertools import combinations
 
-    original_desc = original_course.course_description
-    target_descs = [course.course_description for course in target_courses]
+    original_courses = list(original_courses)
+    if len(original_courses) < 2:
+        return []
+    record = get_curriculum_matrix(target_curriculum_id)
+    if record is None or not len(record.course_ids):
+        return []
+
+    embeddings = get_embeddings([course.course_description for course in original_courses])
+    credits = np.array([course.credits for course in original_courses], dtype=np.int32)
+    scores = embeddings @ record.matrix.T   # items x targets
+    gram = embeddings @ embeddings.T        # items x items
+    min_score = get_config('COMBINATION_MIN_SCORE')
+
+    # 1. วิชาผู้สมัคร: หน่วยกิตไม่พอเทียบเดี่ยว และคะแนนเดี่ยวเป็นบวก
+    eligible = (credits[:, None] < record.credits[None, :]) & (scores > 0)
+    masked = np.where(eligible, scores, -np.inf)
+    width = min(get_config('COMBINATION_CANDIDATES'), len(original_courses))
+    candidates = np.argsort(-masked, axis=0, kind='stable')[:width].T            # targets x width
+    candidate_scores = np.take_along_axis(masked.T, candidates, axis=1)        # targets x width
+    valid = np.isfinite(candidate_scores)
+
+    # 2. ขอบบน: ||sum(e)||^2 >= k + k(k-1) * min(gram) ระหว่างวิชาผู้สมัคร
+    sizes = range(2, min(get_config('COMBINATION_MAX_SIZE'), width) + 1)
+    pair_gram = gram[candidates[:, :, None], candidates[:, None, :]]
+    pair_valid = valid[:, :, None] & valid[:, None, :] & ~np.eye(width, dtype=bool)
+    min_gram = np.where(pair_valid, pair_gram, np.inf).min(axis=(1, 2))
+    sorted_scores = np.sort(np.where(valid, candidate_scores, 0), axis=1)[:, ::-1]
+    bound = np.zeros(len(record.course_ids))
+    for size in sizes:
+        norm_squared = size + size * (size - 1) * min_gram
+        size_bound = np.where(
+            norm_squared > 1e-6,
+            sorted_scores[:, :size].sum(axis=1) / np.sqrt(np.maximum(norm_squared, 1e-6)),
+            np.inf,
+        )
+        bound = np.maximum(bound, size_bound)
+    targets = np.flatnonzero((valid.sum(axis=1) >= 2) & (bound >= min_score))
+
+    # 3. คะแนนจริงของทุกกลุ่ม (targets x groups)
+    groups = []
+    for size in sizes:
+        slots = np.array(list(combinations(range(width), size)), dtype=np.int64)
+        members = candidates[targets][:, slots]                                  # targets x groups x size
+        member_valid = valid[targets][:, slots].all(axis=2)
+        member_scores = scores[members, targets[:, None, None]]
+        norm_squared = size + 2 * sum(
+            gram[members[:, :, a], members[:, :, b]] for a, b in combinations(range(size), 2)
+        )
+        group_scores = member_scores.sum(axis=2) / np.sqrt(np.maximum(norm_squared, 1e-6))
+        group_credits = credits[members].sum(axis=2)
+        keep = (
+            member_valid
+            & (group_credits >= record.credits[targets][:, None])
+            & (group_scores >= min_score)
+            # กลุ่มต้องดีกว่าวิชาที่ดีที่สุดในกลุ่มเพียงลำพัง
+            & (group_scores > member_scores.max(axis=2))
+        )
+        for row, column in zip(*np.nonzero(keep)):
+            groups.append((
+                float(group_scores[row, column]),
+                int(targets[row]),
+                members[row, column].tolist(),
+                int(group_credits[row, column]),
+            ))
+
+    results, used_items, used_targets = [], set(), set()
+    for score, target, members, total_credits in sorted(groups, key=lambda group: -group[0]):
+        if target in used_targets or used_items.intersection(members):
+            continue
+        used_targets.add(target)
+        used_items.update(members)
+        results.append((int(record.course_ids[target]), sorted(members), score, total_credits))
+    return results
+
+def similarity_matrix(original_courses, target_curriculum_id):
+    """
+    คำนวณเมทริกซ์ความเหมือนทั้งหมด (items x รายวิชาในหลักสูตร) จากเวกเตอร์ที่ cache ไว้
+    คืน (CurriculumMatrix, scores) หรือ (None, None) ถ้าไม่พบหลักสูตร
+    """
+    record = get_curriculum_matrix(target_curriculum_id)
+    if record is None:
+        return None, None
 
-    # AI คำนวณความเหมือน (Vector Similarity)
-    original_embedding = model.encode(original_desc, convert_to_tensor=True)
-    target_embeddings = model.encode(target_descs, convert_to_tensor=True)
+    original_courses = list(original_courses)
+    if not original_courses or not len(record.course_ids):
+        return record, np.zeros((len(original_courses), len(record.course_ids)), dtype=np.float32)
 
-    cosine_scores = util.pytorch_cos_sim(original_embedding, target_embeddings)
+    original_embeddings = get_embeddings([course.course_description for course in original_courses])
+    return record, original_embeddings @ record.matrix.T
 
-    best_score_index = cosine_scores[0].argmax().item()
-    best_score = cosine_scores[0][best_score_index].item()
-    best_matching_course = target_courses[best_score_index]
-    
-    # สร้างเหตุผลประกอบจากคำอธิบายรายวิชา
-    reason = generate_reasoning(original_desc, best_matching_course.course_description)
+def calculate_similarities(course_pairs):
+    """คำนวณคะแนนความเหมือนของหลายคู่ (course1, course2) พร้อมกัน (อ่านเวกเตอร์จาก store ครั้งเดียว)"""
+    course_pairs = list(course_pairs)
+    scores = [0] * len(course_pairs)
+    valid = [
+        index for index, (course1, course2) in enumerate(course_pairs)
+        if course1 and course2 and course1.course_description and course2.course_description
+    ]
+    if not valid:
+        return scores
 
-    return best_matching_course, best_score, reason
+    embeddings = get_embeddings([
+        description
+        for index in valid
+        for description in (course_pairs[index][0].course_description, course_pairs[index][1].course_description)
+    ])
+    pair_scores = np.einsum('ij,ij->i', embeddings[0::2], embeddings[1::2])
+    for index, score in zip(valid, pair_scores):
+        scores[index] = float(score)
+    return scores
 
 def calculate_similarity(course1, course2):
     """คำนวณคะแนนความเหมือนระหว่าง 2 วิชา"""
-    if not course1 or not course2 or not course1.course_description or not course2.course_description:
-        return 0
-        
-    descriptions = [course1.course_description, course2.course_description]
-    embeddings = model.encode(descriptions, convert_to_tensor=True)
-    cosine_score = util.pytorch_cos_sim(embeddings[0], embeddings[1])
-    return cosine_score.item()
\ No newline at end of file
+    return calculate_similarities([(course1, course2)])[0]
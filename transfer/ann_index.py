@@ -0,0 +1,110 @@
+# transfer/ann_index.py
+"""
+ดัชนีค้นหาเวกเตอร์ใกล้เคียง (Approximate Nearest Neighbor) แบบ IVF เขียนด้วย NumPy ล้วน
+
+- แบ่งเวกเตอร์ของ TargetCourse ทั้งหมดออกเป็น nlist กลุ่มด้วย spherical k-means
+- ตอนค้นหา เลือกตรวจเฉพาะ nprobe กลุ่มที่ centroid ใกล้ที่สุด แล้วกรองตามหลักสูตร
+- หลักสูตรที่มีรายวิชาไม่เกิน exact_threshold จะคำนวณแบบตรงๆ (เร็วกว่าและแม่นยำ 100%)
+  ค่าเริ่มต้น 2048 ตั้งใจให้สูงกว่าขนาดหลักสูตรทั่วไป (หลักสูตรละไม่กี่สิบถึงร้อยวิชา) ซึ่ง matmul ของ NumPy
+  เร็วกว่าการเลือกกลุ่มของ IVF อยู่แล้ว IVF มีไว้สำหรับ catalog ที่หลักสูตรใหญ่ขึ้นมาก
+"""
+import numpy as np
+
+
+def _spherical_kmeans(vectors, nlist, iterations=10, seed=0):
+    """k-means บนทรงกลมหน่วย (ใช้ dot product เป็นระยะ) คืน centroids ที่ normalize แล้ว"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # กลุ่มที่ว่างให้สุ่มจุดใหม่ แทนที่จะทิ้งไป
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        norms[empty] = 1
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def top_k(scores, k):
+    """คืน index ของคะแนนสูงสุด k ตัว เรียงจากมากไปน้อย (argpartition แทนการ sort ทั้งหมด)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class IVFIndex:
+    def __init__(self, vectors, course_ids, curriculum_ids, nlist=None, nprobe=8, exact_threshold=2048):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.curriculum_ids = np.asarray(curriculum_ids, dtype=np.int64)
+        self.nprobe = nprobe
+        self.exact_threshold = exact_threshold
+
+        # แถวของแต่ละหลักสูตร (สำหรับค้นหาแบบตรงๆ ในหลักสูตรเล็ก)
+        order = np.argsort(self.curriculum_ids, kind='stable')
+        boundaries = np.flatnonzero(np.diff(self.curriculum_ids[order])) + 1
+        self.curriculum_rows = {
+            int(self.curriculum_ids[rows[0]]): rows
+            for rows in np.split(order, boundaries) if len(rows)
+        }
+
+        count = len(self.vectors)
+        if nlist is None:
+            nlist = int(np.sqrt(count))
+        self.nlist = max(1, min(nlist, count))
+        if count > self.exact_threshold:
+            self.centroids = _spherical_kmeans(self.vectors, self.nlist)
+            assignment = (self.vectors @ self.centroids.T).argmax(axis=1)
+            self.lists = [np.flatnonzero(assignment == cluster) for cluster in range(self.nlist)]
+        else:
+            self.centroids = None
+            self.lists = None
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes + (self.centroids.nbytes if self.centroids is not None else 0)
+
+    def _exact(self, query, rows, k):
+        scores = self.vectors[rows] @ query
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+    def search(self, query, k, curriculum_id=None):
+        """
+        คืน (course_ids, scores) ของรายวิชาที่ใกล้ query ที่สุด k อันดับ
+        ถ้าระบุ curriculum_id จะคืนเฉพาะรายวิชาในหลักสูตรนั้น
+        """
+        query = np.asarray(query, dtype=np.float32)
+
+        if curriculum_id is not None:
+            rows = self.curriculum_rows.get(int(curriculum_id))
+            if rows is None:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        else:
+            rows = np.arange(len(self.vectors))
+
+        if self.centroids is None or len(rows) <= self.exact_threshold:
+            found, scores = self._exact(query, rows, k)
+            return self.course_ids[found], scores
+
+        # IVF: ตรวจเฉพาะกลุ่มที่ใกล้ที่สุด ถ้าผ่านตัวกรองแล้วยังไม่ครบ k ให้ขยายจำนวนกลุ่ม
+        cluster_order = np.argsort(-(self.centroids @ query))
+        nprobe = self.nprobe
+        while True:
+            candidates = np.concatenate([self.lists[cluster] for cluster in cluster_order[:nprobe]])
+            if curriculum_id is not None:
+                candidates = candidates[self.curriculum_ids[candidates] == int(curriculum_id)]
+            if len(candidates) >= k or nprobe >= self.nlist:
+                break
+            nprobe *= 2
+
+        found, scores = self._exact(query, candidates, k)
+        return self.course_ids[found], scores
@@ -0,0 +1,84 @@
+# transfer/lexical_index.py
+"""
+ดัชนีคำ (inverted index) สำหรับค้นหาแบบ BM25 เขียนด้วย Python ล้วน
+
+- เอกสารแต่ละชิ้นอยู่ในกลุ่ม (group) เช่น ('target', curriculum_id) หรือ ('source', institution_id)
+  การค้นหาจะอ่าน posting list ของกลุ่มที่ต้องการเท่านั้น
+- สถิติ IDF และความยาวเฉลี่ยคำนวณจากเอกสารทุกกลุ่มรวมกัน
+- เพิ่ม/ลบ/แทนที่เอกสารทีละชิ้นได้ (ไม่ต้องสร้างดัชนีใหม่ทั้งหมดเมื่อรายวิชาถูกแก้ไข)
+- รับคำที่ตัดแล้ว (ดู transfer/tokenizer.py)
+"""
+import math
+from collections import Counter
+from heapq import nlargest
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}      # group -> term -> {doc_id: tf}
+        self.documents = {}     # (group, doc_id) -> Counter ของคำในเอกสาร
+        self.lengths = {}       # group -> {doc_id: จำนวนคำ}
+        self.doc_freq = Counter()
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, key):
+        return key in self.documents
+
+    def add(self, group, doc_id, tokens):
+        """เพิ่มเอกสาร (ถ้ามีอยู่แล้วจะถูกแทนที่)"""
+        self.remove(group, doc_id)
+        terms = Counter(tokens)
+        self.documents[(group, doc_id)] = terms
+        length = sum(terms.values())
+        self.lengths.setdefault(group, {})[doc_id] = length
+        self.total_length += length
+        postings = self.postings.setdefault(group, {})
+        for term, tf in terms.items():
+            postings.setdefault(term, {})[doc_id] = tf
+            self.doc_freq[term] += 1
+
+    def remove(self, group, doc_id):
+        terms = self.documents.pop((group, doc_id), None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths[group].pop(doc_id)
+        postings = self.postings[group]
+        for term in terms:
+            del postings[term][doc_id]
+            if not postings[term]:
+                del postings[term]
+            self.doc_freq[term] -= 1
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+
+    def remove_group(self, group):
+        for doc_id in list(self.lengths.get(group, ())):
+            self.remove(group, doc_id)
+        self.postings.pop(group, None)
+        self.lengths.pop(group, None)
+
+    def search(self, tokens, group, k):
+        """คืน [(doc_id, score), ...] ของเอกสารในกลุ่มที่ได้คะแนน BM25 สูงสุด k อันดับ"""
+        postings = self.postings.get(group)
+        if not postings or not self.documents:
+            return []
+
+        count = len(self.documents)
+        average_length = self.total_length / count or 1
+        lengths = self.lengths[group]
+        scores = Counter()
+        for term in set(tokens):
+            docs = postings.get(term)
+            if not docs:
+                continue
+            df = self.doc_freq[term]
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / average_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return nlargest(k, scores.items(), key=lambda pair: pair[1])
@@ -0,0 +1,24 @@
+# transfer/management/commands/backfill_explanations.py
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+from transfer.matching import explain_request
+from transfer.models import TransferRequest
+
+class Command(BaseCommand):
+    help = 'Generates the keyword explanation of AI results, one batch per transfer request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='Regenerate explanations that already exist')
+
+    def handle(self, *args, **options):
+        requests = TransferRequest.objects.filter(requestitem__aicomparisonresult__isnull=False)
+        if not options['overwrite']:
+            requests = requests.filter(
+                Q(requestitem__aicomparisonresult__explanation__isnull=True)
+                | Q(requestitem__aicomparisonresult__explanation='')
+            )
+
+        updated = 0
+        for transfer_request in requests.distinct().iterator():
+            updated += explain_request(transfer_request, overwrite=options['overwrite'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} explanations.'))
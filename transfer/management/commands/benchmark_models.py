@@ -0,0 +1,179 @@
+# transfer/management/commands/benchmark_models.py
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+def peak_rss_mb():
+    """หน่วยความจำสูงสุดของ process (MB) หรือ None บนระบบที่ไม่มีโมดูล resource (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss เป็น KiB บน Linux แต่เป็น byte บน macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks encoder models/backends on the data.json catalog: encode throughput, find_best_match latency, '
+        'peak RSS and agreement with faculty-approved request items (JSON report)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models', default=None, metavar='NAME[@BACKEND]',
+            help='Model to benchmark, repeatable (default: the configured AI_COMPARATOR model and backend)',
+        )
+        parser.add_argument('--fixture', default=str(Path(settings.BASE_DIR) / 'data.json'))
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file (default: stdout)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed find_best_match passes over every source course')
+        # ใช้ภายใน: รันหนึ่งโมเดลใน process แยก (วัด peak RSS ได้ถูกต้อง)
+        parser.add_argument('--worker', default=None, help='Internal: benchmark one NAME@BACKEND in this process')
+        parser.add_argument('--worker-output', default=None, help='Internal: where the worker writes its result')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            result = self.run_worker(options['worker'], options['fixture'], options['repeat'])
+            with open(options['worker_output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            return
+
+        from transfer import ai_comparator
+
+        specs = options['models'] or [
+            f"{ai_comparator.get_config('MODEL_NAME')}@{ai_comparator.get_config('BACKEND')}"
+        ]
+        with open(options['fixture'], encoding='utf-8') as f:
+            fixture = json.load(f)
+        counts = {
+            name: sum(1 for row in fixture if row['model'] == f'transfer.{name}')
+            for name in ('sourcecourse', 'targetcourse', 'requestitem')
+        }
+        report = {'fixture': {'path': os.path.basename(options['fixture']), **counts}, 'models': []}
+
+        for spec in specs:
+            self.stderr.write(f'Benchmarking {spec} ...')
+            report['models'].append(self.run_isolated(spec, options))
+
+        text = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(text)
+
+    def run_isolated(self, spec, options):
+        """รันแต่ละโมเดลใน interpreter ใหม่ ไม่ให้หน่วยความจำของโมเดลก่อนหน้าปนกัน"""
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as handle:
+            output = handle.name
+        try:
+            completed = subprocess.run(
+                [
+                    sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'benchmark_models',
+                    '--worker', spec, '--worker-output', output,
+                    '--fixture', options['fixture'], '--repeat', str(options['repeat']),
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            if completed.returncode != 0:
+                raise CommandError(f'Benchmark of {spec} failed:\n{completed.stderr[-2000:]}')
+            with open(output, encoding='utf-8') as f:
+                return json.load(f)
+        finally:
+            os.unlink(output)
+
+    def run_worker(self, spec, fixture, repeat):
+        model_name, _, backend = spec.partition('@')
+        with tempfile.TemporaryDirectory() as scratch:
+            settings.AI_COMPARATOR = {
+                **getattr(settings, 'AI_COMPARATOR', {}),
+                'MODEL_NAME': model_name,
+                'BACKEND': backend or 'torch',
+                'BATCHING_ENABLED': False,
+                'TFIDF_FILE': os.path.join(scratch, 'tfidf_catalog.npz'),
+            }
+            # ฐานข้อมูลทดสอบแยก (โหลด fixture ลงไป) ไม่แตะฐานข้อมูลจริง
+            database_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                call_command('loaddata', fixture, verbosity=0)
+                return self.measure(spec, repeat)
+            finally:
+                connection.creation.destroy_test_db(database_name, verbosity=0)
+
+    def measure(self, spec, repeat):
+        from transfer import ai_comparator
+        from transfer.models import RequestItem, SourceCourse, TargetCourse
+
+        started = time.perf_counter()
+        model = ai_comparator.get_model()
+        load_seconds = time.perf_counter() - started
+
+        descriptions = list(dict.fromkeys(
+            ai_comparator.normalize_description(text)
+            for queryset in (TargetCourse.objects, SourceCourse.objects)
+            for text in queryset.values_list('course_description', flat=True)
+        ))
+        started = time.perf_counter()
+        model.encode(descriptions, batch_size=ai_comparator.get_config('BATCH_MAX_SIZE'))
+        encode_rate = len(descriptions) / (time.perf_counter() - started)
+
+        approved = list(
+            RequestItem.objects.filter(status='approved', aicomparisonresult__isnull=False)
+            .select_related('original_course', 'transfer_request', 'aicomparisonresult')
+        )
+        sources = list(SourceCourse.objects.all())
+        by_curriculum = {}
+        for item in approved:
+            by_curriculum.setdefault(item.transfer_request.target_curriculum_id, []).append(item)
+        # วัด latency กับหลักสูตรที่มีคำร้องมากที่สุด
+        curriculum_id = max(by_curriculum, key=lambda pk: len(by_curriculum[pk]), default=None)
+
+        # เติม cache ของหลักสูตรและ embedding store ของวิชาต้นทาง (model.encode ด้านบนไม่ได้บันทึกลง store)
+        # ด้วยรอบที่ไม่จับเวลา แล้วจึงวัดเฉพาะ latency ของการค้นที่ cache พร้อมแล้ว
+        ai_comparator.preload()
+        if curriculum_id:
+            for course in sources:
+                ai_comparator.find_best_match(course, curriculum_id)
+        latencies = []
+        for _ in range(repeat if curriculum_id else 0):
+            for course in sources:
+                started = time.perf_counter()
+                ai_comparator.find_best_match(course, curriculum_id)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        top1 = top5 = 0
+        for target_curriculum_id, items in by_curriculum.items():
+            ranked = ai_comparator.find_top_matches([item.original_course for item in items], target_curriculum_id, k=5)
+            for item, matches in zip(items, ranked):
+                course_ids = [course_id for course_id, _ in matches]
+                expected = item.aicomparisonresult.suggested_course_id
+                top1 += course_ids[:1] == [expected]
+                top5 += expected in course_ids
+
+        return {
+            'model': spec,
+            'dimension': int(model.dimension()),
+            'load_seconds': round(load_seconds, 2),
+            'encode_texts_per_second': round(encode_rate, 1),
+            'find_best_match_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+                'p95': round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+            },
+            'peak_rss_mb': peak_rss_mb(),
+            'approved_items': len(approved),
+            'top1_agreement': round(top1 / len(approved), 4) if approved else None,
+            'top5_agreement': round(top5 / len(approved), 4) if approved else None,
+        }
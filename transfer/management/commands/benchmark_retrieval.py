@@ -0,0 +1,75 @@
+# transfer/management/commands/benchmark_retrieval.py
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from transfer import ai_comparator
+from transfer.models import ApprovedEquivalence
+
+class Command(BaseCommand):
+    help = 'Compares dense and hybrid (BM25 + embedding) retrieval latency and hit rate against faculty-approved pairs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=None, help='Hit@k cut-off (default: AI_COMPARATOR["TOP_K"])')
+        parser.add_argument('--json', dest='json_path', default=None, help='Also write the report to this file')
+
+    def load_pairs(self):
+        pairs = list(
+            ApprovedEquivalence.objects.filter(approved_count__gt=F('rejected_count'))
+            .select_related('source_course')
+            .order_by('id')
+        )
+        if not pairs:
+            raise CommandError('No approved equivalences found, run manage.py rebuild_equivalences first')
+        return pairs
+
+    def evaluate(self, search, pairs, k):
+        latencies, hits_at_1, hits_at_k = [], 0, 0
+        for pair in pairs:
+            started = time.perf_counter()
+            ranked = search([pair.source_course], pair.curriculum_id, k)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            course_ids = [course_id for course_id, _ in ranked]
+            hits_at_1 += course_ids[:1] == [pair.target_course_id]
+            hits_at_k += pair.target_course_id in course_ids
+        return {
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+            'hit_at_1': round(hits_at_1 / len(pairs), 4),
+            f'hit_at_{k}': round(hits_at_k / len(pairs), 4),
+        }
+
+    def handle(self, *args, **options):
+        k = options['k'] or ai_comparator.get_config('TOP_K')
+        pairs = self.load_pairs()
+
+        # สร้าง cache / ดัชนีทั้งหมดก่อน เพื่อวัดเฉพาะเวลาค้นหา
+        ai_comparator.preload()
+        ai_comparator.get_lexical_index()
+        ai_comparator.get_embeddings([pair.source_course.course_description for pair in pairs])
+
+        report = {
+            'pairs': len(pairs),
+            'k': k,
+            'weights': {
+                'semantic': ai_comparator.get_config('HYBRID_SEMANTIC_WEIGHT'),
+                'lexical': ai_comparator.get_config('HYBRID_LEXICAL_WEIGHT'),
+            },
+            'dense': self.evaluate(ai_comparator.find_dense_matches, pairs, k),
+            'hybrid': self.evaluate(ai_comparator.find_hybrid_matches, pairs, k),
+        }
+
+        self.stdout.write(f'{len(pairs)} approved pairs, k={k}')
+        for mode in ('dense', 'hybrid'):
+            result = report[mode]
+            self.stdout.write(
+                f'  {mode:<7}: p50 {result["p50_ms"]:7.2f} ms  p95 {result["p95_ms"]:7.2f} ms  '
+                f'hit@1 {result["hit_at_1"]:.1%}  hit@{k} {result[f"hit_at_{k}"]:.1%}'
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Report written to {options["json_path"]}')
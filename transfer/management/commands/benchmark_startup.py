@@ -0,0 +1,134 @@
+# transfer/management/commands/benchmark_startup.py
+import json
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# สิ่งที่ process ของ Django โหลดตอนเริ่มทำงาน (manage.py ทุกคำสั่ง + URLconf ของเว็บ)
+DEFAULT_ENTRYPOINTS = ['core.urls']
+
+# โมดูลที่ต้องรายงานเวลาเสมอ (ถ้าไม่ได้ถูก import ตอน startup จะแสดงเป็น "not loaded")
+TRACKED_MODULES = [
+    'django',
+    'rest_framework',
+    'numpy',
+    'transfer.models',
+    'transfer.admin',
+    'transfer.ai_comparator',
+    'transfer.views',
+    'core.urls',
+    'weasyprint',
+    'torch',
+    'sentence_transformers',
+]
+
+# รันใน interpreter ใหม่: จับเวลา exec_module ของทุกโมดูล (รวมโมดูลที่ Django โหลดผ่าน
+# importlib.import_module ซึ่ง python -X importtime มองไม่เห็น) แล้วพิมพ์ผลเป็น JSON
+PROBE = '''
+import importlib, json, os, sys, time
+
+timings = {{}}
+
+class TimingFinder:
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        exec_module = getattr(loader, 'exec_module', None)
+        if exec_module is None or isinstance(loader, type):
+            return spec
+
+        def timed_exec_module(module, _exec_module=exec_module):
+            started = time.perf_counter()
+            try:
+                _exec_module(module)
+            finally:
+                timings.setdefault(name, (time.perf_counter() - started) * 1000)
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+sys.meta_path.insert(0, TimingFinder())
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+started = time.perf_counter()
+import django
+django.setup()
+for name in {entrypoints!r}:
+    importlib.import_module(name)
+total_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'total_ms': total_ms, 'modules': timings}}))
+'''
+
+class Command(BaseCommand):
+    help = 'Reports cold startup import time per module so regressions get caught'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'entrypoints', nargs='*',
+            help='Modules to import after django.setup() (default: core.urls)',
+        )
+        parser.add_argument(
+            '--budget', action='append', default=[], metavar='MODULE=MS',
+            help='Fail if MODULE takes longer than MS to import; "total" limits the whole startup',
+        )
+        parser.add_argument('--top', type=int, default=10, help='Also list the N slowest modules')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        budgets = {}
+        for budget in options['budget']:
+            module, _, limit = budget.partition('=')
+            try:
+                budgets[module] = float(limit)
+            except ValueError:
+                raise CommandError(f'Invalid budget "{budget}", expected MODULE=MS')
+
+        entrypoints = options['entrypoints'] or DEFAULT_ENTRYPOINTS
+        code = PROBE.format(settings_module=settings.SETTINGS_MODULE, entrypoints=entrypoints)
+        completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=settings.BASE_DIR)
+        if completed.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{completed.stderr[-4000:]}')
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings = probe['modules']
+
+        tracked = list(TRACKED_MODULES)
+        for name in list(entrypoints) + list(budgets):
+            if name not in tracked and name != 'total':
+                tracked.append(name)
+
+        report = {
+            'entrypoints': entrypoints,
+            'total_ms': round(probe['total_ms'], 1),
+            'modules': {name: round(timings[name], 1) if name in timings else None for name in tracked},
+            'slowest': [
+                {'module': name, 'ms': round(ms, 1)}
+                for name, ms in sorted(timings.items(), key=lambda item: item[1], reverse=True)
+                if '.' not in name or name.startswith(('transfer.', 'core.'))
+            ][:options['top']],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f'Startup (django.setup + {", ".join(entrypoints)}): {report["total_ms"]:.0f} ms')
+            for name, ms in report['modules'].items():
+                value = 'not loaded' if ms is None else f'{ms:.0f} ms'
+                self.stdout.write(f'  {name:<28}{value:>12}')
+            self.stdout.write('Slowest top-level packages and app modules:')
+            for row in report['slowest']:
+                self.stdout.write(f'  {row["module"]:<28}{row["ms"]:>9.0f} ms')
+
+        over = []
+        for name, limit in budgets.items():
+            measured = report['total_ms'] if name == 'total' else report['modules'].get(name)
+            if measured is not None and measured > limit:
+                over.append(f'{name} {measured:.0f} ms > {limit:.0f} ms')
+        if over:
+            raise CommandError('Import budget exceeded: ' + ', '.join(over))
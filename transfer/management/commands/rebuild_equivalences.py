@@ -0,0 +1,49 @@
+# transfer/management/commands/rebuild_equivalences.py
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.core.management.base import BaseCommand
+from transfer.models import ApprovedEquivalence, RequestItem
+
+class Command(BaseCommand):
+    help = 'Rebuilds the faculty-approved equivalence table from the full review history'
+
+    def handle(self, *args, **options):
+        # รวมผลการพิจารณาทั้งหมดใน query เดียว: (วิชาต้นทาง, หลักสูตร, วิชาที่ AI แนะนำ)
+        history = (
+            RequestItem.objects.filter(
+                status__in=['approved', 'rejected'],
+                aicomparisonresult__isnull=False,
+                transfer_request__target_curriculum__isnull=False,
+            )
+            .values(
+                'original_course_id',
+                'transfer_request__target_curriculum_id',
+                'aicomparisonresult__suggested_course_id',
+            )
+            .annotate(
+                approved=Count('id', filter=Q(status='approved')),
+                rejected=Count('id', filter=Q(status='rejected')),
+                score=Max('aicomparisonresult__similarity_score'),
+            )
+        )
+
+        rows = [
+            ApprovedEquivalence(
+                source_course_id=row['original_course_id'],
+                curriculum_id=row['transfer_request__target_curriculum_id'],
+                target_course_id=row['aicomparisonresult__suggested_course_id'],
+                approved_count=row['approved'],
+                rejected_count=row['rejected'],
+                similarity_score=row['score'] or 0,
+            )
+            for row in history
+        ]
+
+        with transaction.atomic():
+            ApprovedEquivalence.objects.all().delete()
+            ApprovedEquivalence.objects.bulk_create(rows, batch_size=1000)
+
+        confirmed = sum(1 for row in rows if row.approved_count > row.rejected_count)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(rows)} equivalences ({confirmed} with more approvals than rejections).'
+        ))
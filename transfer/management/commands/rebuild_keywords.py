@@ -0,0 +1,27 @@
+# transfer/management/commands/rebuild_keywords.py
+from django.core.management.base import BaseCommand
+from transfer import ai_comparator, tokenizer
+from transfer.models import SourceCourse, TargetCourse, bump_catalog_version, bump_institution_version
+
+class Command(BaseCommand):
+    help = 'Re-extracts the stored keywords of every course (run after editing transfer/data/thai_words.txt)'
+
+    def handle(self, *args, **options):
+        for model, group, bump in (
+            (TargetCourse, 'curriculum_id', bump_catalog_version),
+            (SourceCourse, 'institution_id', bump_institution_version),
+        ):
+            courses = list(model.objects.only('id', group, 'course_description', 'keywords'))
+            changed = []
+            for course in courses:
+                extracted = tokenizer.keywords(course.course_description)
+                if extracted != course.keywords:
+                    course.keywords = extracted
+                    changed.append(course)
+            model.objects.bulk_update(changed, ['keywords'], batch_size=500)
+            # bulk_update ไม่ส่ง signal จึงเปลี่ยนเวอร์ชันเอง ทุก process จะเห็นว่าเมทริกซ์ TF-IDF เดิมเก่าแล้ว
+            bump(*{getattr(course, group) for course in changed})
+            self.stdout.write(f'{model.__name__}: {len(changed)} of {len(courses)} updated')
+        matrix = ai_comparator.get_term_matrix()
+        self.stdout.write(f'TF-IDF matrix: {len(matrix.vocabulary)} terms')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,28 @@
+# transfer/management/commands/reconcile_request_status.py
+from django.db.models import F
+from django.core.management.base import BaseCommand
+from transfer.models import TransferRequest
+
+class Command(BaseCommand):
+    help = 'Recomputes every transfer request status from its items in a single UPDATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list requests whose status would change')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            updated = TransferRequest.refresh_statuses()
+            self.stdout.write(self.style.SUCCESS(f'Updated the status of {updated} requests.'))
+            return
+
+        stale = (
+            TransferRequest.objects.order_by('pk')
+            .annotate(new_status=TransferRequest.aggregate_status())
+            .exclude(status=F('new_status'))
+            .values_list('pk', 'status', 'new_status')
+        )
+        count = 0
+        for pk, status, new_status in stale:
+            count += 1
+            self.stdout.write(f'  request {pk}: {status} -> {new_status}')
+        self.stdout.write(f'{count} requests would be updated.')
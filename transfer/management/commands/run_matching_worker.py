@@ -0,0 +1,63 @@
+# transfer/management/commands/run_matching_worker.py
+import time
+import threading
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from transfer import ai_comparator, matching
+
+class Command(BaseCommand):
+    help = 'Processes queued AI matching jobs for transfer requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help='Number of worker threads (default: AI_COMPARATOR["MATCHING_WORKER_CONCURRENCY"])',
+        )
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency'] or ai_comparator.get_config('MATCHING_WORKER_CONCURRENCY')
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.stop = threading.Event()
+
+        self.stdout.write(self.style.SUCCESS(f'Matching worker started with {concurrency} thread(s).'))
+
+        threads = [
+            threading.Thread(target=self.work, name=f'matching-worker-{n}', daemon=True)
+            for n in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop.set()
+            self.stdout.write('Stopping after current jobs...')
+            for thread in threads:
+                thread.join()
+
+    def work(self):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = matching.claim_job()
+                if job is None:
+                    if self.once:
+                        return
+                    self.stop.wait(self.poll_interval)
+                    continue
+
+                started = time.monotonic()
+                ok = matching.process_job(job)
+                elapsed = (time.monotonic() - started) * 1000
+                if ok:
+                    self.stdout.write(f'request {job.transfer_request_id}: done in {elapsed:.0f} ms')
+                else:
+                    self.stderr.write(f'request {job.transfer_request_id}: {job.status} (attempt {job.attempts})')
+        finally:
+            connection.close()
@@ -0,0 +1,61 @@
+# transfer/management/commands/verify_ai_backend.py
+import json
+import time
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from transfer import ai_comparator
+from transfer.ai_backends import BACKENDS, load_backend
+
+class Command(BaseCommand):
+    help = 'Checks that an encoder backend reproduces the fp32 PyTorch cosine scores on the data.json catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backend', choices=sorted(BACKENDS), help='Backend to verify against the torch fp32 reference')
+        parser.add_argument('--model', default=None, help='Model name (default: AI_COMPARATOR["MODEL_NAME"])')
+        parser.add_argument('--fixture', default=str(Path(settings.BASE_DIR) / 'data.json'))
+        parser.add_argument('--tolerance', type=float, default=0.02, help='Maximum allowed absolute cosine difference')
+        parser.add_argument('--batch-size', type=int, default=32)
+
+    def load_catalog(self, path):
+        with open(path, encoding='utf-8') as f:
+            fixture = json.load(f)
+        sources = [row['fields']['course_description'] for row in fixture if row['model'] == 'transfer.sourcecourse']
+        targets = [row['fields']['course_description'] for row in fixture if row['model'] == 'transfer.targetcourse']
+        if not sources or not targets:
+            raise CommandError(f'{path} has no transfer.sourcecourse / transfer.targetcourse rows')
+        return sources, targets
+
+    def score(self, backend, sources, targets, batch_size):
+        started = time.perf_counter()
+        source_vectors = backend.encode(sources, batch_size=batch_size)
+        target_vectors = backend.encode(targets, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        return source_vectors @ target_vectors.T, (len(sources) + len(targets)) / elapsed
+
+    def handle(self, *args, **options):
+        model_name = options['model'] or ai_comparator.get_config('MODEL_NAME')
+        sources, targets = self.load_catalog(options['fixture'])
+        self.stdout.write(f'{len(sources)} source x {len(targets)} target descriptions, model {model_name}')
+
+        reference, reference_rate = self.score(load_backend('torch', model_name), sources, targets, options['batch_size'])
+        candidate_backend = load_backend(
+            options['backend'], model_name, onnx_file_name=ai_comparator.get_config('ONNX_FILE_NAME'),
+        )
+        candidate, candidate_rate = self.score(candidate_backend, sources, targets, options['batch_size'])
+
+        difference = np.abs(reference - candidate)
+        top1_agreement = float((reference.argmax(axis=1) == candidate.argmax(axis=1)).mean())
+
+        self.stdout.write(f'  torch fp32      : {reference_rate:8.1f} texts/s')
+        self.stdout.write(f'  {options["backend"]:<16}: {candidate_rate:8.1f} texts/s ({candidate_rate / reference_rate:.2f}x)')
+        self.stdout.write(f'  max |d cosine|  : {difference.max():.5f}')
+        self.stdout.write(f'  mean |d cosine| : {difference.mean():.5f}')
+        self.stdout.write(f'  top-1 agreement : {top1_agreement:.1%}')
+
+        if difference.max() > options['tolerance']:
+            raise CommandError(
+                f'{options["backend"]} deviates from fp32 by {difference.max():.5f} (> tolerance {options["tolerance"]})'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{options["backend"]} is within tolerance.'))
@@ -0,0 +1,43 @@
+# transfer/management/commands/warm_embeddings.py
+from django.core.management.base import BaseCommand
+from transfer.models import SourceCourse, TargetCourse, CourseEmbedding
+from transfer import ai_comparator
+
+class Command(BaseCommand):
+    help = 'Embeds every course description in the catalog (run at deploy time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=64, help='Descriptions encoded per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # คำอธิบายยาวถูกเก็บเป็นหลายช่วง: ต้อง encode ถ้ามีช่วงใดยังไม่อยู่ใน store
+        descriptions = {}
+        for model in (TargetCourse, SourceCourse):
+            for description in model.objects.values_list('course_description', flat=True).iterator():
+                if description:
+                    chunk_hashes = [
+                        ai_comparator.description_hash(chunk) for chunk in ai_comparator.chunk_description(description)
+                    ]
+                    descriptions.setdefault(ai_comparator.description_hash(description), (description, chunk_hashes))
+
+        existing = set(
+            CourseEmbedding.objects.filter(model_name=ai_comparator.get_model_version())
+            .values_list('content_hash', flat=True)
+        )
+        pending = [
+            text for text, chunk_hashes in descriptions.values()
+            if any(chunk_hash not in existing for chunk_hash in chunk_hashes)
+        ]
+
+        self.stdout.write(
+            f'{len(descriptions)} distinct descriptions, {len(pending)} to embed with {ai_comparator.get_model_version()}'
+        )
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            ai_comparator.get_embeddings(batch)
+            self.stdout.write(f'  embedded {start + len(batch)}/{len(pending)}')
+
+        self.stdout.write(self.style.SUCCESS('Embedding store is warm.'))
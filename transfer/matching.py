@@ -0,0 +1,406 @@
+# transfer/matching.py
+"""
+คิวงานจับคู่รายวิชาด้วย AI แบบเบื้องหลัง
+
+- TransferRequestCreateView สร้าง MatchingJob แล้วตอบกลับทันที
+- manage.py run_matching_worker ดึงงานจากคิว (SELECT ... FOR UPDATE SKIP LOCKED)
+  แล้วเขียน AIComparisonResult ตามมาทีหลัง
+- งานที่ล้มเหลวจะถูก retry แบบ exponential backoff จนครบ MATCHING_MAX_ATTEMPTS
+- ผลของ (วิชาต้นทาง, หลักสูตร, เวอร์ชัน) ที่เคยคำนวณแล้วถูกเก็บใน MatchResultCache
+  คำร้องที่ทุกรายการมีใน cache จะถูกคัดลอกผลทันทีตอนยื่น โดยไม่ต้องเข้าคิว
+- วิชาที่อาจารย์เคยอนุมัติคู่เทียบโอนแล้ว (ApprovedEquivalence) ใช้คู่นั้นทันทีโดยไม่รันโมเดล
+- ASSIGNMENT_MODE = 'optimal' จัดสรรวิชาเป้าหมายแบบหนึ่งต่อหนึ่งทั้งคำร้องแทนการเลือก argmax แยกกัน
+- กลุ่มวิชาเดิม 2-3 วิชาที่รวมกันเทียบวิชาเป้าหมายได้ ถูกเก็บเป็น CombinationSuggestion ของคำร้อง
+  (ต้องรันโมเดล จึงคำนวณใน worker เสมอ แม้ทุกรายการจะได้ผลจาก cache แล้วก็ตาม)
+"""
+import threading
+import traceback
+from concurrent.futures import Future
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import (
+    AIComparisonResult,
+    AISuggestion,
+    ApprovedEquivalence,
+    CombinationSuggestion,
+    Curriculum,
+    MatchResultCache,
+    MatchingJob,
+    TransferRequest,
+)
+from . import ai_comparator
+
+
+#================================#
+#  Match Result Cache           #
+#================================#
+
+class _SingleFlight:
+    """ให้คำขอที่ cache miss ซ้ำกันพร้อมกัน (ใน process เดียวกัน) รันโมเดลเพียงครั้งเดียว"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def claim(self, keys):
+        """คืน (keys ที่ผู้เรียกต้องคำนวณเอง, {key: Future} ที่มีคนอื่นกำลังคำนวณอยู่)"""
+        owned, waiting = [], {}
+        with self.lock:
+            for key in keys:
+                if key in self.calls:
+                    waiting[key] = self.calls[key]
+                else:
+                    self.calls[key] = Future()
+                    owned.append(key)
+        return owned, waiting
+
+    def finish(self, key, result=None, error=None):
+        with self.lock:
+            future = self.calls.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+_inflight = _SingleFlight()
+
+
+def _entry(row):
+    return {
+        'suggested_course_id': row.suggested_course_id,
+        'similarity_score': row.similarity_score,
+        'explanation': row.explanation,
+        'suggestions': row.suggestions,
+    }
+
+
+def get_approved_equivalences(source_course_ids, target_curriculum_id):
+    """
+    คืน {source_course_id: entry} ของวิชาที่อาจารย์ยืนยันคู่เทียบโอนแล้ว
+    (อนุมัติอย่างน้อย EQUIVALENCE_MIN_APPROVALS ครั้ง และมากกว่าจำนวนครั้งที่ปฏิเสธ)
+    """
+    rows = (
+        ApprovedEquivalence.objects.filter(
+            source_course_id__in=source_course_ids,
+            curriculum_id=target_curriculum_id,
+            target_course__curriculum_id=target_curriculum_id,
+            approved_count__gte=ai_comparator.get_config('EQUIVALENCE_MIN_APPROVALS'),
+            approved_count__gt=F('rejected_count'),
+        )
+        .order_by('source_course_id', '-approved_count', 'rejected_count')
+    )
+    entries = {}
+    for row in rows:
+        if row.source_course_id in entries:
+            continue
+        entries[row.source_course_id] = {
+            'suggested_course_id': row.target_course_id,
+            'similarity_score': row.similarity_score,
+            'explanation': f"อาจารย์เคยอนุมัติการเทียบโอนรายวิชาคู่นี้แล้ว {row.approved_count} ครั้ง",
+            'suggestions': [[row.target_course_id, row.similarity_score]],
+            'previously_approved': True,
+        }
+    return entries
+
+
+def get_matches(original_courses, target_curriculum_id, cached_only=False):
+    """
+    คืน {source_course_id: entry} ของวิชาต้นทางที่จับคู่ได้
+    ลำดับการหา: คู่ที่อาจารย์เคยอนุมัติ -> MatchResultCache -> รันโมเดล (batch เดียว แล้วบันทึกลง cache)
+    (ถ้า cached_only=True จะคืนเฉพาะที่ไม่ต้องรันโมเดล)
+    """
+    courses = {course.id: course for course in original_courses}
+    version = Curriculum.objects.filter(pk=target_curriculum_id).values_list('catalog_version', flat=True).first()
+    if not courses or version is None:
+        return {}
+    model_version = ai_comparator.get_matching_version()
+
+    entries = get_approved_equivalences(courses, target_curriculum_id)
+    entries.update({
+        row.source_course_id: _entry(row)
+        for row in MatchResultCache.objects.filter(
+            source_course_id__in=[course_id for course_id in courses if course_id not in entries],
+            curriculum_id=target_curriculum_id,
+            curriculum_version=version,
+            model_version=model_version,
+        )
+    })
+    missing = [course_id for course_id in courses if course_id not in entries]
+    if cached_only or not missing:
+        return entries
+
+    keys = {course_id: (course_id, target_curriculum_id, version, model_version) for course_id in missing}
+    owned, waiting = _inflight.claim(keys.values())
+    owned_ids = [key[0] for key in owned]
+
+    if owned_ids:
+        try:
+            owned_courses = [courses[course_id] for course_id in owned_ids]
+            suggestions = ai_comparator.find_top_matches(owned_courses, target_curriculum_id)
+            matches = ai_comparator.find_best_matches(owned_courses, target_curriculum_id, ranked=suggestions)
+            rows = [
+                MatchResultCache(
+                    source_course_id=course_id,
+                    curriculum_id=target_curriculum_id,
+                    curriculum_version=version,
+                    model_version=model_version,
+                    suggested_course=best_match,
+                    similarity_score=score,
+                    explanation=reason,
+                    suggestions=[[target_id, target_score] for target_id, target_score in ranked],
+                )
+                for course_id, (best_match, score, reason), ranked in zip(owned_ids, matches, suggestions)
+                if best_match
+            ]
+            MatchResultCache.objects.bulk_create(rows, ignore_conflicts=True)
+        except Exception as exc:
+            for key in owned:
+                _inflight.finish(key, error=exc)
+            raise
+
+        computed = {row.source_course_id: _entry(row) for row in rows}
+        for key in owned:
+            _inflight.finish(key, result=computed.get(key[0]))
+        entries.update(computed)
+
+    for key, future in waiting.items():
+        entry = future.result()
+        if entry is not None:
+            entries[key[0]] = entry
+    return entries
+
+
+#================================#
+#  Matching Job Queue           #
+#================================#
+
+def _set_status(job, status, **fields):
+    """บันทึกสถานะของงาน และสะท้อนไปที่ TransferRequest.matching_status"""
+    job.status = status
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save()
+    TransferRequest.objects.filter(pk=job.transfer_request_id).update(matching_status=status)
+
+
+def run_matching(transfer_request, cached_only=False):
+    """
+    จับคู่ทุกรายการในคำร้องที่ยังไม่มีผล AI (เรียกซ้ำได้อย่างปลอดภัยเมื่อ retry)
+    คืนจำนวนรายการที่ยังไม่ได้ผล (เช่น cache miss เมื่อ cached_only=True)
+    """
+    target_curriculum_id = transfer_request.target_curriculum_id
+    if not target_curriculum_id:
+        return 0
+
+    items = list(
+        transfer_request.requestitem_set
+        .filter(aicomparisonresult__isnull=True)
+        .select_related('original_course')
+    )
+    unmatched = match_items(transfer_request, items, cached_only) if items else 0
+
+    # กลุ่มวิชาต้องใช้ embedding (รันโมเดล) จึงคำนวณเฉพาะใน worker / โหมด sync ไม่ทำบน path cached_only
+    if not cached_only and not unmatched and ai_comparator.get_config('COMBINATION_ENABLED'):
+        match_combinations(transfer_request)
+    return unmatched
+
+
+def needs_combinations(transfer_request):
+    """คำร้องที่ยังต้องคำนวณกลุ่มวิชา (ต้องมีอย่างน้อย 2 รายการจึงจะรวมกันได้)"""
+    return (
+        ai_comparator.get_config('COMBINATION_ENABLED')
+        and transfer_request.requestitem_set.count() >= 2
+    )
+
+
+def match_items(transfer_request, items, cached_only=False):
+    """เขียนผล AI ของ items (ที่ยังไม่มีผล) คืนจำนวนรายการที่ยังไม่ได้ผล"""
+    target_curriculum_id = transfer_request.target_curriculum_id
+    entries = get_matches([item.original_course for item in items], target_curriculum_id, cached_only=cached_only)
+    matched = [(item, entries[item.original_course_id]) for item in items if item.original_course_id in entries]
+    if ai_comparator.get_config('ASSIGNMENT_MODE') == 'optimal':
+        matched = assign_matches(transfer_request, matched)
+
+    # เขียนผลทั้งหมดใน transaction เดียว (ถ้าล้มเหลวกลางทาง retry จะเริ่มใหม่ได้ครบ)
+    with transaction.atomic():
+        AIComparisonResult.objects.bulk_create(
+            [
+                AIComparisonResult(
+                    request_item=item,
+                    suggested_course_id=entry['suggested_course_id'],
+                    similarity_score=entry['similarity_score'],
+                    explanation=entry['explanation'],
+                    is_previously_approved=entry.get('previously_approved', False),
+                )
+                for item, entry in matched
+            ],
+            ignore_conflicts=True,
+        )
+
+        # รายวิชาแนะนำ top-k (อันดับ 1..k) ให้อาจารย์เลือกดูทางเลือกอื่นได้ทันที
+        AISuggestion.objects.filter(request_item__in=[item for item, _ in matched]).delete()
+        AISuggestion.objects.bulk_create([
+            AISuggestion(
+                request_item=item,
+                rank=rank,
+                suggested_course_id=course_id,
+                similarity_score=score,
+            )
+            for item, entry in matched
+            for rank, (course_id, score) in enumerate(entry['suggestions'], start=1)
+        ])
+
+    return len(items) - len(matched)
+
+
+def explain_request(transfer_request, overwrite=False):
+    """
+    สร้างเหตุผลประกอบให้ผล AI ทุกรายการในคำร้องพร้อมกันในครั้งเดียว
+    (ค่าเริ่มต้นเติมเฉพาะรายการที่ยังไม่มีเหตุผล) คืนจำนวนรายการที่อัปเดต
+    """
+    results = AIComparisonResult.objects.filter(
+        request_item__transfer_request=transfer_request, is_previously_approved=False,
+    ).select_related('request_item__original_course', 'suggested_course')
+    if not overwrite:
+        results = results.filter(Q(explanation__isnull=True) | Q(explanation=''))
+    results = list(results)
+
+    reasons = ai_comparator.explain_matches(
+        [(result.request_item.original_course, result.suggested_course) for result in results]
+    )
+    for result, reason in zip(results, reasons):
+        result.explanation = reason
+    AIComparisonResult.objects.bulk_update(results, ['explanation'])
+    return len(results)
+
+
+def match_combinations(transfer_request):
+    """คำนวณกลุ่มวิชาที่รวมกันเทียบโอนได้ของทั้งคำร้องใหม่ (แทนที่ของเดิม)"""
+    items = list(transfer_request.requestitem_set.select_related('original_course'))
+    groups = ai_comparator.find_combination_matches(
+        [item.original_course for item in items], transfer_request.target_curriculum_id,
+    )
+
+    with transaction.atomic():
+        CombinationSuggestion.objects.filter(transfer_request=transfer_request).delete()
+        suggestions = CombinationSuggestion.objects.bulk_create([
+            CombinationSuggestion(
+                transfer_request=transfer_request,
+                target_course_id=target_id,
+                similarity_score=score,
+                total_credits=total_credits,
+            )
+            for target_id, _, score, total_credits in groups
+        ])
+        CombinationSuggestion.items.through.objects.bulk_create([
+            CombinationSuggestion.items.through(combinationsuggestion_id=suggestion.pk, requestitem_id=items[index].pk)
+            for suggestion, (_, members, _, _) in zip(suggestions, groups)
+            for index in members
+        ])
+    return len(groups)
+
+
+def assign_matches(transfer_request, matched):
+    """
+    แทนผล argmax ของแต่ละรายการด้วยการจับคู่หนึ่งต่อหนึ่งที่ดีที่สุดของทั้งคำร้อง
+    คู่ที่อาจารย์เคยอนุมัติและรายการที่มีผลอยู่แล้วถูกจองวิชาเป้าหมายไว้ก่อน
+    รายการที่จัดสรรไม่ได้ (รายการมากกว่าวิชาเป้าหมาย) ใช้ผลเดิมของตัวเอง
+    """
+    reserved = set(
+        AIComparisonResult.objects.filter(request_item__transfer_request=transfer_request)
+        .values_list('suggested_course_id', flat=True)
+    )
+    reserved.update(entry['suggested_course_id'] for _, entry in matched if entry.get('previously_approved'))
+    pending = [index for index, (_, entry) in enumerate(matched) if not entry.get('previously_approved')]
+    if len(pending) + len(reserved) < 2:
+        return matched
+
+    assignments = ai_comparator.assign_optimal_matches(
+        [matched[index][0].original_course for index in pending],
+        transfer_request.target_curriculum_id,
+        exclude_course_ids=reserved,
+    )
+    matched = list(matched)
+    for index, (course, score, reason) in zip(pending, assignments):
+        if course is not None:
+            item, entry = matched[index]
+            matched[index] = (item, {**entry, 'suggested_course_id': course.id, 'similarity_score': score, 'explanation': reason})
+    return matched
+
+
+def enqueue_matching(transfer_request):
+    """
+    ส่งคำร้องเข้าคิวจับคู่ AI
+    ถ้าปิด MATCHING_ASYNC ไว้ (เช่นตอนพัฒนาในเครื่อง) จะประมวลผลทันทีแบบเดิม
+    """
+    if not transfer_request.target_curriculum_id:
+        return None
+
+    if not ai_comparator.get_config('MATCHING_ASYNC'):
+        run_matching(transfer_request)
+        return None
+
+    # วิชาที่เคยจับคู่แล้ว คัดลอกผลจาก cache ได้ทันที (ไม่รันโมเดลใน HTTP request)
+    # ถ้าครบทุกรายการและไม่ต้องคำนวณกลุ่มวิชา ก็ไม่ต้องเข้าคิว ไม่เช่นนั้นให้ worker คำนวณกลุ่มวิชาต่อ
+    if run_matching(transfer_request, cached_only=True) == 0 and not needs_combinations(transfer_request):
+        TransferRequest.objects.filter(pk=transfer_request.pk).update(matching_status='done')
+        transfer_request.matching_status = 'done'
+        return None
+
+    job, _ = MatchingJob.objects.update_or_create(
+        transfer_request=transfer_request,
+        defaults={'status': 'queued', 'attempts': 0, 'run_after': timezone.now(), 'last_error': ''},
+    )
+    TransferRequest.objects.filter(pk=transfer_request.pk).update(matching_status='queued')
+    transfer_request.matching_status = 'queued'
+    return job
+
+
+def claim_job():
+    """
+    จองงานถัดไปจากคิว (รวมถึงงาน running ที่ worker เดิมตายไปจนหมดเวลา lease)
+    คืน None ถ้าไม่มีงาน
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=ai_comparator.get_config('MATCHING_LEASE_SECONDS'))
+
+    with transaction.atomic():
+        job = (
+            MatchingJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='queued', run_after__lte=now)
+                | Q(status='running', locked_until__lt=now)
+            )
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        _set_status(job, 'running', attempts=job.attempts + 1, locked_until=now + lease)
+    return job
+
+
+def process_job(job):
+    """ประมวลผลงานที่จองไว้แล้ว คืน True ถ้าสำเร็จ"""
+    try:
+        run_matching(job.transfer_request)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= ai_comparator.get_config('MATCHING_MAX_ATTEMPTS'):
+            _set_status(job, 'failed', locked_until=None, last_error=error)
+        else:
+            delay = ai_comparator.get_config('MATCHING_RETRY_DELAY') * (2 ** (job.attempts - 1))
+            _set_status(
+                job, 'queued',
+                locked_until=None,
+                last_error=error,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+        return False
+
+    _set_status(job, 'done', locked_until=None, last_error='')
+    return True
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0019_alter_userprofile_options_alter_studentprofile_major_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='แฮชคำอธิบายรายวิชา')),
+                ('model_name', models.CharField(max_length=255, verbose_name='ชื่อโมเดล')),
+                ('dimension', models.PositiveIntegerField(verbose_name='จำนวนมิติ')),
+                ('vector', models.BinaryField(verbose_name='เวกเตอร์')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'เวกเตอร์คำอธิบายรายวิชา',
+                'verbose_name_plural': '8. เวกเตอร์คำอธิบายรายวิชา',
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'content_hash'), name='unique_course_embedding')],
+            },
+        ),
+    ]
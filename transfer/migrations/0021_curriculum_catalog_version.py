@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0020_courseembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='curriculum',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='เวอร์ชันรายวิชา'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0021_curriculum_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transferrequest',
+            name='matching_status',
+            field=models.CharField(choices=[('queued', 'รอประมวลผล'), ('running', 'กำลังประมวลผล'), ('done', 'เสร็จสิ้น'), ('failed', 'ล้มเหลว')], default='done', max_length=10, verbose_name='สถานะการจับคู่ AI'),
+        ),
+        migrations.CreateModel(
+            name='MatchingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'รอประมวลผล'), ('running', 'กำลังประมวลผล'), ('done', 'เสร็จสิ้น'), ('failed', 'ล้มเหลว')], default='queued', max_length=10, verbose_name='สถานะ')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่ประมวลผล')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='เริ่มประมวลผลได้ตั้งแต่')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='ล็อกโดย worker ถึง')),
+                ('last_error', models.TextField(blank=True, verbose_name='ข้อผิดพลาดล่าสุด')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('transfer_request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='matching_job', to='transfer.transferrequest')),
+            ],
+            options={
+                'verbose_name': 'งานจับคู่ AI',
+                'verbose_name_plural': '4.1 คิวงานจับคู่ AI',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='matching_job_queue_idx')],
+            },
+        ),
+    ]
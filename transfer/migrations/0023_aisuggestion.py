@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0022_matching_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AISuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='อันดับ')),
+                ('similarity_score', models.FloatField(verbose_name='คะแนนความสอดคล้อง')),
+                ('request_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_suggestions', to='transfer.requestitem')),
+                ('suggested_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.targetcourse', verbose_name='รายวิชาที่แนะนำ')),
+            ],
+            options={
+                'verbose_name': 'รายวิชาแนะนำ (Top-k)',
+                'verbose_name_plural': '4.2 รายวิชาแนะนำ (Top-k)',
+                'ordering': ['request_item', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('request_item', 'rank'), name='unique_ai_suggestion_rank')],
+            },
+        ),
+    ]
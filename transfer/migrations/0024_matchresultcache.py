@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0023_aisuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('curriculum_version', models.PositiveIntegerField(verbose_name='เวอร์ชันรายวิชาของหลักสูตร')),
+                ('model_version', models.CharField(max_length=255, verbose_name='เวอร์ชันโมเดล')),
+                ('similarity_score', models.FloatField(verbose_name='คะแนนความสอดคล้อง')),
+                ('explanation', models.TextField(blank=True, verbose_name='เหตุผลประกอบ')),
+                ('suggestions', models.JSONField(default=list, verbose_name='รายวิชาแนะนำ (Top-k)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('curriculum', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.curriculum', verbose_name='หลักสูตร')),
+                ('source_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.sourcecourse', verbose_name='รายวิชาเดิม')),
+                ('suggested_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.targetcourse', verbose_name='รายวิชาที่แนะนำ')),
+            ],
+            options={
+                'verbose_name': 'แคชผลการจับคู่ AI',
+                'verbose_name_plural': '4.3 แคชผลการจับคู่ AI',
+                'constraints': [models.UniqueConstraint(fields=('source_course', 'curriculum', 'curriculum_version', 'model_version'), name='unique_match_result_cache')],
+            },
+        ),
+    ]
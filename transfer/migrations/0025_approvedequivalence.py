@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0024_matchresultcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aicomparisonresult',
+            name='is_previously_approved',
+            field=models.BooleanField(default=False, verbose_name='เคยได้รับอนุมัติแล้ว'),
+        ),
+        migrations.CreateModel(
+            name='ApprovedEquivalence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('approved_count', models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่อนุมัติ')),
+                ('rejected_count', models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่ปฏิเสธ')),
+                ('similarity_score', models.FloatField(default=0, verbose_name='คะแนนความสอดคล้อง (AI)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('curriculum', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.curriculum', verbose_name='หลักสูตร')),
+                ('source_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.sourcecourse', verbose_name='รายวิชาเดิม')),
+                ('target_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.targetcourse', verbose_name='รายวิชาที่เทียบได้')),
+            ],
+            options={
+                'verbose_name': 'คู่เทียบโอนที่อาจารย์ยืนยันแล้ว',
+                'verbose_name_plural': '4.4 คู่เทียบโอนที่อาจารย์ยืนยันแล้ว',
+                'constraints': [models.UniqueConstraint(fields=('source_course', 'curriculum', 'target_course'), name='unique_approved_equivalence')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0025_approvedequivalence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CombinationSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity_score', models.FloatField(verbose_name='คะแนนความสอดคล้อง')),
+                ('total_credits', models.PositiveIntegerField(verbose_name='หน่วยกิตรวม')),
+                ('items', models.ManyToManyField(related_name='combination_suggestions', to='transfer.requestitem', verbose_name='รายวิชาเดิม')),
+                ('target_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transfer.targetcourse', verbose_name='รายวิชาที่แนะนำ')),
+                ('transfer_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='combination_suggestions', to='transfer.transferrequest')),
+            ],
+            options={
+                'verbose_name': 'ชุดรายวิชาที่รวมกันเทียบโอน',
+                'verbose_name_plural': '4.5 ชุดรายวิชาที่รวมกันเทียบโอน',
+                'ordering': ['transfer_request', '-similarity_score'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+from transfer import tokenizer
+
+
+def extract_keywords(apps, schema_editor):
+    for model_name in ('TargetCourse', 'SourceCourse'):
+        model = apps.get_model('transfer', model_name)
+        courses = list(model.objects.only('id', 'course_description'))
+        for course in courses:
+            course.keywords = tokenizer.keywords(course.course_description)
+        model.objects.bulk_update(courses, ['keywords'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0026_combinationsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcecourse',
+            name='keywords',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='คำสำคัญ'),
+        ),
+        migrations.AddField(
+            model_name='targetcourse',
+            name='keywords',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='คำสำคัญ'),
+        ),
+        migrations.RunPython(extract_keywords, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0027_course_keywords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RerankScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=255, verbose_name='ชื่อโมเดล')),
+                ('source_hash', models.CharField(max_length=64, verbose_name='แฮชคำอธิบายรายวิชาเดิม')),
+                ('target_hash', models.CharField(max_length=64, verbose_name='แฮชคำอธิบายรายวิชาเป้าหมาย')),
+                ('score', models.FloatField(verbose_name='คะแนน')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'คะแนน cross-encoder',
+                'verbose_name_plural': '8.1 คะแนน cross-encoder',
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'source_hash', 'target_hash'), name='unique_rerank_score')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0028_rerankscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sourcecourse',
+            index=models.Index(fields=['institution', 'course_code', 'id'], name='source_course_inst_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sourcecourse',
+            index=models.Index(fields=['course_code', 'id'], name='source_course_code_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='targetcourse',
+            index=models.Index(fields=['course_code', 'id'], name='target_course_code_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferrequest',
+            index=models.Index(fields=['created_at', 'id'], name='transfer_req_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferrequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='transfer_req_status_idx'),
+        ),
+    ]
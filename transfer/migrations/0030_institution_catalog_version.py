@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfer', '0029_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='institution',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='เวอร์ชันรายวิชา'),
+        ),
+    ]
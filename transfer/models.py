@@ -1,14 +1,22 @@
 # transfer/models.py
 
-from django.db import models
+import operator
+from functools import reduce
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from . import tokenizer
 
 # --- ส่วนข้อมูลเป้าหมาย (ที่เราจะเทียบโอนเข้า) ---
 
 class Curriculum(models.Model):
     name = models.CharField("ชื่อหลักสูตร", max_length=255)
+    # เพิ่มขึ้นทุกครั้งที่มีการบันทึก/ลบรายวิชาในหลักสูตร (ใช้ตรวจว่า cache ของ AI ยังใช้ได้หรือไม่)
+    catalog_version = models.PositiveIntegerField("เวอร์ชันรายวิชา", default=0, editable=False)
     
     class Meta:
         verbose_name = "หลักสูตร (เป้าหมาย)"
@@ -24,11 +32,17 @@ class TargetCourse(models.Model):
     course_name_th = models.CharField("ชื่อวิชา (ไทย)", max_length=255)
     credits = models.IntegerField("หน่วยกิต")
     course_description = models.TextField("คำอธิบายรายวิชา")
+    # คำสำคัญที่ตัดจากคำอธิบายรายวิชาแล้ว (transfer/tokenizer.py) ใช้สร้างเหตุผลประกอบโดยไม่ต้องตัดคำใหม่
+    keywords = models.JSONField("คำสำคัญ", default=list, blank=True, editable=False)
 
     class Meta:
         verbose_name = "รายวิชาในหลักสูตร"
         verbose_name_plural = "1.1 รายวิชาในหลักสูตร (เป้าหมาย)"
         ordering = ['curriculum', 'course_code']
+        indexes = [
+            # keyset pagination (transfer/pagination.py -> CoursePagination)
+            models.Index(fields=['course_code', 'id'], name='target_course_code_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course_code} - {self.course_name_th}"
@@ -38,6 +52,8 @@ class TargetCourse(models.Model):
 class Institution(models.Model):
     name = models.CharField("ชื่อสถาบัน", max_length=255)
     is_home_institution = models.BooleanField("เป็นสถาบันหลัก (สำหรับหลักสูตรเป้าหมาย)", default=False)
+    # เพิ่มขึ้นทุกครั้งที่มีการบันทึก/ลบรายวิชาของสถาบัน (เหมือน Curriculum.catalog_version)
+    catalog_version = models.PositiveIntegerField("เวอร์ชันรายวิชา", default=0, editable=False)
 
     class Meta:
         verbose_name = "สถาบัน (ต้นทาง)"
@@ -53,11 +69,18 @@ class SourceCourse(models.Model):
     course_name_th = models.CharField("ชื่อวิชา (ไทย)", max_length=255)
     credits = models.IntegerField("หน่วยกิต")
     course_description = models.TextField("คำอธิบายรายวิชา")
+    # คำสำคัญที่ตัดจากคำอธิบายรายวิชาแล้ว (transfer/tokenizer.py) ใช้สร้างเหตุผลประกอบโดยไม่ต้องตัดคำใหม่
+    keywords = models.JSONField("คำสำคัญ", default=list, blank=True, editable=False)
 
     class Meta:
         verbose_name = "รายวิชาสถาบัน"
         verbose_name_plural = "2.1 รายวิชาสถาบัน (ต้นทาง)"
         ordering = ['institution', 'course_code']
+        indexes = [
+            # keyset pagination (transfer/pagination.py -> CoursePagination) ทั้งแบบกรองตามสถาบันและทั้งหมด
+            models.Index(fields=['institution', 'course_code', 'id'], name='source_course_inst_code_idx'),
+            models.Index(fields=['course_code', 'id'], name='source_course_code_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course_code} - {self.course_name_th}"
@@ -79,18 +102,73 @@ class TransferRequest(models.Model):
     target_curriculum = models.ForeignKey(Curriculum, on_delete=models.SET_NULL, null=True, verbose_name="หลักสูตรเป้าหมาย")
     is_viewed_by_student = models.BooleanField(default=False)
 
+    # สถานะการจับคู่รายวิชาด้วย AI (ทำงานเบื้องหลังผ่าน MatchingJob)
+    MATCHING_STATUS_CHOICES = [
+        ('queued', 'รอประมวลผล'),
+        ('running', 'กำลังประมวลผล'),
+        ('done', 'เสร็จสิ้น'),
+        ('failed', 'ล้มเหลว'),
+    ]
+    matching_status = models.CharField("สถานะการจับคู่ AI", max_length=10, choices=MATCHING_STATUS_CHOICES, default='done')
+
     evidence_file = models.ImageField("หลักฐานประกอบ (รูปภาพ)", upload_to='evidence/', null=True, blank=True)
 
     class Meta:
         verbose_name = "คำร้องเทียบโอน"
         verbose_name_plural = "3. คำร้องเทียบโอน"
         ordering = ['-created_at']
+        indexes = [
+            # keyset pagination (transfer/pagination.py -> RequestPagination)
+            models.Index(fields=['created_at', 'id'], name='transfer_req_created_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='transfer_req_status_idx'),
+        ]
 
     def __str__(self):
         if self.target_curriculum:
             return f"คำร้องจาก {self.student.username} (เข้า {self.target_curriculum.name})"
         return f"คำร้องจาก {self.student.username}"
 
+    @staticmethod
+    def aggregate_status():
+        """
+        สถานะรวมจากรายการวิชา คำนวณใน SQL (subquery ต่อคำร้อง)
+        - มีรายการรอตรวจ -> pending, ผ่านหมด -> approved, ตกหมด -> rejected, นอกนั้น -> partially_approved
+        - คำร้องที่ไม่มีรายการวิชาคงสถานะเดิม
+        """
+        counts = (
+            RequestItem.objects.filter(transfer_request=OuterRef('pk'))
+            .order_by()
+            .values('transfer_request')
+            .annotate(
+                total=Count('pk'),
+                pending=Count('pk', filter=Q(status='pending')),
+                approved=Count('pk', filter=Q(status='approved')),
+                rejected=Count('pk', filter=Q(status='rejected')),
+            )
+            .annotate(aggregate_status=Case(
+                When(pending__gt=0, then=Value('pending')),
+                When(approved=F('total'), then=Value('approved')),
+                When(rejected=F('total'), then=Value('rejected')),
+                default=Value('partially_approved'),
+            ))
+            .values('aggregate_status')
+        )
+        return Coalesce(Subquery(counts), F('status'))
+
+    @classmethod
+    def refresh_statuses(cls, queryset=None):
+        """
+        คำนวณสถานะของคำร้องใน queryset ใหม่ด้วย UPDATE คำสั่งเดียว (ไม่โหลดรายการวิชาเข้ามาใน Python)
+        อัปเดตเฉพาะคำร้องที่สถานะเปลี่ยน คืนจำนวนคำร้องที่ถูกอัปเดต
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        return (
+            queryset.order_by()
+            .annotate(new_status=cls.aggregate_status())
+            .exclude(status=F('new_status'))
+            .update(status=F('new_status'), updated_at=timezone.now())
+        )
+
 class RequestItem(models.Model):
     STATUS_CHOICES = [('pending', 'รอตรวจสอบ'), ('approved', 'อนุมัติแล้ว'), ('rejected', 'ปฏิเสธ')]
     transfer_request = models.ForeignKey(TransferRequest, on_delete=models.CASCADE)
@@ -107,40 +185,23 @@ class RequestItem(models.Model):
 
     # --- ฟังก์ชัน save อัตโนมัติ (ฉลาดขึ้น) ---
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        # ตรวจสอบรายการทั้งหมดในคำร้องนี้
-        items = self.transfer_request.requestitem_set.all()
-        if not items:
-            return
-
-        # นับจำนวนสถานะต่างๆ
-        total = len(items)
-        approved_count = sum(1 for item in items if item.status == 'approved')
-        rejected_count = sum(1 for item in items if item.status == 'rejected')
-        pending_count = sum(1 for item in items if item.status == 'pending')
-
-        new_status = 'pending'
-
-        if pending_count > 0:
-            new_status = 'pending' # ถ้ามีอันไหนรอตรวจ สถานะรวมต้องรอ
-        elif approved_count == total:
-            new_status = 'approved' # ผ่านหมด
-        elif rejected_count == total:
-            new_status = 'rejected' # ตกหมด
-        else:
-            new_status = 'partially_approved' # ผ่านบ้าง ตกบ้าง
-
-        # อัปเดตสถานะคำร้องแม่
-        if self.transfer_request.status != new_status:
-            self.transfer_request.status = new_status
-            self.transfer_request.save()
+        with transaction.atomic():
+            # ล็อกแถวคำร้องก่อน อาจารย์สองคนที่แก้รายการในคำร้องเดียวกันพร้อมกันจะทำงานต่อกันทีละคน
+            # (UPDATE ด้านล่างจึงเห็นสถานะรายการของอีกคนที่ commit แล้วเสมอ)
+            list(TransferRequest.objects.select_for_update().filter(pk=self.transfer_request_id).values_list('pk'))
+            super().save(*args, **kwargs)
+
+            # อัปเดตสถานะคำร้องแม่ด้วย aggregate UPDATE คำสั่งเดียว
+            changed = TransferRequest.refresh_statuses(TransferRequest.objects.filter(pk=self.transfer_request_id))
+            if changed and RequestItem.transfer_request.is_cached(self):
+                self.transfer_request.refresh_from_db(fields=['status', 'updated_at'])
 
 class AIComparisonResult(models.Model):
     request_item = models.OneToOneField(RequestItem, on_delete=models.CASCADE)
     suggested_course = models.ForeignKey(TargetCourse, on_delete=models.CASCADE, verbose_name="รายวิชาที่แนะนำ")
     similarity_score = models.FloatField("คะแนนความสอดคล้อง")
     explanation = models.TextField("เหตุผลประกอบ", blank=True, null=True)
+    is_previously_approved = models.BooleanField("เคยได้รับอนุมัติแล้ว", default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -152,6 +213,216 @@ class AIComparisonResult(models.Model):
         score_percent = round(self.similarity_score * 100, 2)
         return f"Match: '{self.request_item.original_course}' -> '{self.suggested_course}' ({score_percent}%)"
 
+class AISuggestion(models.Model):
+    """รายวิชาที่ AI แนะนำเรียงตามอันดับ (top-k) สำหรับแต่ละรายการในคำร้อง"""
+    request_item = models.ForeignKey(RequestItem, on_delete=models.CASCADE, related_name='ai_suggestions')
+    rank = models.PositiveSmallIntegerField("อันดับ")
+    suggested_course = models.ForeignKey(TargetCourse, on_delete=models.CASCADE, verbose_name="รายวิชาที่แนะนำ")
+    similarity_score = models.FloatField("คะแนนความสอดคล้อง")
+
+    class Meta:
+        verbose_name = "รายวิชาแนะนำ (Top-k)"
+        verbose_name_plural = "4.2 รายวิชาแนะนำ (Top-k)"
+        ordering = ['request_item', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['request_item', 'rank'], name='unique_ai_suggestion_rank'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} {self.suggested_course} for item {self.request_item_id}"
+
+class CombinationSuggestion(models.Model):
+    """กลุ่มรายวิชาเดิม 2-3 วิชาในคำร้องเดียวกัน ที่ AI แนะนำให้รวมกันเทียบโอนเป็นรายวิชาเดียว"""
+    transfer_request = models.ForeignKey(
+        TransferRequest, on_delete=models.CASCADE, related_name='combination_suggestions',
+    )
+    target_course = models.ForeignKey(TargetCourse, on_delete=models.CASCADE, verbose_name="รายวิชาที่แนะนำ")
+    items = models.ManyToManyField(RequestItem, related_name='combination_suggestions', verbose_name="รายวิชาเดิม")
+    similarity_score = models.FloatField("คะแนนความสอดคล้อง")
+    total_credits = models.PositiveIntegerField("หน่วยกิตรวม")
+
+    class Meta:
+        verbose_name = "ชุดรายวิชาที่รวมกันเทียบโอน"
+        verbose_name_plural = "4.5 ชุดรายวิชาที่รวมกันเทียบโอน"
+        ordering = ['transfer_request', '-similarity_score']
+
+    def __str__(self):
+        return f"{self.target_course} ({self.total_credits} credits) for request {self.transfer_request_id}"
+
+class ApprovedEquivalence(models.Model):
+    """
+    คู่เทียบโอน (วิชาต้นทาง -> วิชาในหลักสูตร) ที่อาจารย์ยืนยันแล้ว
+    อัปเดตทุกครั้งที่สถานะของ RequestItem เปลี่ยนเป็น/จาก อนุมัติ หรือ ปฏิเสธ
+    """
+    source_course = models.ForeignKey(SourceCourse, on_delete=models.CASCADE, verbose_name="รายวิชาเดิม")
+    curriculum = models.ForeignKey(Curriculum, on_delete=models.CASCADE, verbose_name="หลักสูตร")
+    target_course = models.ForeignKey(TargetCourse, on_delete=models.CASCADE, verbose_name="รายวิชาที่เทียบได้")
+    approved_count = models.PositiveIntegerField("จำนวนครั้งที่อนุมัติ", default=0)
+    rejected_count = models.PositiveIntegerField("จำนวนครั้งที่ปฏิเสธ", default=0)
+    similarity_score = models.FloatField("คะแนนความสอดคล้อง (AI)", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "คู่เทียบโอนที่อาจารย์ยืนยันแล้ว"
+        verbose_name_plural = "4.4 คู่เทียบโอนที่อาจารย์ยืนยันแล้ว"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_course', 'curriculum', 'target_course'], name='unique_approved_equivalence',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source_course} -> {self.target_course} (+{self.approved_count}/-{self.rejected_count})"
+
+    # จำนวนคู่ต่อหนึ่ง UPDATE (จำกัดจำนวน parameter ของคำสั่ง SQL)
+    REVIEW_BATCH_SIZE = 200
+
+    @classmethod
+    def record_reviews(cls, changes):
+        """
+        บันทึกผลการพิจารณาของอาจารย์ changes = [(request_item, previous_status, new_status), ...]
+        (request_item ต้องมี transfer_request และ aicomparisonresult ให้เข้าถึงได้)
+        """
+        deltas = {}
+        for item, previous_status, new_status in changes:
+            if previous_status == new_status:
+                continue
+            try:
+                result = item.aicomparisonresult
+            except AIComparisonResult.DoesNotExist:
+                continue
+            curriculum_id = item.transfer_request.target_curriculum_id
+            if not curriculum_id:
+                continue
+
+            key = (item.original_course_id, curriculum_id, result.suggested_course_id)
+            delta = deltas.setdefault(key, {'approved': 0, 'rejected': 0, 'score': result.similarity_score})
+            for status, step in ((previous_status, -1), (new_status, 1)):
+                if status in ('approved', 'rejected'):
+                    delta[status] += step
+
+        keys = sorted(key for key, delta in deltas.items() if delta['approved'] or delta['rejected'])
+        for start in range(0, len(keys), cls.REVIEW_BATCH_SIZE):
+            batch = keys[start:start + cls.REVIEW_BATCH_SIZE]
+            conditions = [
+                Q(source_course_id=source_id, curriculum_id=curriculum_id, target_course_id=target_id)
+                for source_id, curriculum_id, target_id in batch
+            ]
+
+            def per_key(field, default):
+                return Case(
+                    *[When(condition, then=Value(deltas[key][field])) for condition, key in zip(conditions, batch)],
+                    default=default,
+                )
+
+            # สร้างแถวที่ยังไม่มีในคำสั่งเดียว แล้วบวกค่าของทุกคู่ด้วย UPDATE เดียว (Case/When ต่อคู่)
+            cls.objects.bulk_create(
+                [
+                    cls(source_course_id=source_id, curriculum_id=curriculum_id, target_course_id=target_id)
+                    for source_id, curriculum_id, target_id in batch
+                ],
+                ignore_conflicts=True,
+            )
+            cls.objects.filter(reduce(operator.or_, conditions)).update(
+                approved_count=Greatest(F('approved_count') + per_key('approved', Value(0)), 0),
+                rejected_count=Greatest(F('rejected_count') + per_key('rejected', Value(0)), 0),
+                similarity_score=per_key('score', F('similarity_score')),
+                updated_at=timezone.now(),
+            )
+
+class MatchResultCache(models.Model):
+    """
+    ผลการจับคู่ที่คำนวณไว้แล้วของ (วิชาต้นทาง, หลักสูตร, เวอร์ชันรายวิชา, เวอร์ชันโมเดล)
+    นักศึกษาที่ยื่นวิชาเดิมเข้าหลักสูตรเดิม จะได้ผลจากตารางนี้โดยไม่ต้องรันโมเดลใหม่
+    """
+    source_course = models.ForeignKey(SourceCourse, on_delete=models.CASCADE, verbose_name="รายวิชาเดิม")
+    curriculum = models.ForeignKey(Curriculum, on_delete=models.CASCADE, verbose_name="หลักสูตร")
+    curriculum_version = models.PositiveIntegerField("เวอร์ชันรายวิชาของหลักสูตร")
+    model_version = models.CharField("เวอร์ชันโมเดล", max_length=255)
+    suggested_course = models.ForeignKey(TargetCourse, on_delete=models.CASCADE, verbose_name="รายวิชาที่แนะนำ")
+    similarity_score = models.FloatField("คะแนนความสอดคล้อง")
+    explanation = models.TextField("เหตุผลประกอบ", blank=True)
+    # รายวิชาแนะนำ top-k ในรูป [[target_course_id, score], ...]
+    suggestions = models.JSONField("รายวิชาแนะนำ (Top-k)", default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "แคชผลการจับคู่ AI"
+        verbose_name_plural = "4.3 แคชผลการจับคู่ AI"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_course', 'curriculum', 'curriculum_version', 'model_version'],
+                name='unique_match_result_cache',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source_course_id} -> {self.suggested_course_id} (curriculum {self.curriculum_id} v{self.curriculum_version})"
+
+class MatchingJob(models.Model):
+    """คิวงานจับคู่รายวิชาด้วย AI (เก็บในฐานข้อมูล ประมวลผลโดย manage.py run_matching_worker)"""
+    transfer_request = models.OneToOneField(TransferRequest, on_delete=models.CASCADE, related_name='matching_job')
+    status = models.CharField("สถานะ", max_length=10, choices=TransferRequest.MATCHING_STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField("จำนวนครั้งที่ประมวลผล", default=0)
+    run_after = models.DateTimeField("เริ่มประมวลผลได้ตั้งแต่", default=timezone.now)
+    locked_until = models.DateTimeField("ล็อกโดย worker ถึง", null=True, blank=True)
+    last_error = models.TextField("ข้อผิดพลาดล่าสุด", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "งานจับคู่ AI"
+        verbose_name_plural = "4.1 คิวงานจับคู่ AI"
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='matching_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Matching job for request {self.transfer_request_id} ({self.status})"
+
+# --- ส่วนเก็บเวกเตอร์ของคำอธิบายรายวิชา (Embedding Store) ---
+
+class CourseEmbedding(models.Model):
+    """
+    เก็บเวกเตอร์ (L2-normalized float32) ของคำอธิบายรายวิชา
+    โดยใช้แฮชของข้อความที่ normalize แล้ว + ชื่อโมเดลเป็นคีย์
+    ใช้ร่วมกันได้ทั้ง SourceCourse และ TargetCourse (ข้อความเดียวกัน = เวกเตอร์เดียวกัน)
+    """
+    content_hash = models.CharField("แฮชคำอธิบายรายวิชา", max_length=64)
+    model_name = models.CharField("ชื่อโมเดล", max_length=255)
+    dimension = models.PositiveIntegerField("จำนวนมิติ")
+    vector = models.BinaryField("เวกเตอร์")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "เวกเตอร์คำอธิบายรายวิชา"
+        verbose_name_plural = "8. เวกเตอร์คำอธิบายรายวิชา"
+        constraints = [
+            models.UniqueConstraint(fields=['model_name', 'content_hash'], name='unique_course_embedding'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name}:{self.content_hash[:12]}"
+
+class RerankScore(models.Model):
+    """คะแนน cross-encoder ของคู่คำอธิบายรายวิชา (แฮชวิชาต้นทาง, แฮชวิชาเป้าหมาย) ต่อโมเดล"""
+    model_name = models.CharField("ชื่อโมเดล", max_length=255)
+    source_hash = models.CharField("แฮชคำอธิบายรายวิชาเดิม", max_length=64)
+    target_hash = models.CharField("แฮชคำอธิบายรายวิชาเป้าหมาย", max_length=64)
+    score = models.FloatField("คะแนน")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "คะแนน cross-encoder"
+        verbose_name_plural = "8.1 คะแนน cross-encoder"
+        constraints = [
+            models.UniqueConstraint(fields=['model_name', 'source_hash', 'target_hash'], name='unique_rerank_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name}:{self.source_hash[:12]}/{self.target_hash[:12]} = {self.score:.4f}"
+
 # --- ส่วนของโปรไฟล์ผู้ใช้ (Legacy) ---
 
 class UserProfile(models.Model):
@@ -209,4 +480,78 @@ def auto_manage_user_role(sender, instance, created, **kwargs):
     else:
         # เป็นนักศึกษา
         FacultyProfile.objects.filter(user=instance).delete()
-        StudentProfile.objects.get_or_create(user=instance)
\ No newline at end of file
+        StudentProfile.objects.get_or_create(user=instance)
+
+# ==========================================
+#  Signal: เปลี่ยนเวอร์ชันหลักสูตร/สถาบันเมื่อรายวิชาเปลี่ยน
+# ==========================================
+def bump_catalog_version(*curriculum_ids):
+    ids = {pk for pk in curriculum_ids if pk is not None}
+    if ids:
+        Curriculum.objects.filter(pk__in=ids).update(catalog_version=F('catalog_version') + 1)
+
+def bump_institution_version(*institution_ids):
+    ids = {pk for pk in institution_ids if pk is not None}
+    if ids:
+        Institution.objects.filter(pk__in=ids).update(catalog_version=F('catalog_version') + 1)
+
+@receiver(pre_save, sender=TargetCourse)
+@receiver(pre_save, sender=SourceCourse)
+def extract_keywords(sender, instance, **kwargs):
+    instance.keywords = tokenizer.keywords(instance.course_description)
+
+@receiver(pre_save, sender=TargetCourse)
+def remember_previous_curriculum(sender, instance, raw, **kwargs):
+    # จำหลักสูตรเดิมไว้ กรณีย้ายรายวิชาไปหลักสูตรอื่น หลักสูตรเดิมก็ต้องถูก invalidate ด้วย
+    instance._previous_curriculum_id = None
+    if instance.pk and not raw:
+        instance._previous_curriculum_id = (
+            TargetCourse.objects.filter(pk=instance.pk).values_list('curriculum_id', flat=True).first()
+        )
+
+@receiver(pre_save, sender=SourceCourse)
+def remember_previous_institution(sender, instance, raw, **kwargs):
+    instance._previous_institution_id = None
+    if instance.pk and not raw:
+        instance._previous_institution_id = (
+            SourceCourse.objects.filter(pk=instance.pk).values_list('institution_id', flat=True).first()
+        )
+
+@receiver(post_save, sender=TargetCourse)
+def target_course_saved(sender, instance, **kwargs):
+    bump_catalog_version(instance.curriculum_id, getattr(instance, '_previous_curriculum_id', None))
+
+@receiver(post_delete, sender=TargetCourse)
+def target_course_deleted(sender, instance, **kwargs):
+    bump_catalog_version(instance.curriculum_id)
+
+
+@receiver(post_save, sender=SourceCourse)
+def source_course_saved(sender, instance, created, raw, **kwargs):
+    bump_institution_version(instance.institution_id, getattr(instance, '_previous_institution_id', None))
+    # คำอธิบายรายวิชาอาจเปลี่ยน ผลจับคู่ที่ cache ไว้ของวิชานี้จึงใช้ไม่ได้แล้ว
+    if not created and not raw:
+        MatchResultCache.objects.filter(source_course=instance).delete()
+
+@receiver(post_delete, sender=SourceCourse)
+def source_course_deleted(sender, instance, **kwargs):
+    bump_institution_version(instance.institution_id)
+
+
+# ==========================================
+#  Signal: เก็บคู่เทียบโอนที่อาจารย์ยืนยันแล้ว
+# ==========================================
+@receiver(pre_save, sender=RequestItem)
+def remember_previous_item_status(sender, instance, raw, **kwargs):
+    instance._previous_status = None
+    if instance.pk and not raw:
+        instance._previous_status = (
+            RequestItem.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        )
+
+@receiver(post_save, sender=RequestItem)
+def request_item_reviewed(sender, instance, raw, **kwargs):
+    previous_status = getattr(instance, '_previous_status', None)
+    if raw or previous_status is None or previous_status == instance.status:
+        return
+    ApprovedEquivalence.record_reviews([(instance, previous_status, instance.status)])
@@ -0,0 +1,141 @@
+# transfer/pagination.py
+"""
+แบ่งหน้าแบบ keyset (cursor) สำหรับ list endpoint
+
+- cursor เก็บค่าคอลัมน์ที่ใช้เรียงของแถวสุดท้ายในหน้า (เช่น created_at และ id)
+  หน้าถัดไปคือ WHERE (created_at, id) < (ค่าใน cursor) ไม่ใช้ OFFSET
+  ทุกหน้าจึงใช้เวลาเท่ากันเมื่อมี index ตามลำดับเดียวกัน และไม่เลื่อนเมื่อมีแถวใหม่แทรกเข้ามา
+- เปิดใช้เมื่อส่ง ?cursor= หรือ ?page_size= มาเท่านั้น
+  ถ้าไม่ส่ง จะตอบเป็น array เดิมทั้งหมด (frontend เดิมยังใช้งานได้)
+- ขนาดหน้าเริ่มต้นมาจาก settings.API_PAGE_SIZE (ปรับต่อ request ได้ด้วย ?page_size= ไม่เกิน max_page_size)
+"""
+import base64
+import binascii
+import json
+import operator
+from functools import reduce
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('-id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        value = request.query_params.get(self.page_size_query_param)
+        if value:
+            try:
+                page_size = int(value)
+            except ValueError:
+                pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # ดึงเกินหนึ่งแถวเพื่อรู้ว่ามีหน้าถัดไปหรือไม่
+        rows = list(queryset[:self.page_size + 1])
+        self.next_position = self.position_of(rows[self.page_size - 1]) if len(rows) > self.page_size else None
+        return rows[:self.page_size]
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    # ---- cursor ----
+
+    def fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def position_of(self, row):
+        return [getattr(row, name) for name, _ in self.fields()]
+
+    def after(self, position):
+        """
+        เงื่อนไขแถวที่อยู่หลัง position ตามลำดับ ordering
+        (a, b) > (x, y)  ==  a >= x AND (a > x OR (a = x AND b > y))
+        เงื่อนไข a >= x ที่ AND ไว้ด้านนอกทำให้ฐานข้อมูลใช้ index เป็น range seek ได้
+        (ถ้ามีแต่ OR ส่วนใหญ่จะ scan index ตั้งแต่ต้น)
+        """
+        fields = self.fields()
+        conditions, equal = [], {}
+        for (name, descending), value in zip(fields, position):
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            conditions.append(Q(**equal, **{lookup: value}))
+            equal[name] = value
+        condition = reduce(operator.or_, conditions)
+        if len(conditions) > 1:
+            (name, descending), value = fields[0], position[0]
+            condition &= Q(**{f'{name}__lte' if descending else f'{name}__gte': value})
+        return condition
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            fields = self.fields()
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(fields, values)]
+        except (TypeError, ValueError, ValidationError, binascii.Error) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+
+class RequestPagination(KeysetPagination):
+    """คำร้อง: ใหม่สุดก่อน"""
+    ordering = ('-created_at', '-id')
+
+
+class CoursePagination(KeysetPagination):
+    """รายวิชา (ต้นทาง/เป้าหมาย)"""
+    ordering = ('course_code', 'id')
+
+
+class NamePagination(KeysetPagination):
+    """สถาบัน / หลักสูตร"""
+    ordering = ('name', 'id')
@@ -0,0 +1,18 @@
+# transfer/preload.py
+"""
+จุดเดียวสำหรับโหลดของหนักล่วงหน้า (โมเดล AI, cache หลักสูตร, WeasyPrint)
+
+ปกติทุกอย่างจะถูกโหลดแบบ lazy ตอนใช้งานครั้งแรก
+server ที่ต้องการให้คำขอแรกเร็ว (เช่น gunicorn) ให้เรียก preload() ตอนเริ่มทำงาน
+"""
+from . import ai_comparator
+from .utils import load_weasyprint
+
+
+def preload(warm_caches=True):
+    ai_comparator.preload(warm_caches=warm_caches)
+    try:
+        load_weasyprint()
+    except (ImportError, OSError):
+        # เครื่องที่ไม่มี GTK/Pango ยังรัน API ส่วนอื่นได้ (จะ error เฉพาะตอนสร้าง PDF)
+        pass
@@ -1,5 +1,6 @@
 # transfer/serializers.py
 from django.contrib.auth.models import User
+from django.db import transaction
 from rest_framework import serializers
 import json
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -11,6 +12,8 @@ from .models import (
     TransferRequest,
     RequestItem,
     AIComparisonResult,
+    AISuggestion,
+    CombinationSuggestion,
     UserProfile
 )
 
@@ -127,28 +130,53 @@ class TransferRequestCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TransferRequest
-        fields = ['id', 'target_curriculum', 'items', 'evidence_file']
+        fields = ['id', 'target_curriculum', 'items', 'evidence_file', 'matching_status']
+        read_only_fields = ['matching_status']
 
-    def create(self, validated_data):
-        items_raw = validated_data.pop('items')
-        
+    def validate_items(self, items_raw):
         # ถ้าส่งมาเป็น String (จาก FormData) ให้แปลงเป็น List
         if isinstance(items_raw, str):
-            items_data = json.loads(items_raw)
-        else:
-            items_data = items_raw
+            try:
+                items_raw = json.loads(items_raw)
+            except ValueError:
+                raise serializers.ValidationError('items must be a JSON list')
+        if not isinstance(items_raw, list):
+            raise serializers.ValidationError('items must be a list')
+
+        grade_length = RequestItem._meta.get_field('grade').max_length
+        items_data = []
+        for item in items_raw:
+            try:
+                course_id, grade = int(item['original_course']), str(item['grade'])
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError('each item needs original_course and grade')
+            if not grade or len(grade) > grade_length:
+                raise serializers.ValidationError(f'invalid grade {grade!r} for course {course_id}')
+            items_data.append({'original_course': course_id, 'grade': grade})
+
+        # ตรวจรหัสวิชาทั้งหมดใน query เดียว ก่อนเขียนอะไรลงฐานข้อมูล
+        course_ids = {item['original_course'] for item in items_data}
+        unknown = course_ids - set(SourceCourse.objects.filter(pk__in=course_ids).values_list('pk', flat=True))
+        if unknown:
+            raise serializers.ValidationError(f'unknown original_course ids: {sorted(unknown)}')
+        return items_data
+
+    def create(self, validated_data):
+        items_data = validated_data.pop('items')
+
+        with transaction.atomic():
+            # รายการวิชาใหม่ทุกรายการเป็น 'pending' สถานะเริ่มต้นของคำร้องจึงเป็น 'pending' เสมอ
+            # ใช้ bulk_create (ไม่ผ่าน RequestItem.save ที่คำนวณสถานะคำร้องใหม่ทุกรายการ)
+            transfer_request = TransferRequest.objects.create(status='pending', **validated_data)
+            RequestItem.objects.bulk_create([
+                RequestItem(
+                    transfer_request=transfer_request,
+                    original_course_id=item_data['original_course'],
+                    grade=item_data['grade'],
+                )
+                for item_data in items_data
+            ])
 
-        # สร้างคำร้องพร้อมไฟล์แนบ
-        transfer_request = TransferRequest.objects.create(**validated_data)
-        
-        # สร้างรายการวิชา
-        for item_data in items_data:
-            RequestItem.objects.create(
-                transfer_request=transfer_request,
-                original_course_id=item_data['original_course'],
-                grade=item_data['grade']
-            )
-            
         return transfer_request
 
 #================================#
@@ -177,23 +205,40 @@ class AIComparisonResultSerializer(serializers.ModelSerializer):
     suggested_course = TargetCourseDetailSerializer(read_only=True)
     class Meta:
         model = AIComparisonResult
-        fields = ['suggested_course', 'similarity_score', 'explanation']
+        fields = ['suggested_course', 'similarity_score', 'explanation', 'is_previously_approved']
+
+class AISuggestionSerializer(serializers.ModelSerializer):
+    suggested_course = TargetCourseDetailSerializer(read_only=True)
+    class Meta:
+        model = AISuggestion
+        fields = ['rank', 'suggested_course', 'similarity_score']
+
+class CombinationSuggestionSerializer(serializers.ModelSerializer):
+    target_course = TargetCourseDetailSerializer(read_only=True)
+    class Meta:
+        model = CombinationSuggestion
+        fields = ['id', 'target_course', 'items', 'similarity_score', 'total_credits']
 
 class RequestItemDetailSerializer(serializers.ModelSerializer):
     original_course = SourceCourseDetailSerializer(read_only=True)
     aicomparisonresult = AIComparisonResultSerializer(read_only=True)
+    suggestions = AISuggestionSerializer(many=True, read_only=True, source='ai_suggestions')
     class Meta:
         model = RequestItem
         # ลบบรรทัดซ้ำออก เหลืออันที่ครบถ้วนไว้
-        fields = ['id', 'original_course', 'grade', 'status', 'aicomparisonresult']
+        fields = ['id', 'original_course', 'grade', 'status', 'aicomparisonresult', 'suggestions']
 
 class TransferRequestListSerializer(serializers.ModelSerializer):
     student = UserSerializer(read_only=True)
     target_curriculum = CurriculumSerializer(read_only=True)
     items = RequestItemDetailSerializer(many=True, source='requestitem_set', read_only=True)
+    combination_suggestions = CombinationSuggestionSerializer(many=True, read_only=True)
     class Meta:
         model = TransferRequest
-        fields = ['id', 'student', 'status', 'created_at', 'target_curriculum', 'items','evidence_file']
+        fields = [
+            'id', 'student', 'status', 'matching_status', 'created_at', 'target_curriculum', 'items',
+            'combination_suggestions', 'evidence_file',
+        ]
 
 class TransferRequestStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,110 @@
+# transfer/term_matrix.py
+"""
+เมทริกซ์ TF-IDF (CSR) ของคำสำคัญในคำอธิบายรายวิชาทั้ง catalog
+
+- fit ด้วย scikit-learn TfidfVectorizer จากคำสำคัญที่ตัดไว้แล้ว (TargetCourse/SourceCourse.keywords)
+- บันทึกเป็นไฟล์ .npz ไฟล์เดียว (data/indices/indptr ของ CSR + คำศัพท์ + IDF + คีย์ของแต่ละแถว)
+- คำที่ตรงกันของหลายคู่รายวิชาหาได้พร้อมกันด้วย elementwise multiply ของ CSR สองเมทริกซ์
+"""
+import os
+import tempfile
+import numpy as np
+from scipy import sparse
+
+
+class TermMatrix:
+    def __init__(self, matrix, vocabulary, idf, row_keys, stamp=''):
+        self.matrix = matrix.tocsr()
+        self.vocabulary = np.asarray(vocabulary)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.columns = {term: column for column, term in enumerate(self.vocabulary.tolist())}
+        self.rows = {key: row for row, key in enumerate(row_keys)}
+        self.stamp = stamp
+
+    @classmethod
+    def build(cls, documents, stamp=''):
+        """documents = [(key, [คำสำคัญ, ...]), ...] โดย key เป็น tuple (ชนิด, id)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        keys = [key for key, _ in documents]
+        if not keys:
+            return cls(sparse.csr_matrix((0, 0), dtype=np.float32), [], [], [], stamp)
+        vectorizer = TfidfVectorizer(analyzer=list, dtype=np.float32)
+        try:
+            matrix = vectorizer.fit_transform([terms for _, terms in documents])
+        except ValueError:
+            # ยังไม่มีรายวิชาใดมีคำสำคัญ (empty vocabulary)
+            return cls(sparse.csr_matrix((len(keys), 0), dtype=np.float32), [], [], keys, stamp)
+        return cls(matrix, vectorizer.get_feature_names_out(), vectorizer.idf_, keys, stamp)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            matrix = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']),
+            )
+            row_keys = [(str(kind), int(pk)) for kind, pk in zip(data['row_kinds'], data['row_ids'])]
+            return cls(matrix, data['vocabulary'], data['idf'], row_keys, str(data['stamp']))
+
+    def save(self, path):
+        """เขียนแบบ atomic (ไฟล์ชั่วคราวแล้ว rename) เพื่อไม่ให้ process อื่นอ่านไฟล์ที่เขียนไม่เสร็จ"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        keys = sorted(self.rows, key=self.rows.get)
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(handle, 'wb') as f:
+            np.savez_compressed(
+                f,
+                data=self.matrix.data,
+                indices=self.matrix.indices,
+                indptr=self.matrix.indptr,
+                shape=np.array(self.matrix.shape),
+                vocabulary=self.vocabulary.astype(str),
+                idf=self.idf,
+                row_kinds=np.array([kind for kind, _ in keys], dtype=str),
+                row_ids=np.array([pk for _, pk in keys], dtype=np.int64),
+                stamp=np.array(self.stamp),
+            )
+        os.replace(temporary, path)
+
+    @property
+    def nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes + self.idf.nbytes
+
+    def transform(self, documents):
+        """แปลงรายการคำสำคัญเป็นแถว TF-IDF (l2-normalized) ด้วย IDF ของ catalog (คำที่ไม่รู้จักถูกข้าม)"""
+        indptr, indices = [0], []
+        for terms in documents:
+            indices.extend(sorted({self.columns[term] for term in terms if term in self.columns}))
+            indptr.append(len(indices))
+        indices = np.array(indices, dtype=np.int32)
+        data = self.idf[indices] if len(indices) else np.zeros(0, dtype=np.float32)
+        rows = sparse.csr_matrix((data, indices, np.array(indptr)), shape=(len(documents), len(self.vocabulary)))
+        norms = np.sqrt(rows.multiply(rows).sum(axis=1)).A1
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(rows).tocsr()
+
+    def lookup(self, keys, documents):
+        """แถวของ keys จากเมทริกซ์ที่คำนวณไว้ (แถวที่ไม่มีในเมทริกซ์แปลงจาก documents แทน)"""
+        known = [index for index, key in enumerate(keys) if key in self.rows]
+        missing = [index for index, key in enumerate(keys) if key not in self.rows]
+        rows = self.matrix[[self.rows[keys[index]] for index in known]]
+        if not missing:
+            return rows
+        stacked = sparse.vstack([rows, self.transform([documents[index] for index in missing])]).tocsr()
+        order = np.argsort(np.array(known + missing), kind='stable')
+        return stacked[order]
+
+    def shared_terms(self, left, right, limit=10):
+        """
+        คำที่ปรากฏทั้งในแถว left[i] และ right[i] เรียงตาม IDF (คำที่หายากกว่ามาก่อน)
+        คืน list ของ [คำ, ...] ยาวเท่าจำนวนแถว
+        """
+        common = left.multiply(right).tocsr()
+        common.eliminate_zeros()
+        results = []
+        for row in range(common.shape[0]):
+            columns = common.indices[common.indptr[row]:common.indptr[row + 1]]
+            order = np.lexsort((columns, -self.idf[columns]))[:limit]
+            results.append(self.vocabulary[columns[order]].tolist())
+        return results
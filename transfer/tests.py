@@ -1,3 +1,1388 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import ai_comparator, matching, tokenizer
+from .ann_index import IVFIndex
+from .lexical_index import BM25Index
+from .models import (
+    AIComparisonResult,
+    AISuggestion,
+    ApprovedEquivalence,
+    CombinationSuggestion,
+    CourseEmbedding,
+    Curriculum,
+    Institution,
+    MatchingJob,
+    MatchResultCache,
+    RequestItem,
+    RerankScore,
+    SourceCourse,
+    TargetCourse,
+    TransferRequest,
+)
+from .pagination import RequestPagination
+from .term_matrix import TermMatrix
+
+
+class FakeEncoder:
+    """
+    encoder ปลอมแทนโมเดลจริง (interface เดียวกับ backend ใน transfer/ai_backends.py)
+    ข้อความที่อยู่ใน vectors ได้เวกเตอร์ที่กำหนด ข้อความอื่นได้เวกเตอร์จากแฮชของคำ (normalize แล้วทั้งหมด)
+    calls เก็บข้อความของการเรียก encode แต่ละครั้ง
+    """
+    DIMENSION = 4
+
+    def __init__(self, vectors=None):
+        self.vectors = vectors or {}
+        self.calls = []
+
+    def dimension(self):
+        return self.DIMENSION
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        rows = np.array([self.vector(text) for text in texts], dtype=np.float32).reshape(len(texts), self.DIMENSION)
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        return rows / np.where(norms == 0, 1, norms)
+
+    def vector(self, text):
+        if text in self.vectors:
+            return self.vectors[text]
+        vector = np.full(self.DIMENSION, 0.01)
+        for word in text.split():
+            vector[zlib.crc32(word.encode('utf-8')) % self.DIMENSION] += 1
+        return vector
+
+    @property
+    def encoded(self):
+        return [text for texts in self.calls for text in texts]
+
+
+class FakeEncoderMixin:
+    """
+    ใช้ FakeEncoder แทนโมเดล และเริ่มทุกเทสต์ด้วย cache ระดับ process ที่ว่าง
+    (id และ catalog_version ในฐานข้อมูลเทสต์ซ้ำกันได้หลัง rollback จึงใช้ cache ข้ามเทสต์ไม่ได้)
+    """
+    vectors = {}
+
+    def setUp(self):
+        super().setUp()
+        self.encoder = FakeEncoder(self.vectors)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        tfidf_file = os.path.join(directory.name, 'tfidf.npz')
+        self.patch(ai_comparator, 'get_model', lambda: self.encoder)
+        self.patch(ai_comparator, '_term_matrix_path', lambda: tfidf_file)
+        for name in ('_ann_index', '_lexical_index', '_term_matrix'):
+            self.patch(ai_comparator, name, None)
+        ai_comparator.clear_curriculum_cache()
+        self.addCleanup(ai_comparator.clear_curriculum_cache)
+
+    def patch(self, target, name, value):
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class RequestGraphQueryBudgetTests(TestCase):
+    """
+    งบจำนวน query ของ endpoint ที่ใช้ TransferRequestListSerializer
+    จำนวน query ต้องคงที่ไม่ว่าจะมีกี่คำร้อง/กี่รายวิชา (กัน N+1 ย้อนกลับมา)
+    """
+
+    # 1 (คำร้อง + student/userprofile/target_curriculum) + requestitem_set + ai_suggestions
+    # + combination_suggestions + combination_suggestions.items
+    LIST_BUDGET = 5
+    DETAIL_BUDGET = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.faculty = User.objects.create_user('faculty', password='x', is_staff=True)
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        cls.institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.targets = [
+            TargetCourse.objects.create(
+                curriculum=cls.curriculum, course_code=f'CPE{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description='การเขียนโปรแกรมคอมพิวเตอร์',
+            )
+            for index in range(3)
+        ]
+        cls.sources = [
+            SourceCourse.objects.create(
+                institution=cls.institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description='การเขียนโปรแกรมคอมพิวเตอร์เบื้องต้น',
+            )
+            for index in range(3)
+        ]
+
+    def create_requests(self, count, status='pending'):
+        for _ in range(count):
+            transfer_request = TransferRequest.objects.create(
+                student=self.student, target_curriculum=self.curriculum, status=status,
+            )
+            # save() ของ RequestItem คำนวณสถานะคำร้องใหม่ ใช้ bulk_create เพื่อคงสถานะที่ต้องการ
+            items = RequestItem.objects.bulk_create([
+                RequestItem(transfer_request=transfer_request, original_course=source, grade='A')
+                for source in self.sources
+            ])
+            for item, target in zip(items, self.targets):
+                AIComparisonResult.objects.create(request_item=item, suggested_course=target, similarity_score=0.9)
+                AISuggestion.objects.bulk_create([
+                    AISuggestion(request_item=item, rank=rank, suggested_course=course, similarity_score=0.8)
+                    for rank, course in enumerate(self.targets, start=1)
+                ])
+            combination = CombinationSuggestion.objects.create(
+                transfer_request=transfer_request, target_course=self.targets[0],
+                similarity_score=0.7, total_credits=6,
+            )
+            combination.items.set(items[:2])
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assert_constant_queries(self, user, url, budget, status='pending'):
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.create_requests(1, status=status)
+        few, response = self.count_queries(client, url)
+        self.create_requests(6, status=status)
+        many, response = self.count_queries(client, url)
+
+        self.assertEqual(len(response.data), 7)
+        self.assertEqual(few, many, f'{url}: {few} queries for 1 request but {many} for 7')
+        self.assertLessEqual(many, budget, f'{url}: {many} queries, budget is {budget}')
+
+    def test_pending_request_list(self):
+        self.assert_constant_queries(self.faculty, '/api/admin/pending-requests/', self.LIST_BUDGET)
+
+    def test_request_history_list(self):
+        self.assert_constant_queries(self.faculty, '/api/admin/history/', self.LIST_BUDGET, status='approved')
+
+    def test_notifications(self):
+        self.assert_constant_queries(self.student, '/api/student/notifications/', self.LIST_BUDGET, status='rejected')
+
+    def test_request_detail(self):
+        client = APIClient()
+        client.force_authenticate(self.faculty)
+        self.create_requests(1)
+        transfer_request = TransferRequest.objects.get()
+
+        count, response = self.count_queries(client, f'/api/admin/request/{transfer_request.pk}/')
+        self.assertEqual(len(response.data['items']), 3)
+        self.assertEqual(len(response.data['items'][0]['suggestions']), 3)
+        self.assertEqual(len(response.data['combination_suggestions'][0]['items']), 2)
+        self.assertLessEqual(count, self.DETAIL_BUDGET)
+
+    def review_distinct_courses(self, client, count):
+        """คำร้องใหม่ที่มี count รายการ แต่ละรายการเป็นวิชาต้นทางคนละวิชา (คู่เทียบโอนไม่ซ้ำกัน) แล้วอนุมัติทั้งหมด"""
+        transfer_request = TransferRequest.objects.create(student=self.student, target_curriculum=self.curriculum)
+        offset = SourceCourse.objects.count()
+        sources = SourceCourse.objects.bulk_create([
+            SourceCourse(
+                institution=self.institution, course_code=f'SRC{offset + index:03d}',
+                course_name_th=f'วิชาเดิม {offset + index}', credits=3, course_description='วิชาเดิม',
+            )
+            for index in range(count)
+        ])
+        items = RequestItem.objects.bulk_create([
+            RequestItem(transfer_request=transfer_request, original_course=source, grade='A') for source in sources
+        ])
+        AIComparisonResult.objects.bulk_create([
+            AIComparisonResult(request_item=item, suggested_course=self.targets[0], similarity_score=0.9)
+            for item in items
+        ])
+
+        reviews = [{'id': item.pk, 'status': 'approved'} for item in items]
+        with CaptureQueriesContext(connection) as context:
+            response = client.post('/api/admin/request-items/review/', {'items': reviews}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['status'], 'approved')
+        return len(context.captured_queries)
+
+    def test_batch_review(self):
+        client = APIClient()
+        client.force_authenticate(self.faculty)
+        self.create_requests(7)
+        items = list(RequestItem.objects.order_by('pk').values_list('pk', flat=True))
+        reviews = [{'id': pk, 'status': 'approved'} for pk in items]
+        reviews[0]['status'] = 'rejected'
+
+        response = client.post('/api/admin/request-items/review/', {'items': reviews}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = {row['id']: row['status'] for row in response.data}
+        self.assertEqual(len(statuses), 7)
+        self.assertEqual(sorted(statuses.values()), ['approved'] * 6 + ['partially_approved'])
+        self.assertEqual(
+            sum(ApprovedEquivalence.objects.values_list('approved_count', flat=True)), len(items) - 1,
+        )
+        self.assertEqual(sum(ApprovedEquivalence.objects.values_list('rejected_count', flat=True)), 1)
+
+    def test_batch_review_queries_do_not_grow_with_items(self):
+        client = APIClient()
+        client.force_authenticate(self.faculty)
+        few = self.review_distinct_courses(client, 1)
+        many = self.review_distinct_courses(client, 40)
+        self.assertEqual(few, many, f'{few} queries for 1 item but {many} for 40')
+        self.assertEqual(ApprovedEquivalence.objects.count(), 41)
+        self.assertEqual(set(ApprovedEquivalence.objects.values_list('approved_count', flat=True)), {1})
+
+    def test_batch_review_rejects_unknown_items(self):
+        client = APIClient()
+        client.force_authenticate(self.faculty)
+        self.create_requests(1)
+        item = RequestItem.objects.first()
+
+        response = client.post(
+            '/api/admin/request-items/review/',
+            {'items': [{'id': item.pk, 'status': 'approved'}, {'id': 0, 'status': 'approved'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 404)
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'pending')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.faculty = User.objects.create_user('faculty', password='x', is_staff=True)
+        student = User.objects.create_user('student', password='x')
+        TransferRequest.objects.bulk_create([
+            TransferRequest(student=student, status='approved') for _ in range(7)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.faculty)
+
+    def test_plain_list_without_cursor(self):
+        response = self.client.get('/api/admin/history/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+
+    def test_pages_are_stable_under_inserts(self):
+        response = self.client.get('/api/admin/history/', {'page_size': 3})
+        seen = [row['id'] for row in response.data['results']]
+        # คำร้องใหม่ที่เข้ามาระหว่างไล่หน้าจะไม่ทำให้หน้าถัดไปเลื่อน
+        TransferRequest.objects.create(student=User.objects.get(username='student'), status='approved')
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(row['id'] for row in response.data['results'])
+
+        expected = list(
+            TransferRequest.objects.exclude(status='pending').order_by('-created_at', '-id').values_list('id', flat=True)
+        )[1:]
+        self.assertEqual(seen, expected)
+
+    def test_cursor_seeks_on_the_leading_column(self):
+        # created_at ซ้ำกันทั้งหมด: ลำดับถัดไปตัดสินด้วย id
+        TransferRequest.objects.update(created_at=timezone.now())
+        pagination = RequestPagination()
+        first, *rest = TransferRequest.objects.order_by('-created_at', '-id')
+        queryset = TransferRequest.objects.filter(pagination.after(pagination.position_of(first)))
+        self.assertIn('"created_at" <=', str(queryset.query))
+        self.assertEqual(list(queryset.order_by('-created_at', '-id')), rest)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/admin/history/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TransferRequestCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.sources = SourceCourse.objects.bulk_create([
+            SourceCourse(
+                institution=institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description='การเขียนโปรแกรมคอมพิวเตอร์',
+            )
+            for index in range(20)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def post(self, course_ids):
+        items = json.dumps([{'original_course': pk, 'grade': 'A'} for pk in course_ids])
+        return self.client.post('/api/transfer-requests/', {'target_curriculum': self.curriculum.pk, 'items': items})
+
+    @override_settings(AI_COMPARATOR={'MATCHING_ASYNC': True})
+    def test_items_are_bulk_created(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.post([course.pk for course in self.sources])
+        self.assertEqual(response.status_code, 201)
+
+        transfer_request = TransferRequest.objects.get()
+        self.assertEqual(transfer_request.status, 'pending')
+        self.assertEqual(transfer_request.requestitem_set.count(), 20)
+        item_inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT INTO "transfer_requestitem"')]
+        self.assertEqual(len(item_inserts), 1)
+
+    def test_unknown_course_is_rejected_before_any_write(self):
+        response = self.post([self.sources[0].pk, 0])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TransferRequest.objects.exists())
+        self.assertFalse(RequestItem.objects.exists())
+
+
+@override_settings(AI_COMPARATOR={
+    'MATCHING_MAX_ATTEMPTS': 3, 'MATCHING_RETRY_DELAY': 30, 'MATCHING_LEASE_SECONDS': 300,
+    'COMBINATION_ENABLED': False,
+})
+class MatchingQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.target = TargetCourse.objects.create(
+            curriculum=cls.curriculum, course_code='CPE001', course_name_th='การเขียนโปรแกรม',
+            credits=3, course_description='การเขียนโปรแกรมคอมพิวเตอร์',
+        )
+        cls.sources = SourceCourse.objects.bulk_create([
+            SourceCourse(
+                institution=institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description='การเขียนโปรแกรมคอมพิวเตอร์เบื้องต้น',
+            )
+            for index in range(2)
+        ])
+
+    def create_request(self):
+        transfer_request = TransferRequest.objects.create(student=self.student, target_curriculum=self.curriculum)
+        RequestItem.objects.bulk_create([
+            RequestItem(transfer_request=transfer_request, original_course=source, grade='A') for source in self.sources
+        ])
+        return transfer_request
+
+    def cache_results(self):
+        version = Curriculum.objects.get(pk=self.curriculum.pk).catalog_version
+        MatchResultCache.objects.bulk_create([
+            MatchResultCache(
+                source_course=source, curriculum=self.curriculum, curriculum_version=version,
+                model_version=ai_comparator.get_matching_version(), suggested_course=self.target,
+                similarity_score=0.8, explanation='cached', suggestions=[[self.target.pk, 0.8]],
+            )
+            for source in self.sources
+        ])
+
+    def create_job(self, **fields):
+        return MatchingJob.objects.create(transfer_request=self.create_request(), **fields)
+
+    def test_claim_marks_job_running(self):
+        job = self.create_job(run_after=timezone.now() - timedelta(seconds=1))
+
+        claimed = matching.claim_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, 'running')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertGreater(claimed.locked_until, timezone.now())
+        self.assertEqual(TransferRequest.objects.get(pk=job.transfer_request_id).matching_status, 'running')
+        # งานที่ถูกจองแล้วและ lease ยังไม่หมด ต้องไม่ถูกจองซ้ำ
+        self.assertIsNone(matching.claim_job())
+
+    def test_future_jobs_are_not_claimed(self):
+        self.create_job(run_after=timezone.now() + timedelta(minutes=5))
+        self.assertIsNone(matching.claim_job())
+
+    def test_expired_lease_is_reclaimed(self):
+        job = self.create_job(status='running', attempts=1, locked_until=timezone.now() - timedelta(seconds=1))
+
+        claimed = matching.claim_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.attempts, 2)
+
+    def test_failure_is_retried_with_backoff_then_fails(self):
+        job = self.create_job()
+        with mock.patch.object(matching, 'run_matching', side_effect=RuntimeError('boom')):
+            for attempt, delay in ((1, 30), (2, 60)):
+                job = matching.claim_job()
+                self.assertEqual(job.attempts, attempt)
+                started = timezone.now()
+                self.assertFalse(matching.process_job(job))
+
+                job.refresh_from_db()
+                self.assertEqual(job.status, 'queued')
+                self.assertIn('boom', job.last_error)
+                self.assertAlmostEqual((job.run_after - started).total_seconds(), delay, delta=5)
+                MatchingJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+            job = matching.claim_job()
+            self.assertFalse(matching.process_job(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(TransferRequest.objects.get(pk=job.transfer_request_id).matching_status, 'failed')
+        self.assertIsNone(matching.claim_job())
+
+    def test_cached_request_skips_the_queue(self):
+        self.cache_results()
+        transfer_request = self.create_request()
+
+        with mock.patch.object(ai_comparator, 'get_model', side_effect=AssertionError('model must not be loaded')):
+            self.assertIsNone(matching.enqueue_matching(transfer_request))
+
+        self.assertEqual(transfer_request.matching_status, 'done')
+        self.assertFalse(MatchingJob.objects.exists())
+        self.assertEqual(AIComparisonResult.objects.filter(request_item__transfer_request=transfer_request).count(), 2)
+
+    def test_combinations_are_left_to_the_worker(self):
+        self.cache_results()
+        transfer_request = self.create_request()
+
+        with override_settings(AI_COMPARATOR={'COMBINATION_ENABLED': True}), \
+                mock.patch.object(ai_comparator, 'find_combination_matches', return_value=[]) as combinations:
+            with mock.patch.object(ai_comparator, 'get_model', side_effect=AssertionError('model must not be loaded')):
+                job = matching.enqueue_matching(transfer_request)
+            # ผลรายวิชาคัดลอกจาก cache แล้ว แต่กลุ่มวิชาถูกส่งให้ worker
+            self.assertEqual(AIComparisonResult.objects.filter(request_item__transfer_request=transfer_request).count(), 2)
+            self.assertEqual(job.status, 'queued')
+            combinations.assert_not_called()
+
+            self.assertTrue(matching.process_job(matching.claim_job()))
+            combinations.assert_called_once()
+
+    def test_cache_miss_is_queued(self):
+        transfer_request = self.create_request()
+
+        with mock.patch.object(ai_comparator, 'get_model', side_effect=AssertionError('model must not be loaded')):
+            job = matching.enqueue_matching(transfer_request)
+
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(transfer_request.matching_status, 'queued')
+        self.assertFalse(AIComparisonResult.objects.exists())
+
+
+class ReadinessTests(TestCase):
+    def test_catalog_edits_do_not_flip_readiness(self):
+        curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        with mock.patch.object(ai_comparator, '_model', object()), mock.patch.object(ai_comparator, '_warmed_up', True):
+            self.assertTrue(ai_comparator.readiness()['ready'])
+            # เพิ่ม/แก้รายวิชาทำให้ catalog_version เปลี่ยน แต่ process ยังพร้อมรับคำขอ
+            TargetCourse.objects.create(
+                curriculum=curriculum, course_code='CPE001', course_name_th='วิชา', credits=3,
+                course_description='การเขียนโปรแกรม',
+            )
+            state = ai_comparator.readiness()
+            self.assertTrue(state['ready'])
+            self.assertEqual(state['curricula_cached'], 0)
+
+    def test_not_ready_before_warm_up(self):
+        with mock.patch.object(ai_comparator, '_model', object()), mock.patch.object(ai_comparator, '_warmed_up', False):
+            self.assertFalse(ai_comparator.readiness()['ready'])
+
+
+class ModelVersionTests(TestCase):
+    def test_onnx_file_is_part_of_the_version(self):
+        versions = set()
+        for file_name in (None, 'onnx/model.onnx', 'onnx/model_qint8_avx512_vnni.onnx'):
+            with override_settings(AI_COMPARATOR={'BACKEND': 'onnx', 'ONNX_FILE_NAME': file_name}):
+                versions.add(ai_comparator.get_model_version())
+                self.assertTrue(ai_comparator.get_matching_version().startswith(ai_comparator.get_model_version()))
+        self.assertEqual(len(versions), 3)
+
+
+class TermMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        cls.institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(AI_COMPARATOR={'TFIDF_FILE': os.path.join(directory.name, 'tfidf.npz')})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(ai_comparator, '_term_matrix', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_pair(self, description):
+        target = TargetCourse.objects.create(
+            curriculum=self.curriculum, course_code='CPE001', course_name_th='วิชา', credits=3,
+            course_description=description,
+        )
+        source = SourceCourse.objects.create(
+            institution=self.institution, course_code='SRC001', course_name_th='วิชาเดิม', credits=3,
+            course_description=description,
+        )
+        return source, target
+
+    def test_empty_vocabulary_falls_back(self):
+        matrix = TermMatrix.build([(('target', 1), []), (('source', 2), [])])
+        self.assertEqual(matrix.matrix.shape, (2, 0))
+
+        # มีแต่ stop words จึงไม่มีรายวิชาใดมีคำสำคัญ
+        source, target = self.create_pair('ศึกษาและการ')
+        self.assertEqual(target.keywords, [])
+        self.assertEqual(
+            ai_comparator.explain_matches([(source, target)]),
+            ['ไม่สามารถระบุเหตุผลได้ เนื่องจากข้อมูลคำอธิบายรายวิชาไม่เพียงพอ'],
+        )
+
+    def test_rebuild_keywords_rebuilds_the_matrix(self):
+        source, target = self.create_pair('ออกแบบฐานข้อมูล')
+        TargetCourse.objects.update(keywords=['เก่า'])
+        SourceCourse.objects.update(keywords=['เก่า'])
+        self.assertIn('เก่า', ai_comparator.get_term_matrix().columns)
+
+        call_command('rebuild_keywords', stdout=io.StringIO())
+        columns = ai_comparator.get_term_matrix().columns
+        self.assertNotIn('เก่า', columns)
+        self.assertIn('ฐานข้อมูล', columns)
+
+    def test_fresh_matrix_costs_one_query(self):
+        source, target = self.create_pair('ออกแบบฐานข้อมูล')
+        matrix = ai_comparator.get_term_matrix()
+        with self.assertNumQueries(1):
+            self.assertIs(ai_comparator.get_term_matrix(), matrix)
+
+        # process อื่นแก้คำอธิบายวิชาต้นทาง: เห็นได้จาก catalog_version ของสถาบัน
+        source.course_description = 'เครือข่ายคอมพิวเตอร์'
+        source.save()
+        self.assertIsNot(ai_comparator.get_term_matrix(), matrix)
+
+
+@override_settings(AI_COMPARATOR={'RERANK_MODEL_PATH': '/models/v1/reranker', 'RERANK_BATCH_SIZE': 2})
+class RerankTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        cls.targets = [
+            TargetCourse.objects.create(
+                curriculum=curriculum, course_code=f'CPE{index:03d}', course_name_th=f'วิชา {index}', credits=3,
+                course_description=f'คำอธิบายรายวิชาเป้าหมาย {index}',
+            )
+            for index in range(2)
+        ]
+        cls.sources = [SourceCourse(course_description=f'คำอธิบายรายวิชาเดิม {index}') for index in range(3)]
+
+    def setUp(self):
+        # cross-encoder ปลอม: ให้คะแนนวิชาเป้าหมายตัวหลังสูงกว่า
+        self.reranker = mock.Mock()
+        self.reranker.predict.side_effect = lambda pairs, batch_size: [text.endswith('1') for _, text in pairs]
+        for name, value in (('get_reranker', mock.Mock(return_value=self.reranker)), ('_rerank_pair_seconds', None)):
+            patcher = mock.patch.object(ai_comparator, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ranked = [[(self.targets[0].pk, 0.9), (self.targets[1].pk, 0.8)] for _ in self.sources]
+
+    def test_scores_are_keyed_by_the_full_model_path(self):
+        name = ai_comparator.get_rerank_model_name()
+        with override_settings(AI_COMPARATOR={'RERANK_MODEL_PATH': '/models/v2/reranker'}):
+            self.assertNotEqual(ai_comparator.get_rerank_model_name(), name)
+
+        results = ai_comparator.rerank_matches(self.sources, self.ranked)
+        expected = [self.targets[1].pk, self.targets[0].pk]
+        self.assertEqual([[course_id for course_id, _ in matches] for matches in results], [expected] * 3)
+        self.assertEqual(set(RerankScore.objects.values_list('model_name', flat=True)), {name})
+        self.assertIn(f'+rerank:{name}', ai_comparator.get_matching_version())
+
+    def test_stops_before_a_batch_that_would_overrun_the_budget(self):
+        with mock.patch.object(ai_comparator, '_rerank_pair_seconds', 10.0):
+            results = ai_comparator.rerank_matches(self.sources, self.ranked)
+        self.reranker.predict.assert_not_called()
+        self.assertEqual(results, self.ranked)
+        self.assertFalse(RerankScore.objects.exists())
+
+
+@override_settings(AI_COMPARATOR={'CHUNK_MAX_CHARS': 100, 'CHUNK_OVERLAP_CHARS': 20})
+class ChunkDescriptionTests(SimpleTestCase):
+    text = ' '.join(f'topic{index}' for index in range(200))
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(ai_comparator.chunk_description('  การเขียนโปรแกรม  เบื้องต้น '), ['การเขียนโปรแกรม เบื้องต้น'])
+        with override_settings(AI_COMPARATOR={'CHUNK_MAX_CHARS': 0}):
+            self.assertEqual(ai_comparator.chunk_description(self.text), [self.text])
+
+    def test_sentence_chunks_cover_the_text_within_the_limit(self):
+        chunks = ai_comparator.chunk_description(self.text)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(0 < len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(' '.join(chunks), self.text)
+
+    def test_sentence_chunks_split_long_words(self):
+        chunks = ai_comparator.chunk_description('ก' * 250)
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+
+    def test_edit_keeps_distant_chunks(self):
+        # ขอบของช่วงขึ้นกับเนื้อหา แก้ท้ายข้อความแล้วช่วงต้นๆ ต้องเหมือนเดิม (ใช้ embedding เดิมได้)
+        before = ai_comparator.chunk_description(self.text)
+        after = ai_comparator.chunk_description(self.text.replace('topic190', 'edited'))
+        self.assertEqual(before[:len(before) // 2], after[:len(before) // 2])
+        self.assertNotEqual(before, after)
+
+    def test_window_chunks_overlap_within_the_limit(self):
+        with override_settings(AI_COMPARATOR={'CHUNK_MAX_CHARS': 100, 'CHUNK_OVERLAP_CHARS': 20, 'CHUNK_STRATEGY': 'window'}):
+            chunks = ai_comparator.chunk_description(self.text)
+        self.assertTrue(all(0 < len(chunk) <= 100 for chunk in chunks))
+        self.assertTrue(self.text.startswith(chunks[0]) and self.text.endswith(chunks[-1]))
+        for left, right in zip(chunks, chunks[1:]):
+            self.assertIn(right.split(' ')[0], left.split(' '))
+
+
+class IVFIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(600, 16)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.course_ids = np.arange(1000, 1600)
+        self.curriculum_ids = np.arange(600) % 3
+        self.query = self.vectors[7] + 0.1 * self.vectors[8]
+
+    def brute_force(self, k, curriculum_id):
+        rows = np.flatnonzero(self.curriculum_ids == curriculum_id)
+        scores = self.vectors[rows] @ self.query
+        return self.course_ids[rows[np.argsort(-scores)[:k]]]
+
+    def test_exact_search_within_curriculum(self):
+        index = IVFIndex(self.vectors, self.course_ids, self.curriculum_ids, exact_threshold=10_000)
+        found, scores = index.search(self.query, 5, curriculum_id=1)
+        self.assertEqual(found.tolist(), self.brute_force(5, 1).tolist())
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_ivf_with_every_list_probed_is_exact(self):
+        index = IVFIndex(self.vectors, self.course_ids, self.curriculum_ids, nlist=8, nprobe=8, exact_threshold=10)
+        self.assertIsNotNone(index.centroids)
+        found, _ = index.search(self.query, 5, curriculum_id=2)
+        self.assertEqual(found.tolist(), self.brute_force(5, 2).tolist())
+
+    def test_ivf_fills_k_from_the_requested_curriculum(self):
+        index = IVFIndex(self.vectors, self.course_ids, self.curriculum_ids, nlist=24, nprobe=1, exact_threshold=10)
+        found, _ = index.search(self.query, 20, curriculum_id=0)
+        self.assertEqual(len(found), 20)
+        self.assertTrue(np.all(self.curriculum_ids[found - 1000] == 0))
+
+    def test_unknown_curriculum(self):
+        index = IVFIndex(self.vectors, self.course_ids, self.curriculum_ids)
+        found, scores = index.search(self.query, 5, curriculum_id=99)
+        self.assertEqual(len(found), 0)
+        self.assertEqual(len(scores), 0)
+
+
+class BM25IndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add('target', 1, ['database', 'sql', 'design'])
+        self.index.add('target', 2, ['network', 'protocol'])
+        self.index.add('target', 3, ['database', 'network'])
+        self.index.add('source', 10, ['database'])
+
+    def test_search_ranks_within_group(self):
+        results = self.index.search(['database', 'sql'], 'target', 5)
+        self.assertEqual([doc_id for doc_id, _ in results], [1, 3])
+        self.assertEqual(self.index.search(['database'], 'other', 5), [])
+
+    def test_statistics_span_all_groups(self):
+        self.assertEqual(self.index.doc_freq['database'], 3)
+        self.assertEqual(len(self.index), 4)
+
+    def test_remove_and_replace(self):
+        self.index.remove('target', 1)
+        self.assertNotIn(('target', 1), self.index)
+        self.assertNotIn('sql', self.index.doc_freq)
+        self.assertEqual([doc_id for doc_id, _ in self.index.search(['database'], 'target', 5)], [3])
+
+        # เพิ่มซ้ำ = แทนที่เอกสารเดิม
+        self.index.add('target', 3, ['sql'])
+        self.assertEqual(self.index.doc_freq['database'], 1)
+        self.assertEqual([doc_id for doc_id, _ in self.index.search(['sql'], 'target', 5)], [3])
+        self.assertEqual(self.index.total_length, sum(sum(terms.values()) for terms in self.index.documents.values()))
+
+    def test_remove_group(self):
+        self.index.remove_group('target')
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.search(['network'], 'target', 5), [])
+
+
+class TokenizerTests(SimpleTestCase):
+    def test_segments_thai_with_dictionary_words(self):
+        self.assertEqual(tokenizer.tokenize('การวิเคราะห์ข้อมูล SQL'), ['การ', 'วิเคราะห์', 'ข้อมูล', 'sql'])
+
+    def test_keywords_drop_stop_words_and_short_words(self):
+        self.assertEqual(tokenizer.keywords('ศึกษาการออกแบบฐานข้อมูลและ SQL ของ a b'), ['sql', 'ฐานข้อมูล', 'ออกแบบ'])
+
+    def test_dictionary_compounds_are_not_stemmed(self):
+        # 'ความรู้'/'การเงิน' เป็นคำในพจนานุกรม ไม่ตัดเหลือ 'รู้'/'เงิน'
+        self.assertEqual(tokenizer.keywords('ความรู้ด้านการเงิน'), ['การเงิน', 'ความรู้'])
+        self.assertEqual(tokenizer._stem('ความหมาย'), 'ความหมาย')
+
+    def test_prefix_stripped_only_when_remainder_is_a_word(self):
+        self.assertEqual(tokenizer._stem('การวิเคราะห์'), 'วิเคราะห์')
+        self.assertEqual(tokenizer._stem('การกขฃ'), 'การกขฃ')
+
+
+class EmbeddingStoreTests(FakeEncoderMixin, TestCase):
+    def test_stored_vectors_are_reused(self):
+        first = ai_comparator.get_embeddings(['database design', 'computer network'])
+        # ข้อความเดียวกันหลัง normalize (ช่องว่าง) ใช้แฮชเดียวกัน ไม่ encode ซ้ำ
+        second = ai_comparator.get_embeddings(['  database   design ', 'computer network'])
+        self.assertEqual(self.encoder.encoded, ['database design', 'computer network'])
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(CourseEmbedding.objects.count(), 2)
+
+    def test_duplicate_texts_are_encoded_once(self):
+        vectors = ai_comparator.get_embeddings(['database design', 'database design'])
+        self.assertEqual(self.encoder.encoded, ['database design'])
+        np.testing.assert_array_equal(vectors[0], vectors[1])
+
+    def test_model_version_change_re_encodes(self):
+        ai_comparator.get_embeddings(['database design'])
+        with override_settings(AI_COMPARATOR={'MODEL_NAME': 'another-model'}):
+            ai_comparator.get_embeddings(['database design'])
+        self.assertEqual(self.encoder.encoded, ['database design', 'database design'])
+        self.assertEqual(
+            set(CourseEmbedding.objects.values_list('model_name', flat=True)),
+            {ai_comparator.get_model_version(), 'another-model'},
+        )
+
+
+class CurriculumMatrixCacheTests(FakeEncoderMixin, TestCase):
+    def create_curriculum(self, name, descriptions):
+        curriculum = Curriculum.objects.create(name=name)
+        for index, description in enumerate(descriptions):
+            TargetCourse.objects.create(
+                curriculum=curriculum, course_code=f'{name}{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description=description,
+            )
+        return curriculum
+
+    def test_target_course_save_rebuilds_the_matrix(self):
+        curriculum = self.create_curriculum('CPE', ['database design'])
+        record = ai_comparator.get_curriculum_matrix(curriculum.pk)
+        self.assertIs(ai_comparator.get_curriculum_matrix(curriculum.pk), record)
+
+        version = Curriculum.objects.get(pk=curriculum.pk).catalog_version
+        course = TargetCourse.objects.get(curriculum=curriculum)
+        course.course_description = 'computer network'
+        course.save()
+        self.assertEqual(Curriculum.objects.get(pk=curriculum.pk).catalog_version, version + 1)
+
+        rebuilt = ai_comparator.get_curriculum_matrix(curriculum.pk)
+        self.assertIsNot(rebuilt, record)
+        self.assertEqual(rebuilt.version[0], version + 1)
+        np.testing.assert_allclose(rebuilt.matrix[0], self.encoder.encode(['computer network'])[0])
+
+    def test_lru_evicts_past_the_byte_limit(self):
+        curricula = [self.create_curriculum(name, ['database design']) for name in ('A', 'B', 'C')]
+        size = ai_comparator._record_nbytes(ai_comparator.get_curriculum_matrix(curricula[0].pk))
+        with override_settings(AI_COMPARATOR={'CURRICULUM_CACHE_BYTES': 2 * size}):
+            ai_comparator.get_curriculum_matrix(curricula[1].pk)
+            # ใช้ A ล่าสุด B จึงเป็นตัวที่ไม่ได้ใช้นานที่สุด
+            ai_comparator.get_curriculum_matrix(curricula[0].pk)
+            ai_comparator.get_curriculum_matrix(curricula[2].pk)
+        self.assertEqual(list(ai_comparator._curriculum_cache), [curricula[0].pk, curricula[2].pk])
+        self.assertEqual(ai_comparator._curriculum_cache_bytes, 2 * size)
+
+
+class BatchingEncoderTests(SimpleTestCase):
+    texts = ['sql', 'network', 'db', 'operating systems', 'compilers']
+
+    def setUp(self):
+        self.batches = []
+
+    def run_batch(self, texts):
+        # เวกเตอร์ของแต่ละข้อความคือตำแหน่งใน self.texts (ตรวจได้ว่าผู้เรียกได้แถวของตัวเองตามลำดับ)
+        self.batches.append(list(texts))
+        return np.array([[self.texts.index(text)] for text in texts], dtype=np.float32)
+
+    def encode_concurrently(self, run_batch, requests):
+        """เรียก encode จากหลาย thread พร้อมกัน คืน futures (ที่ต้องเสร็จทั้งหมด ไม่ค้าง)"""
+        encoder = ai_comparator.BatchingEncoder(run_batch, max_batch_size=64, max_wait_ms=500, max_queue_depth=16)
+        barrier = threading.Barrier(len(requests))
+
+        def call(texts):
+            barrier.wait()
+            return encoder.encode(texts)
+
+        with ThreadPoolExecutor(len(requests)) as pool:
+            futures = [pool.submit(call, texts) for texts in requests]
+            _, pending = wait(futures, timeout=5)
+        self.assertFalse(pending)
+        return futures
+
+    def test_concurrent_calls_share_one_forward_pass(self):
+        requests = [['network', 'sql'], ['compilers', 'sql', 'db'], ['operating systems'], ['db', 'network']]
+        futures = self.encode_concurrently(self.run_batch, requests)
+
+        # ข้อความซ้ำกันระหว่างผู้เรียก encode ครั้งเดียว เรียงตามความยาว
+        self.assertEqual(self.batches, [['db', 'sql', 'network', 'compilers', 'operating systems']])
+        for texts, future in zip(requests, futures):
+            self.assertEqual(future.result()[:, 0].tolist(), [self.texts.index(text) for text in texts])
+
+    def test_errors_reach_every_waiting_caller(self):
+        def failing(texts):
+            self.batches.append(list(texts))
+            raise RuntimeError('encode failed')
+
+        futures = self.encode_concurrently(failing, [['sql'], ['db'], ['network']])
+        self.assertEqual(len(self.batches), 1)
+        for future in futures:
+            self.assertIsInstance(future.exception(), RuntimeError)
+
+
+class AnnMatchingTests(FakeEncoderMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(3)
+        self.curricula = [Curriculum.objects.create(name=name) for name in ('CPE', 'EE')]
+        for index in range(40):
+            description = f'course {index}'
+            self.encoder.vectors[description] = rng.normal(size=FakeEncoder.DIMENSION)
+            TargetCourse.objects.create(
+                curriculum=self.curricula[index % 2], course_code=f'T{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description=description,
+            )
+        self.sources = [SourceCourse(course_description=f'source {index}') for index in range(5)]
+        for source in self.sources:
+            self.encoder.vectors[source.course_description] = rng.normal(size=FakeEncoder.DIMENSION)
+
+    def test_ivf_path_through_find_top_matches(self):
+        exact = ai_comparator.find_top_matches(self.sources, self.curricula[0].pk, k=5)
+
+        # บังคับให้ใช้ IVF (ค่าเริ่มต้นค้นแบบตรงๆ เพราะหลักสูตรเล็กกว่า ANN_EXACT_THRESHOLD)
+        ai_comparator._ann_index = None
+        with override_settings(AI_COMPARATOR={'ANN_EXACT_THRESHOLD': 0, 'ANN_NPROBE': 64}):
+            ranked = ai_comparator.find_top_matches(self.sources, self.curricula[0].pk, k=5)
+            self.assertIsNotNone(ai_comparator.get_ann_index().centroids)
+
+        curriculum_courses = set(TargetCourse.objects.filter(curriculum=self.curricula[0]).values_list('id', flat=True))
+        for matches, expected in zip(ranked, exact):
+            self.assertEqual(len(matches), 5)
+            self.assertLessEqual({course_id for course_id, _ in matches}, curriculum_courses)
+            # nprobe ครอบคลุมทุกกลุ่ม จึงต้องได้ผลเท่ากับการค้นแบบตรงๆ
+            self.assertEqual([course_id for course_id, _ in matches], [course_id for course_id, _ in expected])
+
+
+
+class HybridMatchingTests(FakeEncoderMixin, TestCase):
+    vectors = {
+        'sql database design': np.array([1.0, 0.0, 0.0, 0.0]),
+        # ใกล้ที่สุดในเชิงความหมายแต่ไม่มีคำตรงกันเลย
+        'information management': np.array([1.0, 0.1, 0.0, 0.0]),
+        # cosine ต่ำกว่า แต่มีคำเฉพาะ (sql, database) ตรงกับวิชาต้นทาง
+        'sql database lab': np.array([0.8, 0.6, 0.0, 0.0]),
+        'digital circuits': np.array([0.0, 0.0, 1.0, 0.0]),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.curriculum = Curriculum.objects.create(name='CPE')
+        self.institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        self.targets = {
+            description: TargetCourse.objects.create(
+                curriculum=self.curriculum, course_code=f'T{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description=description,
+            )
+            for index, description in enumerate(['information management', 'sql database lab', 'digital circuits'])
+        }
+        self.source = SourceCourse.objects.create(
+            institution=self.institution, course_code='S001', course_name_th='ฐานข้อมูล',
+            credits=3, course_description='sql database design',
+        )
+
+    def ranking(self, mode):
+        with override_settings(AI_COMPARATOR={'RETRIEVAL_MODE': mode}):
+            [matches] = ai_comparator.find_top_matches([self.source], self.curriculum.pk, k=2)
+        return [course_id for course_id, _ in matches]
+
+    def test_lexical_match_is_lifted_above_dense_ranking(self):
+        dense_best = self.targets['information management'].pk
+        lexical = self.targets['sql database lab'].pk
+        self.assertEqual(self.ranking('dense'), [dense_best, lexical])
+        # 0.7 * 0.8 + 0.3 * 1.0 > 0.7 * 0.995 + 0.3 * 0
+        self.assertEqual(self.ranking('hybrid'), [lexical, dense_best])
+
+    def test_index_follows_catalog_version_and_retokenizes_changed_courses_only(self):
+        index = ai_comparator.get_lexical_index()
+        self.assertIn((('source', self.institution.pk), self.source.pk), index)
+
+        # จำลองการแก้ไขจาก process อื่น: ดัชนีใน process นี้รู้ได้จาก catalog_version ในฐานข้อมูลเท่านั้น
+        TargetCourse.objects.filter(pk=self.targets['digital circuits'].pk).update(course_description='sql tuning')
+        Curriculum.objects.filter(pk=self.curriculum.pk).update(catalog_version=F('catalog_version') + 1)
+        tokenized = []
+        self.patch(ai_comparator, 'tokenize', lambda text: tokenized.append(text) or text.split())
+
+        hits = dict(ai_comparator.lexical_search('sql', self.curriculum.pk, 5))
+        self.assertEqual(tokenized, ['sql tuning', 'sql'])
+        self.assertIn(self.targets['digital circuits'].pk, hits)
+
+        tokenized.clear()
+        added = SourceCourse.objects.create(
+            institution=self.institution, course_code='S002', course_name_th='เครือข่าย',
+            credits=3, course_description='network protocols',
+        )
+        index = ai_comparator.get_lexical_index()
+        self.assertEqual(tokenized, ['network protocols'])
+        self.assertIn((('source', self.institution.pk), added.pk), index)
+
+        added.delete()
+        self.assertNotIn((('source', self.institution.pk), added.pk), ai_comparator.get_lexical_index())
+
+class SimilarityEndpointTests(FakeEncoderMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.faculty = User.objects.create_user('faculty', password='x', is_staff=True)
+        cls.student = User.objects.create_user('student', password='x')
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.targets = [
+            TargetCourse.objects.create(
+                curriculum=cls.curriculum, course_code=f'CPE{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description=description,
+            )
+            for index, description in enumerate(['database design', 'computer network', 'operating systems'])
+        ]
+        cls.sources = [
+            SourceCourse.objects.create(
+                institution=institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description=description,
+            )
+            for index, description in enumerate(['database systems', 'network protocols'])
+        ]
+        cls.transfer_request = TransferRequest.objects.create(student=cls.student, target_curriculum=cls.curriculum)
+        RequestItem.objects.bulk_create([
+            RequestItem(transfer_request=cls.transfer_request, original_course=source, grade='A') for source in cls.sources
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.faculty)
+        self.url = f'/api/admin/request/{self.transfer_request.pk}/similarity-matrix/'
+
+    def test_float16_matches_rounded_scores(self):
+        rounded = self.client.get(self.url).data
+        packed = self.client.get(self.url, {'encoding': 'float16'}).data
+
+        self.assertEqual(rounded['shape'], [2, 3])
+        self.assertEqual(packed['shape'], rounded['shape'])
+        self.assertEqual(packed['encoding'], 'float16')
+        scores = np.frombuffer(base64.b64decode(packed['scores']), dtype='<f2').reshape(packed['shape'])
+        np.testing.assert_allclose(scores, rounded['scores'], atol=1e-3)
+        self.assertEqual([course['id'] for course in rounded['target_courses']], [course.pk for course in self.targets])
+
+    def test_precision_is_clamped(self):
+        def scores(precision):
+            response = self.client.get(self.url, {'precision': precision})
+            self.assertEqual(response.status_code, 200)
+            return response.data['scores']
+
+        self.assertEqual(scores(20), scores(7))
+        self.assertEqual(scores(-3), scores(0))
+        self.assertTrue(all(score == round(score) for row in scores(0) for score in row))
+        self.assertEqual(self.client.get(self.url, {'precision': 'x'}).status_code, 400)
+
+    def test_batch_recalculate_reports_unknown_pairs(self):
+        pairs = [
+            {'original_course_id': self.sources[0].pk, 'target_course_id': self.targets[0].pk},
+            {'original_course_id': self.sources[0].pk, 'target_course_id': 0},
+        ]
+        response = self.client.post('/api/recalculate-score/batch/', {'pairs': pairs}, format='json')
+        self.assertEqual(response.status_code, 200)
+        found, missing = response.data['results']
+        self.assertAlmostEqual(
+            found['similarity_score'], ai_comparator.calculate_similarity(self.sources[0], self.targets[0]), places=5,
+        )
+        self.assertNotIn('error', found)
+        self.assertEqual(missing, {
+            'original_course_id': self.sources[0].pk, 'target_course_id': 0,
+            'similarity_score': None, 'error': 'Course not found',
+        })
+        self.assertEqual(self.client.post('/api/recalculate-score/batch/', {'pairs': {}}, format='json').status_code, 400)
+
+    def test_faculty_only(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        response = self.client.post('/api/recalculate-score/batch/', {'pairs': []}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class SingleFlightTests(SimpleTestCase):
+    CALLERS = 6
+
+    def call_concurrently(self, loader):
+        """
+        ผู้เรียกหลายคนขอคีย์เดียวกันพร้อมกันตามขั้นตอนเดียวกับ matching.get_matches
+        (รอให้ทุกคน claim ก่อนจึงโหลด ทุกคนจึงซ้อนกันแน่นอน) คืนผลหรือ exception ของแต่ละคน
+        """
+        flight = matching._SingleFlight()
+        key = (1, 2, 3, 'model')
+        barrier = threading.Barrier(self.CALLERS)
+
+        def call():
+            owned, waiting = flight.claim([key])
+            barrier.wait()
+            if not owned:
+                return waiting[key].result()
+            try:
+                result = loader()
+            except Exception as exc:
+                flight.finish(key, error=exc)
+                raise
+            flight.finish(key, result=result)
+            return result
+
+        with ThreadPoolExecutor(self.CALLERS) as pool:
+            futures = [pool.submit(call) for _ in range(self.CALLERS)]
+            _, pending = wait(futures, timeout=5)
+        self.assertFalse(pending)
+        # เสร็จแล้วคีย์ถูกปล่อย คำขอถัดไปเป็นผู้คำนวณเอง
+        self.assertEqual(flight.claim([key])[0], [key])
+        return futures
+
+    def test_concurrent_misses_load_once(self):
+        loader = mock.Mock(return_value={'suggested_course_id': 7})
+        futures = self.call_concurrently(loader)
+        loader.assert_called_once_with()
+        self.assertEqual([future.result() for future in futures], [{'suggested_course_id': 7}] * self.CALLERS)
+
+    def test_loader_error_reaches_every_waiter(self):
+        error = RuntimeError('model failed')
+        loader = mock.Mock(side_effect=error)
+        futures = self.call_concurrently(loader)
+        loader.assert_called_once_with()
+        self.assertEqual([future.exception() for future in futures], [error] * self.CALLERS)
+
+
+class ApprovedEquivalenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.targets = [
+            TargetCourse.objects.create(
+                curriculum=cls.curriculum, course_code=f'CPE{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description='การเขียนโปรแกรมคอมพิวเตอร์',
+            )
+            for index in range(2)
+        ]
+        cls.sources = [
+            SourceCourse.objects.create(
+                institution=institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description='การเขียนโปรแกรมเบื้องต้น',
+            )
+            for index in range(2)
+        ]
+
+    def create_item(self, source, target=None, score=0.8):
+        transfer_request = TransferRequest.objects.create(student=self.student, target_curriculum=self.curriculum)
+        item = RequestItem.objects.create(transfer_request=transfer_request, original_course=source, grade='A')
+        if target is not None:
+            AIComparisonResult.objects.create(request_item=item, suggested_course=target, similarity_score=score)
+        return item
+
+    def snapshot(self):
+        return sorted(ApprovedEquivalence.objects.values_list(
+            'source_course_id', 'curriculum_id', 'target_course_id', 'approved_count', 'rejected_count',
+            'similarity_score',
+        ))
+
+    def test_approved_pair_skips_the_model(self):
+        ApprovedEquivalence.objects.create(
+            source_course=self.sources[0], curriculum=self.curriculum, target_course=self.targets[1],
+            approved_count=2, similarity_score=0.7,
+        )
+        item = self.create_item(self.sources[0])
+
+        with mock.patch.object(ai_comparator, 'get_model', side_effect=AssertionError('model must not be loaded')):
+            self.assertIsNone(matching.enqueue_matching(item.transfer_request))
+
+        result = AIComparisonResult.objects.get(request_item=item)
+        self.assertTrue(result.is_previously_approved)
+        self.assertEqual(result.suggested_course, self.targets[1])
+        self.assertEqual(result.similarity_score, 0.7)
+        self.assertEqual(item.transfer_request.matching_status, 'done')
+
+    def test_rebuild_reproduces_recorded_reviews(self):
+        reviews = [
+            (self.sources[0], self.targets[0], ['approved']),
+            (self.sources[0], self.targets[0], ['approved']),
+            (self.sources[0], self.targets[0], ['approved', 'rejected']),
+            (self.sources[1], self.targets[0], ['rejected']),
+            (self.sources[1], self.targets[1], ['rejected', 'approved']),
+            (self.sources[1], self.targets[1], ['approved', 'pending']),
+        ]
+        for source, target, statuses in reviews:
+            item = self.create_item(source, target)
+            for status in statuses:
+                item.status = status
+                item.save()
+
+        recorded = self.snapshot()
+        self.assertEqual([row[3:5] for row in recorded], [(2, 1), (0, 1), (1, 0)])
+
+        call_command('rebuild_equivalences', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), recorded)
+
+
+class OptimalAssignmentTests(FakeEncoderMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.targets = [
+            TargetCourse.objects.create(
+                curriculum=cls.curriculum, course_code=f'CPE{index:03d}', course_name_th=f'วิชา {index}',
+                credits=credits, course_description=f'วิชาเป้าหมาย {index}',
+            )
+            for index, credits in enumerate([3, 3, 4])
+        ]
+        cls.sources = [
+            SourceCourse.objects.create(
+                institution=institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description=f'วิชาเดิม {index}',
+            )
+            for index in range(3)
+        ]
+
+    def use_scores(self, table, targets=None):
+        """แทน similarity_matrix ด้วยตารางคะแนนที่กำหนดเอง table = {source: [คะแนนต่อวิชาใน targets]}"""
+        targets = targets or self.targets[:2]
+        record = ai_comparator.CurriculumMatrix(
+            version=None,
+            course_ids=np.array([course.pk for course in targets], dtype=np.int64),
+            course_codes=np.array([course.course_code for course in targets], dtype=object),
+            credits=np.array([course.credits for course in targets], dtype=np.int32),
+            matrix=None,
+        )
+
+        def similarity_matrix(original_courses, target_curriculum_id):
+            return record, np.array([table[course] for course in original_courses], dtype=np.float32)
+
+        self.patch(ai_comparator, 'similarity_matrix', similarity_matrix)
+
+    def assigned(self, results):
+        return [course.pk if course else None for course, _, _ in results]
+
+    def test_beats_greedy_on_a_conflict(self):
+        first, second, _ = self.sources
+        # ทั้งสองวิชาเลือก targets[0] เป็นอันดับ 1 ถ้าให้ first เลือกก่อน (greedy) ผลรวม 0.9 + 0.1
+        self.use_scores({first: [0.9, 0.8], second: [0.85, 0.1]})
+        results = ai_comparator.assign_optimal_matches([first, second], self.curriculum.pk)
+
+        self.assertEqual(self.assigned(results), [self.targets[1].pk, self.targets[0].pk])
+        self.assertAlmostEqual(sum(score for _, score, _ in results), 0.8 + 0.85, places=5)
+        self.assertGreater(sum(score for _, score, _ in results), 0.9 + 0.1)
+
+    def test_insufficient_credits_are_a_last_resort(self):
+        # targets[2] มี 4 หน่วยกิต มากกว่าวิชาเดิม (3) แม้คะแนนสูงกว่าก็ถูกเลือกทีหลัง
+        targets = [self.targets[2], self.targets[0]]
+        self.use_scores({self.sources[0]: [0.95, 0.6]}, targets)
+        results = ai_comparator.assign_optimal_matches([self.sources[0]], self.curriculum.pk)
+        self.assertEqual(self.assigned(results), [self.targets[0].pk])
+
+        # ถ้าไม่มีทางเลือกอื่นก็ยังจับคู่ได้
+        self.use_scores({self.sources[0]: [0.95]}, targets[:1])
+        results = ai_comparator.assign_optimal_matches([self.sources[0]], self.curriculum.pk)
+        self.assertEqual(self.assigned(results), [self.targets[2].pk])
+
+    def test_extra_items_are_left_unassigned(self):
+        self.use_scores({source: [0.5 + index / 10, 0.4] for index, source in enumerate(self.sources)})
+        results = ai_comparator.assign_optimal_matches(self.sources, self.curriculum.pk)
+
+        assigned = self.assigned(results)
+        self.assertEqual(assigned.count(None), 1)
+        self.assertEqual(sorted(pk for pk in assigned if pk), sorted(course.pk for course in self.targets[:2]))
+        self.assertEqual(results[assigned.index(None)], (None, 0, 'ไม่มีรายวิชาเป้าหมายเหลือให้จับคู่'))
+
+        excluded = ai_comparator.assign_optimal_matches(
+            self.sources, self.curriculum.pk, exclude_course_ids=[self.targets[0].pk],
+        )
+        self.assertEqual(sorted(pk for pk in self.assigned(excluded) if pk), [self.targets[1].pk])
+        self.assertEqual(self.assigned(excluded).count(None), 2)
+
+    def test_assign_matches_respects_approved_pairs(self):
+        transfer_request = TransferRequest.objects.create(student=self.student, target_curriculum=self.curriculum)
+        items = RequestItem.objects.bulk_create([
+            RequestItem(transfer_request=transfer_request, original_course=source, grade='A') for source in self.sources
+        ])
+        entry = {'suggested_course_id': self.targets[0].pk, 'similarity_score': 0.9, 'explanation': '', 'suggestions': []}
+        matched = [
+            (items[0], {**entry, 'previously_approved': True}),
+            (items[1], entry),
+            (items[2], entry),
+        ]
+        self.use_scores({self.sources[1]: [0.9, 0.7], self.sources[2]: [0.9, 0.3]})
+
+        assigned = matching.assign_matches(transfer_request, matched)
+        # targets[0] ถูกจองโดยคู่ที่อาจารย์อนุมัติ items[1] ได้ targets[1], items[2] ไม่เหลือวิชาจึงคงผลเดิม
+        self.assertEqual(assigned[0], matched[0])
+        self.assertEqual(assigned[1][1]['suggested_course_id'], self.targets[1].pk)
+        self.assertAlmostEqual(assigned[1][1]['similarity_score'], 0.7, places=5)
+        self.assertEqual(assigned[2], matched[2])
+
+
+class CombinationMatchTests(FakeEncoderMixin, TestCase):
+    vectors = {
+        # targets[0] ครอบคลุมทั้ง a และ b, targets[1] ใกล้ c/d เพียงเล็กน้อย, targets[2] ใกล้ a+b รองจาก targets[0]
+        'target 0': [1, 1, 0, 0],
+        'target 1': [0, 0, 0, 1],
+        'target 2': [1, 1, 0, 0.3],
+        'a': [1, 0, 0, 0],
+        'b': [0, 1, 0, 0],
+        'c': [0, 0, 1, 0.1],
+        'd': [0, 0, 1, 0.15],
+        'e': [1, 1, 0, 0],
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.curriculum = Curriculum.objects.create(name='วิศวกรรมคอมพิวเตอร์')
+        self.targets = [
+            TargetCourse.objects.create(
+                curriculum=self.curriculum, course_code=f'CPE{index:03d}', course_name_th=f'วิชา {index}',
+                credits=3, course_description=f'target {index}',
+            )
+            for index in range(3)
+        ]
+        # a, b, c, d หน่วยกิตไม่พอเทียบเดี่ยว, e หน่วยกิตพอ (จึงไม่ถูกนำไปรวมกลุ่ม)
+        self.sources = [
+            SourceCourse(course_description=name, credits=credits)
+            for name, credits in [('a', 2), ('b', 2), ('c', 1), ('d', 1), ('e', 3)]
+        ]
+
+    def test_low_credit_items_combine_onto_one_target(self):
+        groups = ai_comparator.find_combination_matches(self.sources, self.curriculum.pk)
+
+        self.assertEqual(len(groups), 1)
+        target_id, members, score, total_credits = groups[0]
+        self.assertEqual(target_id, self.targets[0].pk)
+        self.assertEqual(members, [0, 1])
+        self.assertAlmostEqual(score, 1.0, places=5)
+        self.assertEqual(total_credits, 4)
+
+    def test_pruned_targets_and_used_items_are_excluded(self):
+        groups = ai_comparator.find_combination_matches(self.sources, self.curriculum.pk)
+        target_ids = [target_id for target_id, _, _, _ in groups]
+        # targets[1]: ขอบบนของคะแนนกลุ่ม c+d ต่ำกว่า COMBINATION_MIN_SCORE จึงถูกตัดทิ้ง
+        self.assertNotIn(self.targets[1].pk, target_ids)
+        # targets[2]: กลุ่ม a+b ผ่านเกณฑ์ แต่ a และ b ถูกใช้กับ targets[0] ที่คะแนนสูงกว่าแล้ว
+        self.assertNotIn(self.targets[2].pk, target_ids)
+        members = [index for _, group, _, _ in groups for index in group]
+        self.assertEqual(len(members), len(set(members)))
+        self.assertNotIn(4, members)
+
+        # ถ้าไม่มี targets[0] กลุ่ม a+b จึงไปที่ targets[2]
+        self.targets[0].delete()
+        groups = ai_comparator.find_combination_matches(self.sources, self.curriculum.pk)
+        self.assertEqual([(target_id, group) for target_id, group, _, _ in groups], [(self.targets[2].pk, [0, 1])])
+
+    def test_single_item_skips_the_model(self):
+        self.assertEqual(ai_comparator.find_combination_matches(self.sources[:1], self.curriculum.pk), [])
+        self.assertEqual(self.encoder.calls, [])
+
+
+
+class RequestStatusTests(TestCase):
+    """สถานะคำร้องแม่คำนวณจากรายการวิชาด้วย aggregate UPDATE (RequestItem.save / TransferRequest.refresh_statuses)"""
+
+    # SAVEPOINT + ล็อกแถวคำร้อง + สถานะเดิมของรายการ + UPDATE รายการ + UPDATE คำร้องแม่ + RELEASE SAVEPOINT
+    # (+1 เมื่อสถานะคำร้องแม่เปลี่ยน: อ่านคำร้องที่ cache ไว้ในรายการใหม่)
+    ITEM_SAVE_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        institution = Institution.objects.create(name='วิทยาลัยเทคนิค')
+        cls.sources = [
+            SourceCourse.objects.create(
+                institution=institution, course_code=f'SRC{index:03d}', course_name_th=f'วิชาเดิม {index}',
+                credits=3, course_description='การเขียนโปรแกรมเบื้องต้น',
+            )
+            for index in range(3)
+        ]
+
+    def create_request(self, statuses):
+        transfer_request = TransferRequest.objects.create(student=self.student)
+        RequestItem.objects.bulk_create([
+            RequestItem(transfer_request=transfer_request, original_course=source, grade='A', status=status)
+            for source, status in zip(self.sources, statuses)
+        ])
+        return transfer_request
+
+    def test_item_save_sets_parent_status(self):
+        cases = [
+            (['approved', 'approved', 'approved'], 'approved'),
+            (['rejected', 'rejected', 'rejected'], 'rejected'),
+            (['approved', 'rejected', 'rejected'], 'partially_approved'),
+            (['approved', 'rejected', 'pending'], 'pending'),
+        ]
+        for statuses, expected in cases:
+            with self.subTest(statuses=statuses):
+                # รายการสุดท้ายเริ่มจาก pending แล้วถูกอาจารย์พิจารณาผ่าน save()
+                transfer_request = self.create_request(statuses[:-1] + ['pending'])
+                item = (
+                    RequestItem.objects.select_related('transfer_request', 'aicomparisonresult')
+                    .filter(transfer_request=transfer_request).order_by('pk').last()
+                )
+                item.status = statuses[-1]
+                with self.assertNumQueries(self.ITEM_SAVE_QUERIES + (expected != 'pending')):
+                    item.save()
+                transfer_request.refresh_from_db()
+                self.assertEqual(transfer_request.status, expected)
+                # คำร้องแม่ที่ cache ไว้ในรายการก็ถูกอ่านใหม่เมื่อสถานะเปลี่ยน
+                self.assertEqual(item.transfer_request.status, expected)
+
+    def test_refresh_statuses_is_one_update(self):
+        expected = {
+            self.create_request(['approved', 'approved']).pk: 'approved',
+            self.create_request(['rejected', 'rejected']).pk: 'rejected',
+            self.create_request(['approved', 'rejected']).pk: 'partially_approved',
+        }
+        # สถานะเก่าค้างอยู่ทั้งที่ยังมีรายการรอตรวจ และคำร้องที่ไม่มีรายการคงสถานะเดิม
+        stale = self.create_request(['approved', 'pending'])
+        TransferRequest.objects.filter(pk=stale.pk).update(status='approved')
+        expected[stale.pk] = 'pending'
+        empty = TransferRequest.objects.create(student=self.student, status='rejected')
+        expected[empty.pk] = 'rejected'
+
+        with self.assertNumQueries(1):
+            self.assertEqual(TransferRequest.refresh_statuses(), 4)
+        self.assertEqual(dict(TransferRequest.objects.values_list('pk', 'status')), expected)
+        with self.assertNumQueries(1):
+            self.assertEqual(TransferRequest.refresh_statuses(), 0)
+
+    def test_reconcile_dry_run_reports_without_writing(self):
+        transfer_request = self.create_request(['approved', 'approved'])
+        TransferRequest.objects.filter(pk=transfer_request.pk).update(status='rejected')
+
+        out = io.StringIO()
+        call_command('reconcile_request_status', '--dry-run', stdout=out)
+        self.assertIn(f'request {transfer_request.pk}: rejected -> approved', out.getvalue())
+        self.assertIn('1 requests would be updated.', out.getvalue())
+        transfer_request.refresh_from_db()
+        self.assertEqual(transfer_request.status, 'rejected')
+
+        call_command('reconcile_request_status', stdout=io.StringIO())
+        transfer_request.refresh_from_db()
+        self.assertEqual(transfer_request.status, 'approved')
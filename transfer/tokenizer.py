@@ -0,0 +1,137 @@
+# transfer/tokenizer.py
+"""
+ตัดคำภาษาไทย/อังกฤษสำหรับคำอธิบายรายวิชา
+
+- ภาษาไทย: maximal matching บน trie ของคำใน data/thai_words.txt (รายการคำทั่วไปจาก PyThaiNLP, CC0)
+  (เลือกการตัดที่มีตัวอักษรนอกพจนานุกรมน้อยที่สุด แล้วจึงใช้จำนวนคำน้อยที่สุด)
+- ภาษาอังกฤษ/ตัวเลข: แยกตามตัวอักษรต่อเนื่อง เป็นตัวพิมพ์เล็ก
+- trie ถูกสร้างครั้งเดียวต่อ process (ตอนเรียกใช้ครั้งแรก)
+
+keywords() คืนคำสำคัญของข้อความ (ตัด stop words แล้ว) ซึ่งถูกเก็บไว้ใน TargetCourse/SourceCourse.keywords
+ทำให้การสร้างเหตุผลประกอบเป็นแค่ intersection ของเซตคำที่คำนวณไว้แล้ว
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+WORDS_FILE = Path(__file__).resolve().parent / 'data' / 'thai_words.txt'
+
+# คำฟุ่มเฟือย (Stop words) ที่ไม่ควรนำมาเป็นเหตุผล
+STOP_WORDS = frozenset({
+    # คำเชื่อมทั่วไป
+    'การ', 'ความ', 'และ', 'ใน', 'ของ', 'ที่', 'ได้', 'ศึกษา', 'เกี่ยวกับ',
+    'เพื่อ', 'โดย', 'เป็น', 'มี', 'จาก', 'หลักการ', 'ทฤษฎี', 'เบื้องต้น',
+    'ปฏิบัติ', 'ระบบ', 'งาน', 'ทาง', 'ด้าน', 'กระบวนการ', 'พื้นฐาน',
+    'หรือ', 'กับ', 'ให้', 'แก่', 'ต่อ', 'ต่าง', 'ต่างๆ', 'แบบ', 'เชิง', 'อย่าง', 'ตาม', 'ซึ่ง', 'ด้วย',
+    'structure', 'introduction', 'basic', 'principle', 'system', 'analysis',
+    'and', 'of', 'the', 'in', 'to', 'for', 'with', 'study', 'a', 'an',
+})
+
+_TERMINAL = ''
+_RUN_RE = re.compile(r'[ก-๎]+|[a-z0-9]+')
+_THAI_RE = re.compile(r'[ก-๎]')
+
+
+@lru_cache(maxsize=None)
+def _words():
+    """คำทั้งหมดในพจนานุกรม"""
+    with open(WORDS_FILE, encoding='utf-8') as f:
+        words = (unicodedata.normalize('NFC', line.strip()) for line in f)
+        return frozenset(word for word in words if word and not word.startswith('#'))
+
+
+@lru_cache(maxsize=None)
+def _trie():
+    """โหลดพจนานุกรมเป็น trie (dict ซ้อนกัน, คีย์ '' แทนจุดสิ้นสุดคำ)"""
+    root = {}
+    for word in _words():
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_TERMINAL] = True
+    return root
+
+
+def _segment_thai(text):
+    """
+    คืน [(คำ, อยู่ในพจนานุกรมหรือไม่), ...]
+    best[i] = (จำนวนตัวอักษรนอกพจนานุกรม, จำนวนคำ) ที่น้อยที่สุดของการตัด text[:i]
+    """
+    trie = _trie()
+    size = len(text)
+    best = [None] * (size + 1)
+    back = [None] * (size + 1)
+    best[0] = (0, 0)
+
+    for start in range(size):
+        if best[start] is None:
+            continue
+        unknown, count = best[start]
+
+        # ตัวอักษรเดี่ยวนอกพจนานุกรม
+        candidate = (unknown + 1, count + 1)
+        if best[start + 1] is None or candidate < best[start + 1]:
+            best[start + 1], back[start + 1] = candidate, (start, False)
+
+        node = trie
+        for end in range(start, size):
+            node = node.get(text[end])
+            if node is None:
+                break
+            if _TERMINAL in node:
+                candidate = (unknown, count + 1)
+                if best[end + 1] is None or candidate < best[end + 1]:
+                    best[end + 1], back[end + 1] = candidate, (start, True)
+
+    pieces = []
+    end = size
+    while end > 0:
+        start, known = back[end]
+        pieces.append((text[start:end], known))
+        end = start
+    pieces.reverse()
+
+    # รวมตัวอักษรนอกพจนานุกรมที่ติดกันเป็นคำเดียว
+    merged = []
+    for piece, known in pieces:
+        if merged and not known and not merged[-1][1]:
+            merged[-1] = (merged[-1][0] + piece, False)
+        else:
+            merged.append((piece, known))
+    return merged
+
+
+def _pieces(text):
+    text = unicodedata.normalize('NFC', text or '').lower()
+    for match in _RUN_RE.finditer(text):
+        run = match.group()
+        if _THAI_RE.match(run):
+            yield from _segment_thai(run)
+        else:
+            yield run, True
+
+
+def tokenize(text):
+    """ตัดคำทั้งหมด (รวมส่วนที่ไม่อยู่ในพจนานุกรม) ใช้กับดัชนี BM25"""
+    return [piece for piece, _ in _pieces(text)]
+
+
+def _stem(word):
+    """
+    ตัด 'การ'/'ความ' นำหน้าออก เมื่อส่วนที่เหลือเป็นคำในพจนานุกรมเท่านั้น
+    คำที่อยู่ในพจนานุกรมทั้งคำ (เช่น 'ความรู้', 'การเงิน') คงไว้ตามเดิม ไม่ให้เหลือเป็นเศษคำอย่าง 'รู้'
+    """
+    words = _words()
+    if word in words:
+        return word
+    for prefix in ('การ', 'ความ'):
+        if word.startswith(prefix) and word[len(prefix):] in words:
+            return word[len(prefix):]
+    return word
+
+
+def keywords(text):
+    """คำสำคัญที่ไม่ซ้ำกันของข้อความ (เฉพาะคำในพจนานุกรม/คำภาษาอังกฤษ ที่ยาวกว่า 2 ตัวอักษร และไม่ใช่ stop word)"""
+    words = {_stem(piece) for piece, known in _pieces(text) if known}
+    return sorted(word for word in words if len(word) > 2 and word not in STOP_WORDS)
@@ -15,12 +15,15 @@ from .views import (
     PendingRequestListView,
     TransferRequestUpdateView,
     RecalculateScoreView,
+    BatchRecalculateScoreView,
+    SimilarityMatrixView,
     RegisterView, 
     NotificationView,
     UserProfileView,
     RequestHistoryListView,
     TransferRequestDetailView,
     TransferEvaluationPDFView,
+    BatchReviewView,
 
     InstitutionViewSet,
     CurriculumViewSet,
@@ -39,9 +42,12 @@ urlpatterns = [
     path('admin/request/<int:pk>/evaluation-pdf/', TransferEvaluationPDFView.as_view(), name='transfer-evaluation-pdf'),
     path('admin/request/<int:pk>/delete/', TransferRequestDeleteView.as_view(), name='request-delete'),
     path('admin/request-item/<int:pk>/update/', RequestItemUpdateView.as_view(), name='request-item-update'),
+    path('admin/request-items/review/', BatchReviewView.as_view(), name='request-item-batch-review'),
     path('admin/request/<int:pk>/', TransferRequestDetailView.as_view(), name='request-detail'),
     path('admin/request/<int:pk>/pdf/', TransferReportPDFView.as_view(), name='transfer-report-pdf'),
+    path('admin/request/<int:pk>/similarity-matrix/', SimilarityMatrixView.as_view(), name='request-similarity-matrix'),
     path('recalculate-score/', RecalculateScoreView.as_view(), name='recalculate-score'),
+    path('recalculate-score/batch/', BatchRecalculateScoreView.as_view(), name='recalculate-score-batch'),
     path('register/', RegisterView.as_view(), name='register'), # เพิ่ม
     path('student/notifications/', NotificationView.as_view(), name='student-notifications'), # เพิ่ม
     path('profile/', UserProfileView.as_view(), name='user-profile'),
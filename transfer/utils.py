@@ -3,6 +3,15 @@ from django.conf import settings
 from django.contrib.staticfiles.finders import find
 from django.utils.functional import SimpleLazyObject
 
+def load_weasyprint():
+    """
+    import WeasyPrint ตอนสร้าง PDF ครั้งแรกเท่านั้น (โหลด Pango/HarfBuzz ช้า)
+    คืนค่า (HTML, CSS, FontConfiguration)
+    """
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+    return HTML, CSS, FontConfiguration
+
 def django_url_fetcher(url, *args, **kwargs):
     """
     Custom URL Fetcher for WeasyPrint to load local static files correctly.
@@ -4,7 +4,8 @@ import traceback
 from django.contrib.auth.models import User
 from django.http import HttpResponse
 from django.template.loader import render_to_string
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Prefetch, Sum
 from rest_framework import generics, permissions, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -13,17 +14,17 @@ from django.templatetags.static import static
 import base64
 import os
 from django.conf import settings
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
-from .utils import django_url_fetcher
+from .utils import django_url_fetcher, load_weasyprint
 from .models import (
     Institution,
     Curriculum,
     SourceCourse,
     TargetCourse,
     TransferRequest,
-    AIComparisonResult,
     RequestItem,
+    AISuggestion,
+    CombinationSuggestion,
+    ApprovedEquivalence,
     UserProfile
 )
 from .serializers import (
@@ -41,7 +42,39 @@ from .serializers import (
     TargetCourseDetailSerializer,
     SourceCourseDetailSerializer,
 )
-from .ai_comparator import find_best_match, calculate_similarity
+from .ai_comparator import calculate_similarity, calculate_similarities, embed_courses, readiness, similarity_matrix
+from .matching import enqueue_matching
+from .pagination import CoursePagination, NamePagination, RequestPagination
+
+#================================#
+#  Querysets                     #
+#================================#
+
+def with_request_graph(queryset):
+    """
+    โหลดทุกอย่างที่ TransferRequestListSerializer ใช้ล่วงหน้า
+    จำนวน query คงที่ (ไม่ขึ้นกับจำนวนคำร้อง/รายวิชา) แทนการดึงทีละแถว
+    """
+    return queryset.select_related(
+        'student__userprofile', 'target_curriculum',
+    ).prefetch_related(
+        Prefetch(
+            'requestitem_set',
+            queryset=RequestItem.objects.select_related(
+                'original_course__institution',
+                'aicomparisonresult__suggested_course__curriculum',
+            ).order_by('id'),
+        ),
+        Prefetch(
+            'requestitem_set__ai_suggestions',
+            queryset=AISuggestion.objects.select_related('suggested_course__curriculum'),
+        ),
+        Prefetch(
+            'combination_suggestions',
+            queryset=CombinationSuggestion.objects.select_related('target_course__curriculum'),
+        ),
+        Prefetch('combination_suggestions__items', queryset=RequestItem.objects.only('id')),
+    )
 
 #================================#
 #  Authentication & User Views  #
@@ -71,15 +104,18 @@ class TargetCurriculumListView(generics.ListAPIView):
     queryset = Curriculum.objects.all()
     serializer_class = CurriculumSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NamePagination
 
 class InstitutionListView(generics.ListAPIView):
     queryset = Institution.objects.all()
     serializer_class = InstitutionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NamePagination
 
 class SourceCourseListView(generics.ListAPIView):
     serializer_class = SourceCourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CoursePagination
     
     def get_queryset(self):
         institution_id = self.request.query_params.get('institution_id')
@@ -94,26 +130,14 @@ class TransferRequestCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         transfer_request = serializer.save(student=self.request.user)
-        target_curriculum = transfer_request.target_curriculum
-        
-        if not target_curriculum:
-            return
-
-        for item in transfer_request.requestitem_set.all():
-            best_match, score, reason = find_best_match(item.original_course, target_curriculum.id)
-            
-            if best_match:
-                AIComparisonResult.objects.create(
-                    request_item=item,
-                    suggested_course=best_match,
-                    similarity_score=score,
-                )
+        # งานจับคู่ AI ทำเบื้องหลัง (ผลลัพธ์ AIComparisonResult จะตามมาทีหลัง)
+        enqueue_matching(transfer_request)
 
 class NotificationView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        unread_requests = TransferRequest.objects.filter(
+        unread_requests = with_request_graph(TransferRequest.objects).filter(
             student=request.user, 
             status__in=['approved', 'rejected'],
             is_viewed_by_student=False
@@ -129,9 +153,10 @@ class NotificationView(APIView):
 class PendingRequestListView(generics.ListAPIView):
     serializer_class = TransferRequestListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RequestPagination
 
     def get_queryset(self):
-        return TransferRequest.objects.filter(status='pending').order_by('-created_at')
+        return with_request_graph(TransferRequest.objects.filter(status='pending')).order_by('-created_at')
 
 class TransferRequestUpdateView(generics.UpdateAPIView):
     queryset = TransferRequest.objects.all()
@@ -143,12 +168,66 @@ class RequestItemUpdateView(generics.UpdateAPIView):
     serializer_class = RequestItemStatusUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+class BatchReviewView(APIView):
+    """
+    บันทึกผลพิจารณาหลายรายการวิชา (ข้ามคำร้องได้) ในคำขอเดียว
+    body: {"items": [{"id": <request item id>, "status": "approved" | "rejected" | "pending"}, ...]}
+    ทุกรายการถูกบันทึกใน transaction เดียว (ผิดรายการเดียวไม่บันทึกเลย) แล้วคืนคำร้องที่เกี่ยวข้องทั้งหมด
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        reviews = request.data.get('items')
+        if not isinstance(reviews, list) or not reviews:
+            return Response({'error': 'items must be a non-empty list'}, status=400)
+
+        statuses = {status for status, _ in RequestItem.STATUS_CHOICES}
+        new_statuses = {}
+        try:
+            for review in reviews:
+                item_id, status = int(review['id']), review['status']
+                if status not in statuses:
+                    return Response({'error': f'invalid status {status!r} for item {item_id}'}, status=400)
+                if new_statuses.setdefault(item_id, status) != status:
+                    return Response({'error': f'conflicting statuses for item {item_id}'}, status=400)
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'each item needs id and status'}, status=400)
+
+        request_ids = sorted(set(
+            RequestItem.objects.filter(pk__in=new_statuses).values_list('transfer_request_id', flat=True)
+        ))
+        with transaction.atomic():
+            # ล็อกคำร้องตามลำดับ id (ลำดับเดียวกับ RequestItem.save) กัน deadlock และการแก้สถานะชนกัน
+            list(TransferRequest.objects.select_for_update().filter(pk__in=request_ids).order_by('pk').values_list('pk'))
+            items = list(
+                RequestItem.objects.filter(pk__in=new_statuses)
+                .select_related('transfer_request', 'aicomparisonresult')
+            )
+            missing = sorted(set(new_statuses) - {item.pk for item in items})
+            if missing:
+                return Response({'error': 'Request item not found', 'ids': missing}, status=404)
+
+            changes = []
+            for item in items:
+                if item.status != new_statuses[item.pk]:
+                    changes.append((item, item.status, new_statuses[item.pk]))
+                    item.status = new_statuses[item.pk]
+
+            # bulk_update ไม่เรียก save()/signal จึงบันทึกคู่เทียบโอนและสถานะคำร้องเองที่นี่ (ครั้งเดียวต่อคำร้อง)
+            RequestItem.objects.bulk_update([item for item, _, _ in changes], ['status'])
+            ApprovedEquivalence.record_reviews(changes)
+            TransferRequest.refresh_statuses(TransferRequest.objects.filter(pk__in=request_ids))
+
+        updated = with_request_graph(TransferRequest.objects.filter(pk__in=request_ids)).order_by('pk')
+        return Response(TransferRequestListSerializer(updated, many=True).data)
+
 class RequestHistoryListView(generics.ListAPIView):
     serializer_class = TransferRequestListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RequestPagination
 
     def get_queryset(self):
-        return TransferRequest.objects.exclude(status='pending').order_by('-created_at')
+        return with_request_graph(TransferRequest.objects.exclude(status='pending')).order_by('-created_at')
 
 class TransferRequestDeleteView(generics.DestroyAPIView):
     queryset = TransferRequest.objects.all()
@@ -167,11 +246,93 @@ class RecalculateScoreView(APIView):
         except (SourceCourse.DoesNotExist, TargetCourse.DoesNotExist):
             return Response({'error': 'Course not found'}, status=404)
 
+class BatchRecalculateScoreView(APIView):
+    """คำนวณคะแนนหลายคู่ (original_course_id, target_course_id) ในคำขอเดียว (เฉพาะอาจารย์)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        pairs = request.data.get('pairs')
+        if not isinstance(pairs, list):
+            return Response({'error': 'pairs must be a list'}, status=400)
+
+        try:
+            pair_ids = [(int(pair['original_course_id']), int(pair['target_course_id'])) for pair in pairs]
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'each pair needs original_course_id and target_course_id'}, status=400)
+
+        source_courses = SourceCourse.objects.in_bulk({source_id for source_id, _ in pair_ids})
+        target_courses = TargetCourse.objects.in_bulk({target_id for _, target_id in pair_ids})
+        found = [
+            (source_courses.get(source_id), target_courses.get(target_id))
+            for source_id, target_id in pair_ids
+        ]
+        scores = calculate_similarities(found)
+
+        results = []
+        for (source_id, target_id), (source, target), score in zip(pair_ids, found, scores):
+            result = {'original_course_id': source_id, 'target_course_id': target_id, 'similarity_score': score}
+            if source is None or target is None:
+                result.update(similarity_score=None, error='Course not found')
+            results.append(result)
+        return Response({'results': results})
+
+class SimilarityMatrixView(APIView):
+    """
+    เมทริกซ์ความเหมือนทั้งหมด (รายการในคำร้อง x รายวิชาในหลักสูตรเป้าหมาย) ในคำขอเดียว
+    ?precision=N ปัดทศนิยม (ค่าเริ่มต้น 4), ?encoding=float16 ส่งเป็น base64 ของ float16 (row-major)
+    เฉพาะอาจารย์ (is_staff ซึ่งมี FacultyProfile)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            transfer_request = TransferRequest.objects.get(pk=pk)
+        except TransferRequest.DoesNotExist:
+            return Response({'error': 'Request not found'}, status=404)
+
+        items = list(transfer_request.requestitem_set.select_related('original_course').order_by('id'))
+        record, scores = similarity_matrix(
+            [item.original_course for item in items], transfer_request.target_curriculum_id,
+        )
+        if record is None:
+            return Response({'error': 'Target curriculum not found'}, status=404)
+
+        data = {
+            'request_id': transfer_request.id,
+            'target_curriculum': transfer_request.target_curriculum_id,
+            'items': [{'id': item.id, 'original_course_id': item.original_course_id} for item in items],
+            'target_courses': [
+                {'id': int(course_id), 'course_code': course_code, 'credits': int(credits)}
+                for course_id, course_code, credits in zip(record.course_ids, record.course_codes, record.credits)
+            ],
+            'shape': list(scores.shape),
+        }
+
+        if request.query_params.get('encoding') == 'float16':
+            data['encoding'] = 'float16'
+            data['scores'] = base64.b64encode(scores.astype('<f2').tobytes()).decode('ascii')
+        else:
+            try:
+                precision = min(max(int(request.query_params.get('precision', 4)), 0), 7)
+            except ValueError:
+                return Response({'error': 'precision must be an integer'}, status=400)
+            data['scores'] = scores.astype(float).round(precision).tolist()
+        return Response(data)
+
 class TransferRequestDetailView(generics.RetrieveAPIView):
-    queryset = TransferRequest.objects.all()
+    queryset = with_request_graph(TransferRequest.objects.all())
     serializer_class = TransferRequestListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+class ReadinessView(APIView):
+    """ให้ load balancer ส่ง traffic มาเฉพาะเมื่อโมเดลและ cache พร้อมแล้ว (200 = พร้อม, 503 = ยังไม่พร้อม)"""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        state = readiness()
+        return Response(state, status=200 if state['ready'] else 503)
+
 #================================#
 #  PDF Generation Views         #
 #================================#
@@ -206,6 +367,7 @@ class TransferReportPDFView(APIView):
             
             html_string = render_to_string('transfer/transfer_report.html', context)
             
+            HTML, CSS, FontConfiguration = load_weasyprint()
             font_config = FontConfiguration()
             html = HTML(string=html_string, base_url=request.build_absolute_uri('/'), url_fetcher=django_url_fetcher)
             css_string = '''
@@ -248,6 +410,7 @@ class TransferEvaluationPDFView(APIView):
             
             html_string = render_to_string('transfer/transfer_evaluation_form.html', context)
             
+            HTML, CSS, FontConfiguration = load_weasyprint()
             font_config = FontConfiguration()
             html = HTML(string=html_string, base_url=request.build_absolute_uri('/'), url_fetcher=django_url_fetcher)
             css_string = '''
@@ -274,19 +437,32 @@ class TransferEvaluationPDFView(APIView):
 class InstitutionViewSet(viewsets.ModelViewSet):
     queryset = Institution.objects.all()
     serializer_class = InstitutionSerializer
+    pagination_class = NamePagination
     permission_classes = [permissions.IsAuthenticated]
 
 class CurriculumViewSet(viewsets.ModelViewSet):
     queryset = Curriculum.objects.all()
     serializer_class = CurriculumSerializer
+    pagination_class = NamePagination
     permission_classes = [permissions.IsAuthenticated]
 
-class TargetCourseViewSet(viewsets.ModelViewSet):
+class CourseEmbeddingMixin:
+    """คำนวณเวกเตอร์ของคำอธิบายรายวิชาเก็บไว้ทันทีที่สร้าง/แก้ไขรายวิชา"""
+
+    def perform_create(self, serializer):
+        embed_courses([serializer.save()])
+
+    def perform_update(self, serializer):
+        embed_courses([serializer.save()])
+
+class TargetCourseViewSet(CourseEmbeddingMixin, viewsets.ModelViewSet):
     queryset = TargetCourse.objects.all()
     serializer_class = TargetCourseSerializer 
+    pagination_class = CoursePagination
     permission_classes = [permissions.IsAuthenticated]
 
-class SourceCourseViewSet(viewsets.ModelViewSet):
+class SourceCourseViewSet(CourseEmbeddingMixin, viewsets.ModelViewSet):
     queryset = SourceCourse.objects.all()
     serializer_class = SourceCourseSerializer
+    pagination_class = CoursePagination
     permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file